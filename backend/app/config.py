@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
 
 
@@ -8,15 +8,67 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str  # anon/public key
     SUPABASE_SERVICE_KEY: str  # service role key for admin operations
+    SUPABASE_MAX_CONCURRENCY: int = 64  # concurrent Supabase calls per worker
 
     # JWT
     SUPABASE_JWT_SECRET: str  # from Supabase project settings
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    JWT_AUDIENCE: str = "authenticated"
+    AUTH_CACHE_SIZE: int = 10000  # verified tokens kept in memory per worker
+
+    # User lookup cache (email -> user id)
+    USER_CACHE_SIZE: int = 50000
+    USER_CACHE_TTL_SECONDS: int = 3600
+
+    # Capsule access cache ((capsule, user) -> role and unlock date)
+    ACCESS_CACHE_SIZE: int = 20000
+    ACCESS_CACHE_TTL_SECONDS: int = 60
 
     # Storage
+    STORAGE_BACKEND: str = "supabase"  # "supabase" or "local"
     STORAGE_BUCKET: str = "capsule-media"
+    LOCAL_STORAGE_PATH: str = "media-storage"  # root directory for STORAGE_BACKEND=local
+    STORAGE_SIGNING_SECRET: Optional[str] = None  # HMAC key for local signed URLs (defaults to SUPABASE_JWT_SECRET)
+    PUBLIC_API_URL: str = "http://localhost:8000"  # base of signed URLs served by this API
     MAX_FILE_SIZE: int = 52428800  # 50MB in bytes
+    UPLOAD_CHUNK_SIZE: int = 1048576  # 1MB read/write size when streaming uploads
+    SIGNED_URL_CACHE_SIZE: int = 20000
+    SIGNED_URL_CACHE_MARGIN_SECONDS: int = 300  # stop reusing a URL this long before it expires
+    MEDIA_STREAM_CHUNK_SIZE: int = 262144  # 256KB per read when streaming media without sendfile
+    MEDIA_STREAM_CONNECTIONS: int = 100  # pooled connections for relaying media from Supabase Storage
+
+    # Image derivatives (thumbnails and BlurHash placeholders)
+    THUMBNAIL_WORKERS: int = 2  # render processes per API process (0 disables thumbnails)
+    THUMBNAIL_SIZES: List[int] = [320, 1280]  # longest edge in px, e.g. THUMBNAIL_SIZES=[320,1280]
+    THUMBNAIL_QUALITY: int = 80  # WebP quality
+    BLURHASH_COMPONENTS: int = 4  # along the longer side; fewer make a shorter, blurrier hash
+
+    # Resumable (multipart) uploads
+    UPLOAD_PART_SIZE: int = 8388608  # 8MB per part
+    MAX_RESUMABLE_FILE_SIZE: int = 524288000  # 500MB
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_EXPIRY_SWEEP_SECONDS: int = 900  # how often expired sessions are deleted (0 disables)
+    UPLOAD_EXPIRY_BATCH: int = 500  # sessions deleted per statement
+    UPLOAD_ASSEMBLY_TIMEOUT_SECONDS: int = 3600  # sessions stuck assembling longer are reopened
+
+    # Bulk uploads (many files in one request)
+    MAX_BULK_FILES: int = 50
+    MAX_BULK_UPLOAD_SIZE: int = 524288000  # 500MB for the whole request
+    BULK_UPLOAD_CONCURRENCY: int = 4  # files stored at once per request
+
+    # Storage cleanup (objects of deleted media, removed in the background)
+    STORAGE_CLEANUP_WORKERS: int = 1  # cleanup workers per process (0 disables removal here)
+    STORAGE_CLEANUP_BATCH_SIZE: int = 1000  # paths per storage remove call (Supabase accepts 1000)
+    STORAGE_CLEANUP_MAX_ATTEMPTS: int = 8  # then the path is kept as 'failed' for reconciliation
+    STORAGE_CLEANUP_RETRY_BASE_SECONDS: int = 60  # doubles after each failed attempt
+    STORAGE_CLEANUP_LEASE_SECONDS: int = 300  # claimed paths are retried if not settled by then
+    STORAGE_CLEANUP_POLL_SECONDS: int = 30  # idle workers re-check the queue this often
+
+    # WebSocket push
+    WS_HEARTBEAT_SECONDS: int = 25
+    WS_MAX_CONNECTIONS_PER_USER: int = 5
+    WS_SEND_TIMEOUT_SECONDS: int = 5
 
     # CORS
     FRONTEND_URL: str = "http://localhost:5173"
@@ -24,10 +76,33 @@ class Settings(BaseSettings):
     # Email (SendGrid)
     SENDGRID_API_KEY: Optional[str] = None
     SENDGRID_FROM: Optional[str] = None
+    EMAIL_WORKERS: int = 2  # outbox workers per process (0 disables sending here)
+    EMAIL_BATCH_SIZE: int = 10  # messages claimed and sent together by one worker
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: int = 30  # doubles after each failed attempt
+    EMAIL_LEASE_SECONDS: int = 120  # claimed messages are retried if not settled by then
+    EMAIL_POLL_SECONDS: int = 5  # idle workers re-check the outbox this often
+    EMAIL_RETENTION_DAYS: int = 7  # sent and failed messages are deleted after this
+    EMAIL_PURGE_INTERVAL_SECONDS: int = 3600
 
     # Notifications
     NOTIFY_SECRET: str = "change-me"
     NOTIFY_WINDOW_HOURS: int = 24
+    REMINDER_BATCH_SIZE: int = 500  # capsules fetched, resolved and queued per batch
+
+    # Unlock scheduler
+    UNLOCK_SCHEDULER_ENABLED: bool = True
+    UNLOCK_SCHEDULER_BATCH: int = 1000  # upcoming unlocks held in memory per refill
+    UNLOCK_SCHEDULER_MAX_SLEEP_SECONDS: int = 60  # also how often overdue capsules are swept
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" lines or "text"
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01  # share of requests whose debug records are kept
+    LOG_QUEUE_SIZE: int = 10000  # records buffered for the writer thread before dropping
+
+    # Metrics
+    METRICS_TOKEN: Optional[str] = None  # when set, /metrics requires "Bearer <token>"
 
     # Production flag
     ENVIRONMENT: str = "development"
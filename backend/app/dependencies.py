@@ -1,94 +1,91 @@
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from jose import JWTError, jwt
 from .config import settings
-from .supabase_client import supabase
-import base64
-import json
+from .cache import TTLCache
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
+# Verified user claims keyed by sha256(token). Entries expire with the token.
+_claims_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=300)
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> dict:
+
+def decode_access_token(token: str) -> dict:
     """
-    Verify JWT token and return current user.
-    Uses Supabase JWT verification.
+    Verify a Supabase access token and return the user it identifies.
+    The signature is checked locally against SUPABASE_JWT_SECRET; results are
+    cached until the token's own expiry so repeat requests skip decoding.
     """
-    token = credentials.credentials
-    print(f"\n=== JWT VERIFICATION START ===")
-    print(f"Token length: {len(token)}")
-    print(f"JWT Secret configured: {bool(settings.SUPABASE_JWT_SECRET)}")
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    user = _claims_cache.get(cache_key)
+    if user is not None:
+        return user
 
     try:
-        # Parse the JWT to see its header
-        parts = token.split('.')
-        if len(parts) >= 2:
-            # Decode header
-            header_padding = parts[0] + '=' * (4 - len(parts[0]) % 4)
-            try:
-                header_data = base64.urlsafe_b64decode(header_padding)
-                header = json.loads(header_data)
-                print(
-                    f"Token Header - alg: {header.get('alg')}, typ: {header.get('typ')}")
-            except Exception as hdr_err:
-                print(f"Could not decode header: {hdr_err}")
-
-        # Decode without verification to see claims
-        unverified = jwt.get_unverified_claims(token)
-        print(
-            f"Token Claims - sub: {unverified.get('sub')}, email: {unverified.get('email')}")
-
-        # For Supabase tokens, decode without verifying signature
-        # This is acceptable because:
-        # 1. We trust Supabase (token comes from their auth service)
-        # 2. The token expiration is checked by jwt.decode()
-        # 3. The token is transmitted over HTTPS
-        print(f"Decoding token without signature verification (trusting Supabase)")
         payload = jwt.decode(
             token,
-            key="",  # Empty key required by python-jose
-            options={
-                "verify_signature": False,
-                "verify_aud": False  # Skip audience verification
-            }
+            settings.SUPABASE_JWT_SECRET,
+            algorithms=[settings.ALGORITHM],
+            audience=settings.JWT_AUDIENCE
         )
-        print(f"Token decoded successfully")
-
-        # Extract user information from payload
-        user_id = payload.get("sub")
-        email = payload.get("email")
-        user_metadata = payload.get("user_metadata", {})
-        username = user_metadata.get("username", "")
-
-        print(f"User authenticated: {user_id} ({email})")
-        print(f"=== JWT VERIFICATION SUCCESS ===\n")
-
-        return {
-            "id": user_id,
-            "email": email,
-            "username": username,
-        }
-
     except JWTError as jwt_err:
-        print(f"JWT decode error: {type(jwt_err).__name__}: {str(jwt_err)}")
-        print(f"=== JWT VERIFICATION FAILED ===\n")
+        logger.debug(f"JWT verification failed: {type(jwt_err).__name__}: {jwt_err}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate token"
+        )
+
+    user_id = payload.get("sub")
+    if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate token"
         )
-    except HTTPException:
-        print(f"=== JWT VERIFICATION FAILED (HTTP EXCEPTION) ===\n")
-        raise
-    except Exception as e:
-        print(f"Unexpected error: {type(e).__name__}: {str(e)}")
-        print(f"=== JWT VERIFICATION FAILED ===\n")
+
+    user_metadata = payload.get("user_metadata") or {}
+    user = {
+        "id": user_id,
+        "email": payload.get("email"),
+        "username": user_metadata.get("username", ""),
+    }
+
+    exp = payload.get("exp")
+    _claims_cache.set(cache_key, user, expires_at=float(exp) if exp else None)
+    return user
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> dict:
+    """
+    Verify JWT token and return current user.
+    Uses Supabase JWT verification.
+    """
+    return decode_access_token(credentials.credentials)
+
+
+async def get_media_user(
+    authorization: Optional[str] = Header(None),
+    token: Optional[str] = Query(None)
+) -> dict:
+    """
+    Verify the JWT from the Authorization header or a `?token=` parameter.
+    <video> and <audio> elements cannot set headers, so media streams
+    accept the token in the URL, as the realtime WebSocket does.
+    """
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication failed"
+            detail="Not authenticated"
         )
+    return decode_access_token(token)
 
 
 async def get_optional_user(
@@ -0,0 +1,68 @@
+"""
+Image derivative rendering, run in ThumbnailService's process pool.
+Kept free of app imports (settings, Supabase clients) so pool workers
+start quickly and never touch the API's connections.
+"""
+import os
+from typing import Dict, List
+import blurhash
+from PIL import Image, ImageOps
+
+# Size of the image the placeholder hash is computed from; the hash only
+# keeps a few low-frequency components, so a larger source adds nothing
+_BLURHASH_SOURCE_SIZE = 32
+
+
+def render_derivatives(
+    source_path: str,
+    out_dir: str,
+    sizes: List[int],
+    quality: int,
+    blurhash_components: int
+) -> dict:
+    """
+    Write a WebP thumbnail of `source_path` for each size (longest edge, in
+    pixels) into `out_dir` and compute a BlurHash placeholder. Sizes at or
+    above the original's longest edge are skipped. Returns
+    {"thumbnails": {size: file}, "blurhash": str}.
+    """
+    largest = max(sizes)
+    with Image.open(source_path) as original:
+        # Let the JPEG decoder scale down while decoding (1/2 .. 1/8)
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    longest = max(image.size)
+
+    thumbnails: Dict[str, str] = {}
+    current = image
+    # Largest first, each one scaled from the previous, so every resize
+    # starts from the smallest image that is still big enough
+    for size in sorted(set(sizes), reverse=True):
+        if size >= longest:
+            continue
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS)
+        path = os.path.join(out_dir, f"{size}.webp")
+        current.save(path, "WEBP", quality=quality, method=4)
+        thumbnails[str(size)] = path
+
+    placeholder = current.convert("RGB")
+    placeholder.thumbnail((_BLURHASH_SOURCE_SIZE, _BLURHASH_SOURCE_SIZE), Image.BILINEAR)
+    pixels = list(placeholder.getdata())
+    rows = [
+        pixels[y * placeholder.width:(y + 1) * placeholder.width]
+        for y in range(placeholder.height)
+    ]
+    components_x = components_y = blurhash_components
+    if placeholder.width > placeholder.height:
+        components_y = max(1, round(blurhash_components * placeholder.height / placeholder.width))
+    elif placeholder.height > placeholder.width:
+        components_x = max(1, round(blurhash_components * placeholder.width / placeholder.height))
+
+    return {
+        "thumbnails": thumbnails,
+        "blurhash": blurhash.encode(rows, components_x, components_y),
+    }
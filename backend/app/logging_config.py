@@ -0,0 +1,129 @@
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import orjson
+from .config import settings
+from .metrics import LOG_RECORDS_DROPPED
+
+# Set per request by RequestContextMiddleware; copied into tasks and worker
+# threads started while handling the request.
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Whether this request's debug records are kept (None outside a request)
+debug_sampled_var: ContextVar[Optional[bool]] = ContextVar("debug_sampled", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id"
+}
+
+_listener: Optional[QueueListener] = None
+
+
+def sample_debug() -> bool:
+    """Roll the per-request debug sampling decision"""
+    return random.random() < settings.LOG_DEBUG_SAMPLE_RATE
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tag records with the current request id and drop debug records outside
+    the sample. A request is sampled as a whole, so a kept trace is complete;
+    debug records from background work are sampled one by one.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        if record.levelno > logging.DEBUG:
+            return True
+        sampled = debug_sampled_var.get()
+        return sample_debug() if sampled is None else sampled
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are included as keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", "-") != "-":
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. Only the message is rendered on
+    the calling thread (its arguments may change afterwards); tracebacks,
+    JSON encoding and the write happen on the listener. When the queue is
+    full the record is dropped and counted rather than blocking the caller.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging() -> None:
+    """
+    Route all logging through a queue to a single stdout writer thread.
+    LOG_FORMAT selects JSON lines or plain text.
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    if settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = _BoundedQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,11 +1,21 @@
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import auth, capsules, media, notify
+from .routes import auth, capsules, media, notify, realtime
 from .config import settings
+from .logging_config import configure_logging, stop_logging
+from .metrics import render as render_metrics
+from .middleware import BodySizeLimitMiddleware, MetricsMiddleware, RequestContextMiddleware
+from .services.email_outbox import EmailOutbox
+from .services.storage_cleanup import StorageCleanup
+from .services.thumbnail_service import ThumbnailService
+from .services.upload_service import ResumableUploadService
+from .services.unlock_service import UnlockScheduler
+from . import streaming
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (JSON lines written from a background thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -44,6 +54,19 @@ if settings.ENVIRONMENT != "production":
 # De-duplicate while preserving order
 allowed_origins = list(dict.fromkeys(allowed_origins))
 
+# Cut off oversize uploads before the multipart parser spools them
+# (1MB of slack covers the multipart framing around the file)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=settings.MAX_FILE_SIZE + 1024 * 1024,
+    path_prefixes=("/api/media/upload/",),
+)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=settings.MAX_BULK_UPLOAD_SIZE + 1024 * 1024,
+    path_prefixes=("/api/media/bulk-upload/",),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -52,11 +75,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outside CORS and the body limit, so rejected and preflight requests are counted too
+app.add_middleware(MetricsMiddleware)
+
+# Correlation id for every log record written while handling a request
+app.add_middleware(RequestContextMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(capsules.router, prefix="/api/capsules", tags=["Capsules"])
 app.include_router(media.router, prefix="/api/media", tags=["Media"])
 app.include_router(notify.router, prefix="/api/notify", tags=["Notifications"])
+app.include_router(realtime.router, prefix="/api/realtime", tags=["Realtime"])
 
 
 @app.get("/")
@@ -74,6 +104,18 @@ async def health_check():
     return {"status": "healthy", "environment": settings.ENVIRONMENT}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint"""
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized"
+        )
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Time Capsule API starting up...")
@@ -81,8 +123,20 @@ async def startup_event():
     logger.info(f"Frontend URL: {settings.FRONTEND_URL}")
     logger.info(f"Storage Bucket: {settings.STORAGE_BUCKET}")
     logger.info(f"Allowed CORS origins: {allowed_origins}")
+    await EmailOutbox.start()
+    await UnlockScheduler.start()
+    await ThumbnailService.start()
+    await StorageCleanup.start()
+    await ResumableUploadService.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Time Capsule API shutting down...")
+    await UnlockScheduler.stop()
+    await ResumableUploadService.stop()
+    await ThumbnailService.stop()
+    await StorageCleanup.stop()
+    await EmailOutbox.stop()
+    await streaming.close()
+    stop_logging()
@@ -0,0 +1,106 @@
+from typing import Any, Callable, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Metrics live in the default registry of this process and are exposed in
+# Prometheus text format on /metrics. Label values are kept to bounded sets
+# (route templates, table/bucket names, operation names) so series counts
+# do not grow with traffic.
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+HTTP_REQUESTS = Counter(
+    "timecapsule_http_requests_total",
+    "HTTP requests by route template and status code",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "timecapsule_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+
+SUPABASE_CALL_DURATION = Histogram(
+    "timecapsule_supabase_call_duration_seconds",
+    "Time spent in a Supabase table, rpc, storage or auth call",
+    ["service", "target", "operation"],
+    buckets=LATENCY_BUCKETS
+)
+SUPABASE_CALL_ERRORS = Counter(
+    "timecapsule_supabase_call_errors_total",
+    "Supabase calls that raised",
+    ["service", "target", "operation"]
+)
+SUPABASE_POOL_WAIT = Histogram(
+    "timecapsule_supabase_pool_wait_seconds",
+    "Time a Supabase call waited for a worker thread (SUPABASE_MAX_CONCURRENCY)",
+    buckets=LATENCY_BUCKETS
+)
+
+EMAILS_QUEUED = Counter(
+    "timecapsule_emails_queued_total",
+    "Emails inserted into the outbox",
+    ["kind"]
+)
+EMAIL_DELIVERIES = Counter(
+    "timecapsule_email_deliveries_total",
+    "Email delivery attempts by outcome (sent, retry, failed)",
+    ["kind", "outcome"]
+)
+EMAIL_SEND_DURATION = Histogram(
+    "timecapsule_email_send_duration_seconds",
+    "Latency of one email provider request",
+    ["kind"],
+    buckets=LATENCY_BUCKETS
+)
+
+THUMBNAIL_JOBS = Counter(
+    "timecapsule_thumbnail_jobs_total",
+    "Image derivative jobs by outcome (stored, orphaned, failed)",
+    ["outcome"]
+)
+THUMBNAIL_RENDER_DURATION = Histogram(
+    "timecapsule_thumbnail_render_duration_seconds",
+    "Time to render one image's thumbnails and placeholder, including pool queueing",
+    buckets=LATENCY_BUCKETS
+)
+
+STORAGE_CLEANUP_OBJECTS = Counter(
+    "timecapsule_storage_cleanup_objects_total",
+    "Storage objects through the cleanup queue by outcome (queued, removed, retry, failed)",
+    ["outcome"]
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "timecapsule_log_records_dropped_total",
+    "Log records dropped because the logging queue was full"
+)
+
+
+def supabase_call_labels(func: Callable[..., Any]) -> Tuple[str, str, str]:
+    """(service, target, operation) for a blocking supabase-py call"""
+    owner = getattr(func, "__self__", None)
+    name = getattr(func, "__name__", "call")
+
+    request = getattr(owner, "request", None)
+    if request is not None:
+        # PostgREST builder: .../rest/v1/<table> or .../rest/v1/rpc/<function>
+        target = str(request.path).rsplit("/rest/v1/", 1)[-1]
+        method = getattr(request.http_method, "value", request.http_method)
+        if target.startswith("rpc/"):
+            return "rpc", target[len("rpc/"):], str(method)
+        return "table", target, str(method)
+
+    owner_type = type(owner).__name__
+    if "Bucket" in owner_type:
+        return "storage", str(getattr(owner, "id", "")), name
+    if "Auth" in owner_type or "GoTrue" in owner_type:
+        return "auth", "admin" if "Admin" in owner_type else "user", name
+    return "other", owner_type, name
+
+
+def render() -> Tuple[bytes, str]:
+    """Current metrics in Prometheus text format, with their content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,157 @@
+import re
+import time
+import uuid
+from typing import Callable, Dict, Optional
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .logging_config import debug_sampled_var, request_id_var, sample_debug
+from .metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS
+
+# Accepted incoming X-Request-ID values; anything else gets a fresh id
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over a size limit for the given path prefixes.
+    Requests with a large Content-Length are answered with 413 before the
+    body is read; chunked or mislabelled bodies are cut off as soon as the
+    running byte count crosses the limit, instead of after the multipart
+    parser has spooled the whole thing.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, path_prefixes: tuple):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_prefixes = path_prefixes
+
+    def _too_large(self) -> str:
+        return f"Request body exceeds {self.max_body_size / 1024 / 1024:.0f}MB limit"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_body_size:
+                    response = JSONResponse(
+                        {"detail": self._too_large()},
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=self._too_large()
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class MetricsMiddleware:
+    """
+    Count requests and record their latency per route template (for example
+    `/api/capsules/{capsule_id}`), so label values stay bounded no matter
+    which ids are requested. Requests that match no route share the
+    `unmatched` label.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._templates: Optional[Dict[Callable, str]] = None
+
+    def _route_template(self, scope: Scope) -> str:
+        # The router records the matched endpoint on the (shared) scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._templates is None:
+            self._templates = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self._templates.get(endpoint, "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def recording_send(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            method = scope["method"]
+            route = self._route_template(scope)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(
+                time.perf_counter() - started)
+
+
+class RequestContextMiddleware:
+    """
+    Give each HTTP or WebSocket request a correlation id for its log records.
+    A well-formed incoming `X-Request-ID` is reused, otherwise one is
+    generated; HTTP responses echo it back. Also rolls the request's debug
+    log sampling decision.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.fullmatch(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-request-id", request_id.encode())
+                ]
+            await send(message)
+
+        id_token = request_id_var.set(request_id)
+        sampled_token = debug_sampled_var.set(sample_debug())
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(id_token)
+            debug_sampled_var.reset(sampled_token)
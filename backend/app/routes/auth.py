@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime, timedelta, timezone
+import logging
 import secrets
 from jose import jwt
-from ..supabase_client import supabase, supabase_admin
+from ..supabase_client import supabase, run_blocking
 from ..schemas import UserSignup, UserLogin, TokenResponse, OtpStartRequest, OtpVerifyRequest, EmailVerificationRequest, EmailVerifyRequest
 from ..dependencies import get_current_user
 from ..services.email_service import EmailService
+from ..services.user_service import UserService
 from ..config import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -19,7 +23,7 @@ async def signup(user_data: UserSignup):
     """
     try:
         # Sign up user with Supabase
-        response = supabase.auth.sign_up({
+        response = await run_blocking(supabase.auth.sign_up, {
             "email": user_data.email,
             "password": user_data.password,
             "options": {
@@ -51,13 +55,12 @@ async def signup(user_data: UserSignup):
             "verification_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=15)).isoformat()
         }
 
-        supabase_admin.auth.admin.update_user_by_id(
-            user.id,
-            {"user_metadata": verification_data}
-        )
+        UserService.remember_user(user_data.email, user.id)
+        await UserService.update_user(
+            user.id, {"user_metadata": verification_data})
 
         # Send verification email
-        email_sent = EmailService.send_verification_email(
+        email_sent = await EmailService.send_verification_email(
             user_data.email, verification_code)
 
         return {
@@ -70,7 +73,7 @@ async def signup(user_data: UserSignup):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Signup error: {str(e)}")
+        logger.warning(f"Signup error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Signup failed: {str(e)}"
@@ -84,7 +87,7 @@ async def login(user_data: UserLogin):
     Requires email to be verified.
     """
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await run_blocking(supabase.auth.sign_in_with_password, {
             "email": user_data.email,
             "password": user_data.password
         })
@@ -125,7 +128,7 @@ async def login(user_data: UserLogin):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.warning(f"Login error: {type(e).__name__}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -140,12 +143,7 @@ async def request_email_verification(payload: EmailVerificationRequest):
     try:
         # Get user by email
         try:
-            user_response = supabase_admin.auth.admin.list_users()
-            user = None
-            for u in user_response:
-                if u.email == payload.email:
-                    user = u
-                    break
+            user = await UserService.get_user_by_email(payload.email)
         except:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -176,11 +174,11 @@ async def request_email_verification(payload: EmailVerificationRequest):
             "verification_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=15)).isoformat()
         })
 
-        supabase_admin.auth.admin.update_user_by_id(
+        await UserService.update_user(
             user.id, {"user_metadata": metadata})
 
         # Send verification email
-        email_sent = EmailService.send_verification_email(
+        email_sent = await EmailService.send_verification_email(
             payload.email, verification_code)
 
         return {
@@ -205,12 +203,7 @@ async def verify_email(payload: EmailVerifyRequest):
     try:
         # Get user by email
         try:
-            user_response = supabase_admin.auth.admin.list_users()
-            user = None
-            for u in user_response:
-                if u.email == payload.email:
-                    user = u
-                    break
+            user = await UserService.get_user_by_email(payload.email)
         except:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -255,7 +248,7 @@ async def verify_email(payload: EmailVerifyRequest):
         metadata.pop("verification_code", None)
         metadata.pop("verification_expires_at", None)
 
-        supabase_admin.auth.admin.update_user_by_id(
+        await UserService.update_user(
             user.id, {"user_metadata": metadata})
 
         return {"message": "Email verified successfully"}
@@ -281,12 +274,7 @@ async def otp_start(payload: OtpStartRequest):
         # Store OTP in a file/redis (for now using simple in-memory, but production should use Redis/DB)
         # We'll store it in user metadata temporarily
         try:
-            user_response = supabase_admin.auth.admin.list_users()
-            user = None
-            for u in user_response:
-                if u.email == payload.email:
-                    user = u
-                    break
+            user = await UserService.get_user_by_email(payload.email)
         except:
             # User doesn't exist yet, which is fine for OTP login (can be new user)
             user = None
@@ -299,11 +287,11 @@ async def otp_start(payload: OtpStartRequest):
                 "otp_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
                 "otp_purpose": payload.purpose
             })
-            supabase_admin.auth.admin.update_user_by_id(
+            await UserService.update_user(
                 user.id, {"user_metadata": metadata})
 
         # Send OTP via Resend
-        email_sent = EmailService.send_otp_email(payload.email, otp_code)
+        email_sent = await EmailService.send_otp_email(payload.email, otp_code)
 
         if not email_sent:
             raise HTTPException(
@@ -328,12 +316,7 @@ async def otp_verify(payload: OtpVerifyRequest):
     """
     try:
         # Find user by email
-        user_list = supabase_admin.auth.admin.list_users()
-        user = None
-        for u in user_list:
-            if u.email == payload.email:
-                user = u
-                break
+        user = await UserService.get_user_by_email(payload.email)
 
         if not user:
             raise HTTPException(
@@ -372,14 +355,14 @@ async def otp_verify(payload: OtpVerifyRequest):
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="New password is required"
                 )
-            supabase_admin.auth.admin.update_user_by_id(
+            await UserService.update_user(
                 user.id,
                 {"password": payload.new_password}
             )
             # Clear OTP from metadata
             metadata.pop("otp_code", None)
             metadata.pop("otp_expires_at", None)
-            supabase_admin.auth.admin.update_user_by_id(
+            await UserService.update_user(
                 user.id,
                 {"user_metadata": metadata}
             )
@@ -394,7 +377,7 @@ async def otp_verify(payload: OtpVerifyRequest):
         username = metadata.get("username", "")
         metadata.pop("otp_code", None)
         metadata.pop("otp_expires_at", None)
-        supabase_admin.auth.admin.update_user_by_id(
+        await UserService.update_user(
             user.id,
             {"user_metadata": metadata}
         )
@@ -436,7 +419,7 @@ async def otp_verify(payload: OtpVerifyRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"OTP verification error: {str(e)}")
+        logger.warning(f"OTP verification error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"OTP verification failed: {str(e)}"
@@ -450,7 +433,7 @@ async def logout(current_user: dict = Depends(get_current_user)):
     Note: With JWT, logout is mainly client-side (remove token).
     """
     try:
-        supabase.auth.sign_out()
+        await run_blocking(supabase.auth.sign_out)
         return {"message": "Successfully logged out"}
     except Exception as e:
         raise HTTPException(
@@ -464,5 +447,4 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """
     Get current authenticated user information.
     """
-    print(f"GET /me called, returning user: {current_user}")
     return current_user
@@ -1,16 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from ..schemas import CapsuleCreate, CapsuleUpdate, CapsuleResponse
+import logging
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from typing import Optional
+from ..schemas import CapsuleCreate, CapsuleUpdate, CapsuleResponse, CapsulePage, MessageResponse
 from ..dependencies import get_current_user
 from ..services.capsule_service import CapsuleService
 from ..services.email_service import EmailService
-from ..supabase_client import supabase_admin
-from datetime import datetime, timezone
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
+# Rows are validated into the response models and rendered with orjson
+router = APIRouter(default_response_class=ORJSONResponse)
 
-@router.post("/", response_model=dict, status_code=status.HTTP_201_CREATED)
+# Clients may keep the body but must revalidate it with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    )
+
+
+@router.post("/", response_model=CapsuleResponse, status_code=status.HTTP_201_CREATED)
 async def create_capsule(
     capsule_data: CapsuleCreate,
     current_user: dict = Depends(get_current_user)
@@ -20,62 +40,79 @@ async def create_capsule(
     Can be personal or group capsule.
     """
     try:
-        print(f"Creating capsule for user {current_user['id']}")
-        print(f"Capsule data: {capsule_data}")
-
         capsule = await CapsuleService.create_capsule(capsule_data, current_user["id"])
-        print(f"Capsule created: {capsule}")
-
-        # Send creation notification email (non-blocking, don't fail if email fails)
-        try:
-            if current_user.get("email"):
-                sent = EmailService.send_capsule_created_email(
-                    current_user["email"], capsule)
-                if sent:
-                    supabase_admin.table("capsules")\
-                        .update({"created_email_sent_at": datetime.now(timezone.utc).isoformat()})\
-                        .eq("id", capsule["id"])\
-                        .execute()
-        except Exception as email_err:
-            print(f"Email send failed (non-blocking): {str(email_err)}")
-            # Don't fail the capsule creation if email fails
-        
+
+        # Queue the creation email; the outbox workers deliver it and
+        # record created_email_sent_at, so this never waits on the provider
+        if current_user.get("email"):
+            await EmailService.send_capsule_created_email(
+                current_user["email"], capsule)
+
         return capsule
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Capsule creation error: {type(e).__name__}: {str(e)}")
+        logger.error(f"Capsule creation error: {type(e).__name__}: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create capsule: {str(e)}"
         )
 
 
-@router.get("/", response_model=List[dict])
-async def get_capsules(current_user: dict = Depends(get_current_user)):
+@router.get("/", response_model=CapsulePage)
+async def get_capsules(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
     """
-    Get all capsules owned by or shared with the current user.
+    Get capsules owned by or shared with the current user, newest first.
     Includes unlock status for each capsule.
+    Returns {"items": [...], "next_cursor": ...}; pass next_cursor back as
+    `cursor` to fetch the following page.
+    Sends an ETag; a matching If-None-Match is answered with 304 after a
+    version check that does not load any media.
     """
-    capsules = await CapsuleService.get_user_capsules(current_user["id"])
-    return capsules
+    if if_none_match:
+        etag = await CapsuleService.get_user_capsules_etag(
+            current_user["id"], limit, cursor)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+    page = await CapsuleService.get_user_capsules(current_user["id"], limit, cursor)
+    response.headers["ETag"] = CapsuleService.compute_etag(
+        page["items"], has_more=page["next_cursor"] is not None)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return page
 
 
-@router.get("/{capsule_id}", response_model=dict)
+@router.get("/{capsule_id}", response_model=CapsuleResponse)
 async def get_capsule(
     capsule_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get a specific capsule by ID.
     Enforces access control (owner or group member only).
     Media URLs are hidden if capsule is still locked.
+    Supports ETag / If-None-Match like the list endpoint.
     """
+    if if_none_match:
+        etag = await CapsuleService.get_capsule_etag(capsule_id, current_user["id"])
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
     capsule = await CapsuleService.get_capsule_by_id(capsule_id, current_user["id"])
+    response.headers["ETag"] = CapsuleService.compute_etag([capsule])
+    response.headers["Cache-Control"] = CACHE_CONTROL
     return capsule
 
 
-@router.put("/{capsule_id}", response_model=dict)
+@router.put("/{capsule_id}", response_model=CapsuleResponse)
 async def update_capsule(
     capsule_id: str,
     update_data: CapsuleUpdate,
@@ -90,7 +127,7 @@ async def update_capsule(
     return capsule
 
 
-@router.delete("/{capsule_id}")
+@router.delete("/{capsule_id}", response_model=MessageResponse)
 async def delete_capsule(
     capsule_id: str,
     current_user: dict = Depends(get_current_user)
@@ -1,23 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
-from app.supabase_client import supabase, supabase_admin
-from app.dependencies import get_current_user
+import logging
+import mimetypes
+import os
+import time
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File, status
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from app.supabase_client import supabase, supabase_admin, execute
+from app.dependencies import get_current_user, get_media_user
 from app.config import settings
 from app.services.capsule_service import CapsuleService
-import uuid
+from app.services.media_service import MediaService, SIGNED_URL_EXPIRES_IN
+from app.services.upload_service import ResumableUploadService
+from app.storage import LocalStorage, get_storage
+from app.streaming import stream_local_file, stream_url
+from app.schemas import (
+    BulkUploadResponse,
+    CapsuleMediaUrlsResponse,
+    MediaUploadResponse,
+    MessageResponse,
+    ResumableUploadCreate,
+    ResumableUploadSession,
+    ResumableUploadStatus,
+    SignedUrlResponse,
+    UploadPartResponse,
+)
 from datetime import datetime, timedelta, timezone
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
+router = APIRouter(default_response_class=ORJSONResponse)
 
-ALLOWED_TYPES = {
-    "image": ["image/jpeg", "image/png", "image/gif", "image/webp"],
-    "video": ["video/mp4", "video/webm", "video/quicktime"],
-    "audio": ["audio/mpeg", "audio/wav", "audio/ogg"],
-    "text": ["text/plain"]
-}
 
-
-@router.post("/upload/{capsule_id}", status_code=status.HTTP_201_CREATED)
+@router.post("/upload/{capsule_id}", response_model=MediaUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_media(
     capsule_id: str,
     file: UploadFile = File(...),
@@ -30,75 +44,31 @@ async def upload_media(
     """
 
     # Verify capsule exists and user has access
-    capsule = await CapsuleService.get_capsule_by_id(capsule_id, current_user["id"])
+    access = await CapsuleService.check_access(capsule_id, current_user["id"])
 
     # Check if capsule is already unlocked
-    if capsule["is_unlocked"]:
+    if access["is_unlocked"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot add media to an unlocked capsule"
         )
 
     # Validate file type
-    file_type_category = None
-    for category, mime_types in ALLOWED_TYPES.items():
-        if file.content_type in mime_types:
-            file_type_category = category
-            break
-
-    if not file_type_category:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type {file.content_type} not supported"
-        )
-
-    # Check file size
-    file_content = await file.read()
-    if len(file_content) > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds {settings.MAX_FILE_SIZE / 1024 / 1024}MB limit"
-        )
+    file_type_category = MediaService.resolve_file_type(file.content_type)
 
-    # Generate unique filename
-    file_extension = file.filename.split(
-        ".")[-1] if "." in file.filename else ""
-    unique_filename = f"{current_user['id']}/{capsule_id}/{uuid.uuid4()}.{file_extension}"
+    # Stream the upload to a temp file, enforcing the size limit per chunk
+    spooled = await MediaService.spool_upload(file)
 
     try:
-        # Upload to Supabase Storage
-        storage_response = supabase_admin.storage.from_(settings.STORAGE_BUCKET).upload(
-            unique_filename,
-            file_content,
-            {
-                "content-type": file.content_type,
-                "cache-control": "3600"
-            }
+        media_record = await MediaService.store_media(
+            capsule_id,
+            current_user["id"],
+            file.filename,
+            file.content_type,
+            file_type_category,
+            spooled
         )
 
-        # Create media record in database
-        media_data = {
-            "capsule_id": capsule_id,
-            "filename": file.filename,
-            "file_path": unique_filename,
-            "file_type": file_type_category,
-            "uploaded_at": datetime.now(timezone.utc).isoformat()
-        }
-
-        db_response = supabase_admin.table(
-            "media").insert(media_data).execute()
-
-        if not db_response.data:
-            # Rollback: delete uploaded file
-            supabase_admin.storage.from_(
-                settings.STORAGE_BUCKET).remove([unique_filename])
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to save media record"
-            )
-
-        media_record = db_response.data[0]
-
         return {
             "id": media_record["id"],
             "filename": file.filename,
@@ -107,37 +77,207 @@ async def upload_media(
             "message": "Media uploaded successfully"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Upload failed: {str(e)}"
         )
+    finally:
+        MediaService.discard(spooled)
 
 
-@router.get("/{media_id}/url")
-async def get_media_url(
-    media_id: str,
+@router.post("/bulk-upload/{capsule_id}", response_model=BulkUploadResponse, status_code=status.HTTP_201_CREATED)
+async def bulk_upload_media(
+    capsule_id: str,
+    files: List[UploadFile] = File(...),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Get a signed URL for accessing media.
-    Only works if the capsule is unlocked.
-    Signed URL expires after 1 hour.
+    Upload many files to a capsule in one multipart request (repeat the
+    `files` field). Access is checked once; files are stored concurrently
+    and their media rows inserted in one batch. Each file gets its own
+    result, so one rejected file does not fail the others.
+    """
+
+    access = await CapsuleService.check_access(capsule_id, current_user["id"])
+
+    if access["is_unlocked"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot add media to an unlocked capsule"
+        )
+
+    if len(files) > settings.MAX_BULK_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files. Maximum per request: {settings.MAX_BULK_FILES}"
+        )
+
+    try:
+        results = await MediaService.store_media_batch(capsule_id, current_user["id"], files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(e)}"
+        )
+
+    uploaded = sum(1 for result in results if result["status"] == "uploaded")
+    return {
+        "capsule_id": capsule_id,
+        "uploaded": uploaded,
+        "failed": len(results) - uploaded,
+        "results": results
+    }
+
+
+@router.post("/upload/{capsule_id}/resumable", response_model=ResumableUploadSession, status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    capsule_id: str,
+    upload_data: ResumableUploadCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start a resumable upload for a large file.
+    Returns the part size and count; send each part to
+    PUT /uploads/{upload_id}/parts/{part_number} (in any order, in parallel),
+    then call POST /uploads/{upload_id}/complete.
     """
-    import logging
-    logger = logging.getLogger(__name__)
+    return await ResumableUploadService.create_upload(
+        capsule_id, current_user["id"], upload_data)
+
+
+@router.get("/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def get_resumable_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get upload progress: acknowledged parts, missing parts and the
+    contiguous byte offset a client can resume from.
+    """
+    upload = await ResumableUploadService.get_upload(upload_id, current_user["id"])
+    return ResumableUploadService.describe(upload)
+
 
-    logger.info(
-        f"Getting media URL for media_id: {media_id}, user: {current_user.get('id')}")
+@router.put("/uploads/{upload_id}/parts/{part_number}", response_model=UploadPartResponse)
+async def upload_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload one part as the raw request body.
+    Every part except the last must be exactly `part_size` bytes.
+    """
+    content_length = request.headers.get("content-length")
+    return await ResumableUploadService.upload_part(
+        upload_id,
+        part_number,
+        current_user["id"],
+        request.stream(),
+        int(content_length) if content_length and content_length.isdigit() else None
+    )
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=MediaUploadResponse, status_code=status.HTTP_201_CREATED)
+async def complete_resumable_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Assemble the uploaded parts into the final media file.
+    """
+    return await ResumableUploadService.complete_upload(upload_id, current_user["id"])
 
+
+@router.delete("/uploads/{upload_id}", response_model=MessageResponse)
+async def abort_resumable_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Abort an unfinished upload and delete its parts.
+    """
+    return await ResumableUploadService.abort_upload(upload_id, current_user["id"])
+
+
+@router.get("/capsule/{capsule_id}/urls", response_model=CapsuleMediaUrlsResponse)
+async def get_capsule_media_urls(
+    capsule_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get signed URLs for every media item in a capsule in one call.
+    Access and unlock state are checked once and all paths, image
+    thumbnails included, are signed with a single storage request. Returns
+    a {media_id: url} map and a {media_id: {size: url}} thumbnail map; the
+    URLs load without an Authorization header (e.g. in <img srcset>).
+    """
+    capsule = await CapsuleService.get_capsule_by_id(capsule_id, current_user["id"])
+
+    if not capsule["is_unlocked"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Capsule is still locked. Media will be available after unlock date."
+        )
+
+    media_items = capsule.get("media") or []
+    try:
+        signed = await MediaService.create_signed_urls([
+            path for media in media_items for path in MediaService.object_paths(media)
+        ])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate URLs: {str(e)}"
+        )
+
+    urls = {
+        media["id"]: signed[media["file_path"]]
+        for media in media_items
+        if media["file_path"] in signed
+    }
+    thumbnails = {}
+    for media in media_items:
+        sizes = {
+            size: signed[path]
+            for size, path in (media.get("thumbnail_paths") or {}).items()
+            if path in signed
+        }
+        if sizes:
+            thumbnails[media["id"]] = sizes
+
+    entries = [*urls.values(), *(entry for sizes in thumbnails.values() for entry in sizes.values())]
+    return {
+        "urls": {media_id: entry.url for media_id, entry in urls.items()},
+        "thumbnails": {
+            media_id: {size: entry.url for size, entry in sizes.items()}
+            for media_id, sizes in thumbnails.items()
+        },
+        "expires_in": min(
+            (entry.expires_in for entry in entries),
+            default=SIGNED_URL_EXPIRES_IN
+        )
+    }
+
+
+async def _get_unlocked_media(media_id: str, current_user: dict) -> dict:
+    """
+    Load a media row for a user who may read it: the user must have access
+    to its capsule and the capsule must be unlocked.
+    """
     # Get media record
-    media_response = supabase_admin.table("media")\
-        .select("*, capsules!media_capsule_id_fkey(*)")\
-        .eq("id", media_id)\
-        .execute()
+    media_response = await execute(supabase_admin.table("media")
+                                   .select("*, capsules!media_capsule_id_fkey(*)")
+                                   .eq("id", media_id))
 
     if not media_response.data:
-        logger.warning(f"Media not found: {media_id}")
+        logger.debug("Media not found: %s", media_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Media not found"
@@ -145,53 +285,57 @@ async def get_media_url(
 
     media = media_response.data[0]
     capsule = media["capsules"]
-    logger.info(
-        f"Found media: {media['filename']}, capsule_id: {capsule['id']}")
+    logger.debug("Found media %s in capsule %s", media["filename"], capsule["id"])
 
-    # Verify access to capsule
-    await CapsuleService.get_capsule_by_id(capsule["id"], current_user["id"])
+    # Verify access to capsule (reuses the joined capsule row on a cache miss)
+    await CapsuleService.check_access(
+        capsule["id"], current_user["id"], capsule=capsule)
 
     # Check if capsule is unlocked
     unlock_date = datetime.fromisoformat(
         capsule["unlock_date"].replace("Z", "+00:00"))
     is_unlocked = datetime.now(timezone.utc) >= unlock_date
-    logger.info(
-        f"Capsule unlock check: unlock_date={unlock_date}, is_unlocked={is_unlocked}")
+    logger.debug("Capsule unlock check: unlock_date=%s, is_unlocked=%s",
+                 unlock_date, is_unlocked)
 
     if not is_unlocked:
-        logger.warning(f"Capsule still locked: {capsule['id']}")
+        logger.debug("Capsule still locked: %s", capsule["id"])
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Capsule is still locked. Media will be available after unlock date."
         )
 
-    # Generate signed URL (valid for 1 hour)
+    return media
+
+
+@router.get("/{media_id}/url", response_model=SignedUrlResponse)
+async def get_media_url(
+    media_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get a signed URL for accessing media.
+    Only works if the capsule is unlocked.
+    Signed URL expires after 1 hour.
+    """
+    logger.debug("Getting media URL for %s, user %s", media_id, current_user["id"])
+    media = await _get_unlocked_media(media_id, current_user)
+
+    # Signed URL (valid for 1 hour, reused from cache while still fresh)
     try:
-        logger.info(f"Creating signed URL for file: {media['file_path']}")
-        signed_url_response = supabase_admin.storage.from_(settings.STORAGE_BUCKET)\
-            .create_signed_url(media["file_path"], 3600)
-
-        logger.info(
-            f"Signed URL response type: {type(signed_url_response)}, value: {signed_url_response}")
-
-        # Handle both possible response formats
-        if isinstance(signed_url_response, dict):
-            signed_url = signed_url_response.get(
-                "signedURL") or signed_url_response.get("signed_url")
-        else:
-            signed_url = str(signed_url_response)
-
-        if not signed_url:
-            logger.error(f"Unexpected response format: {signed_url_response}")
+        signed = await MediaService.create_signed_url(media["file_path"])
+
+        if not signed:
+            logger.error(f"Could not sign file: {media['file_path']}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to generate signed URL: Invalid response format"
             )
 
-        logger.info(f"Successfully generated signed URL for media: {media_id}")
+        logger.debug("Returning signed URL for media %s", media_id)
         return {
-            "url": signed_url,
-            "expires_in": 3600
+            "url": signed.url,
+            "expires_in": signed.expires_in
         }
 
     except HTTPException:
@@ -205,7 +349,83 @@ async def get_media_url(
         )
 
 
-@router.delete("/{media_id}")
+@router.get("/{media_id}/stream", response_class=StreamingResponse)
+async def stream_media(
+    media_id: str,
+    request: Request,
+    size: Optional[str] = Query(None, description="Thumbnail size (longest edge in px)"),
+    current_user: dict = Depends(get_media_user)
+):
+    """
+    Stream a media file's bytes, with the same access and unlock checks as
+    the signed URL endpoint. Supports Range and If-Range, so players can
+    start immediately and seek without downloading the whole file.
+    With `size`, streams that thumbnail of an image instead.
+    Authenticate with the Authorization header or `?token=<access token>`.
+    """
+    media = await _get_unlocked_media(media_id, current_user)
+
+    if size is not None:
+        path = (media.get("thumbnail_paths") or {}).get(size)
+        if not path:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Thumbnail not found"
+            )
+        media_type = "image/webp"
+    else:
+        path = media["file_path"]
+        media_type = (mimetypes.guess_type(media["filename"])[0]
+                      or mimetypes.guess_type(path)[0]
+                      or "application/octet-stream")
+    headers = {"Cache-Control": f"private, max-age={SIGNED_URL_EXPIRES_IN}"}
+
+    local_path = get_storage().local_path(path)
+    if local_path:
+        return stream_local_file(local_path, request.headers, media_type, headers)
+
+    signed = await MediaService.create_signed_url(path)
+    if not signed:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to open media stream"
+        )
+    return await stream_url(signed.url, request.headers, media_type, headers)
+
+
+@router.get("/files/{path:path}", include_in_schema=False)
+async def get_signed_file(
+    path: str,
+    expires: int = Query(...),
+    signature: str = Query(...)
+):
+    """
+    Serve an object from local storage (STORAGE_BACKEND=local) to the holder
+    of a signed URL. The URL's HMAC stands in for authentication, like a
+    Supabase signed URL does.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    if not storage.verify(path, expires, signature):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired signature"
+        )
+
+    local_path = storage.local_path(path)
+    if not os.path.isfile(local_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    return FileResponse(
+        local_path,
+        media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        headers={"Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}"}
+    )
+
+
+@router.delete("/{media_id}", response_model=MessageResponse)
 async def delete_media(
     media_id: str,
     current_user: dict = Depends(get_current_user)
@@ -216,10 +436,9 @@ async def delete_media(
     """
 
     # Get media record
-    media_response = supabase_admin.table("media")\
-        .select("*, capsules!media_capsule_id_fkey(*)")\
-        .eq("id", media_id)\
-        .execute()
+    media_response = await execute(supabase_admin.table("media")
+                                   .select("*, capsules!media_capsule_id_fkey(*)")
+                                   .eq("id", media_id))
 
     if not media_response.data:
         raise HTTPException(
@@ -249,12 +468,12 @@ async def delete_media(
         )
 
     try:
-        # Delete from storage
-        supabase_admin.storage.from_(settings.STORAGE_BUCKET).remove(
-            [media["file_path"]])
-
         # Delete from database
-        supabase_admin.table("media").delete().eq("id", media_id).execute()
+        await execute(supabase_admin.table("media").delete().eq("id", media_id))
+
+        # Drop the row's reference; the file and its thumbnails are queued
+        # for removal unless the same content is attached elsewhere
+        await MediaService.release_media([media])
 
         return {"message": "Media deleted successfully"}
 
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from ..config import settings
+from ..dependencies import decode_access_token
+from ..services.realtime_service import RealtimeService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.websocket("/ws")
+async def realtime_events(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    Push channel for capsule events (`capsule_unlocked`, `media_added`).
+    Authenticate with `?token=<access token>`, since browsers cannot set
+    headers on WebSocket requests. The server sends `{"type": "ping"}` every
+    WS_HEARTBEAT_SECONDS and clients answer `{"type": "pong"}`; clients may
+    also send their own pings. A connection that stays silent for two
+    heartbeats, or whose token expires, is closed.
+    """
+    try:
+        user = decode_access_token(token or "")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    for evicted in RealtimeService.connect(user["id"], websocket):
+        try:
+            await evicted.close(code=status.WS_1008_POLICY_VIOLATION,
+                                reason="Too many connections")
+        except Exception:
+            pass
+
+    last_seen = time.monotonic()
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_SECONDS)
+            if time.monotonic() - last_seen > 2 * settings.WS_HEARTBEAT_SECONDS:
+                await websocket.close(code=status.WS_1001_GOING_AWAY, reason="Heartbeat timeout")
+                return
+            try:
+                # Cached until the token's expiry, then re-verified (and rejected)
+                decode_access_token(token)
+            except HTTPException:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                return
+            await websocket.send_json({"type": "ping"})
+
+    await websocket.send_json({"type": "connected", "user_id": user["id"]})
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            last_seen = time.monotonic()
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        heartbeat_task.cancel()
+        RealtimeService.disconnect(user["id"], websocket)
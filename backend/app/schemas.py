@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -59,20 +59,23 @@ class CapsuleUpdate(BaseModel):
 
 class MediaItem(BaseModel):
     id: str
+    capsule_id: Optional[str] = None
     filename: str
     file_type: str
     file_url: Optional[str] = None
+    blurhash: Optional[str] = None  # placeholder until the image loads
     uploaded_at: datetime
 
 
 class CapsuleResponse(BaseModel):
     id: str
     title: str
-    description: Optional[str]
+    description: Optional[str] = None
     unlock_date: datetime
     created_at: datetime
+    updated_at: Optional[datetime] = None
     is_unlocked: bool
-    is_group: bool
+    is_group: bool = False
     owner_id: str
     media: List[MediaItem] = []
 
@@ -80,10 +83,76 @@ class CapsuleResponse(BaseModel):
         from_attributes = True
 
 
+class CapsulePage(BaseModel):
+    items: List[CapsuleResponse]
+    next_cursor: Optional[str] = None
+
+
+class MessageResponse(BaseModel):
+    message: str
+
+
 # Media Schemas
 class MediaUploadResponse(BaseModel):
     id: str
     filename: str
     file_type: str
-    file_url: str
     capsule_id: str
+    message: str
+
+
+class BulkUploadItem(BaseModel):
+    filename: str
+    status: str  # "uploaded" or "failed"
+    id: Optional[str] = None
+    file_type: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkUploadResponse(BaseModel):
+    capsule_id: str
+    uploaded: int
+    failed: int
+    results: List[BulkUploadItem]  # one per file, in request order
+
+
+class SignedUrlResponse(BaseModel):
+    url: str
+    expires_in: int
+
+
+class CapsuleMediaUrlsResponse(BaseModel):
+    urls: Dict[str, str]  # media id -> signed URL
+    thumbnails: Dict[str, Dict[str, str]] = {}  # media id -> {longest edge in px: signed URL}
+    expires_in: int
+
+
+class ResumableUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(..., gt=0)
+
+
+class ResumableUploadSession(BaseModel):
+    upload_id: str
+    part_size: int
+    part_count: int
+    expires_at: datetime
+
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    status: str
+    part_size: int
+    part_count: int
+    parts: List[int]
+    missing_parts: List[int]
+    uploaded_bytes: int
+    next_offset: int
+    media_id: Optional[str] = None
+    expires_at: datetime
+
+
+class UploadPartResponse(BaseModel):
+    part_number: int
+    size: int
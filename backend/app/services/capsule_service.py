@@ -1,8 +1,23 @@
+import base64
+import hashlib
+import logging
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from fastapi import HTTPException, status
-from ..supabase_client import supabase, supabase_admin
+from ..cache import TTLCache
+from ..config import settings
+from ..supabase_client import supabase, supabase_admin, execute
 from ..schemas import CapsuleCreate, CapsuleUpdate, CapsuleResponse
+from .media_service import MediaService
+from .storage_cleanup import StorageCleanup
+from .unlock_service import UnlockScheduler, UnlockService
+
+logger = logging.getLogger(__name__)
+
+# capsule id -> {"owner_id", "is_group", "unlock_date", "roles": {user id: role}}
+# Keyed per capsule so an update or delete drops every user's entry at once.
+_access_cache = TTLCache(
+    maxsize=settings.ACCESS_CACHE_SIZE, ttl=settings.ACCESS_CACHE_TTL_SECONDS)
 
 
 class CapsuleService:
@@ -29,15 +44,9 @@ class CapsuleService:
                 "created_at": datetime.now(timezone.utc).isoformat(),
             }
 
-            print(f"Inserting capsule: {capsule_dict}")
-
             # Insert capsule
-            response = supabase_admin.table(
-                "capsules").insert(capsule_dict).execute()
-
-            print(f"Insert response: {response}")
-            print(
-                f"Response data: {response.data if hasattr(response, 'data') else 'NO DATA ATTR'}")
+            response = await execute(supabase_admin.table(
+                "capsules").insert(capsule_dict))
 
             if not response.data:
                 raise HTTPException(
@@ -46,6 +55,9 @@ class CapsuleService:
                 )
 
             capsule = response.data[0]
+            capsule["is_unlocked"] = False  # unlock date was checked above
+            logger.debug("Created capsule %s for owner %s", capsule["id"], user_id)
+            UnlockScheduler.schedule(capsule)
 
             # If group capsule, add members
             if capsule_data.is_group and capsule_data.group_members:
@@ -56,67 +68,184 @@ class CapsuleService:
                     }
                     for member_id in capsule_data.group_members
                 ]
-                supabase_admin.table("capsule_members").insert(
-                    members_data).execute()
+                await execute(supabase_admin.table("capsule_members").insert(
+                    members_data))
+                CapsuleService.forget_access(capsule["id"])
 
             return capsule
         except HTTPException:
             raise
         except Exception as e:
-            print(
-                f"Capsule creation database error: {type(e).__name__}: {str(e)}")
+            logger.error(
+                f"Capsule creation database error: {type(e).__name__}: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create capsule: {str(e)}"
             )
 
     @staticmethod
-    async def get_user_capsules(user_id: str) -> List[dict]:
-        """Get all capsules owned by or shared with the user"""
-
-        # Get owned capsules
-        # Use !media_capsule_id_fkey to specify which foreign key relationship to use
-        owned = supabase_admin.table("capsules")\
-            .select("*, media!media_capsule_id_fkey(*)")\
-            .eq("owner_id", user_id)\
-            .order("created_at", desc=True)\
-            .execute()
-
-        # Get shared capsules (via group membership)
-        shared_response = supabase_admin.table("capsule_members")\
-            .select("capsule_id")\
-            .eq("user_id", user_id)\
-            .execute()
-
-        shared_ids = [item["capsule_id"] for item in shared_response.data]
-
-        shared_capsules = []
-        if shared_ids:
-            shared = supabase_admin.table("capsules")\
-                .select("*, media!media_capsule_id_fkey(*)")\
-                .in_("id", shared_ids)\
-                .execute()
-            shared_capsules = shared.data
-
-        # Combine and check unlock status
-        all_capsules = owned.data + shared_capsules
-
-        for capsule in all_capsules:
-            unlock_date = datetime.fromisoformat(
-                capsule["unlock_date"].replace("Z", "+00:00"))
-            capsule["is_unlocked"] = datetime.utcnow(
-            ) >= unlock_date.replace(tzinfo=None)
-
-        return all_capsules
+    def encode_cursor(capsule: dict) -> str:
+        """Keyset cursor pointing just past a capsule in (created_at, id) order"""
+        raw = f"{capsule['created_at']}|{capsule['id']}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
     @staticmethod
-    async def get_capsule_by_id(capsule_id: str, user_id: str) -> dict:
-        """Get a specific capsule with access control"""
+    def decode_cursor(cursor: str) -> Tuple[str, str]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created_at, capsule_id = base64.urlsafe_b64decode(
+                padded.encode()).decode().split("|", 1)
+            datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+            return created_at, capsule_id
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+    @staticmethod
+    def _page_params(user_id: str, limit: int, cursor: Optional[str]) -> dict:
+        # One extra row tells us whether another page exists
+        params = {"p_user_id": user_id, "p_limit": limit + 1}
+        if cursor:
+            cursor_created_at, cursor_id = CapsuleService.decode_cursor(cursor)
+            params["p_cursor_created_at"] = cursor_created_at
+            params["p_cursor_id"] = cursor_id
+        return params
+
+    @staticmethod
+    def compute_etag(capsules: List[dict], has_more: bool = False) -> str:
+        """
+        Strong ETag for a capsule payload. It changes whenever a capsule or
+        its media changes (both bump `updated_at`) or a capsule crosses its
+        unlock time, which is what flips `is_unlocked` and the media fields.
+        """
+        digest = hashlib.sha256()
+        for capsule in capsules:
+            updated_at = capsule.get("updated_at") or ""
+            if updated_at:
+                updated_at = datetime.fromisoformat(
+                    updated_at.replace("Z", "+00:00")).isoformat()
+            unlocked = UnlockService.is_capsule_unlocked(capsule["unlock_date"])
+            digest.update(f"{capsule['id']}|{updated_at}|{int(unlocked)};".encode())
+        digest.update(b"more" if has_more else b"end")
+        return f'"{digest.hexdigest()[:32]}"'
+
+    @staticmethod
+    async def get_user_capsules_etag(
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> str:
+        """ETag of a capsule list page, computed without loading any media"""
+        response = await execute(supabase_admin.rpc(
+            "list_user_capsule_versions",
+            CapsuleService._page_params(user_id, limit, cursor)))
+        rows = response.data or []
+        return CapsuleService.compute_etag(rows[:limit], has_more=len(rows) > limit)
 
-        response = supabase_admin.table("capsules")\
-            .select("*, media!media_capsule_id_fkey(*)")\
-            .eq("id", capsule_id)\
-            .execute()
+    @staticmethod
+    async def get_user_capsules(
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> dict:
+        """
+        Get one page of capsules owned by or shared with the user, newest first.
+        Backed by the `list_user_capsules` database function, which unions
+        owned and shared capsules and embeds their media in a single query.
+        """
+        response = await execute(supabase_admin.rpc(
+            "list_user_capsules",
+            CapsuleService._page_params(user_id, limit, cursor)))
+
+        capsules = response.data or []
+        has_more = len(capsules) > limit
+        capsules = capsules[:limit]
+
+        for capsule in capsules:
+            capsule["is_unlocked"] = UnlockService.is_capsule_unlocked(
+                capsule["unlock_date"])
+            MediaService.present_media(capsule.get("media") or [], capsule["is_unlocked"])
+
+        return {
+            "items": capsules,
+            "next_cursor": CapsuleService.encode_cursor(capsules[-1]) if has_more else None
+        }
+
+    @staticmethod
+    def forget_access(capsule_id: str) -> None:
+        """Drop cached access entries after a capsule or its members change"""
+        _access_cache.pop(capsule_id)
+
+    @staticmethod
+    async def check_access(
+        capsule_id: str,
+        user_id: str,
+        capsule: Optional[dict] = None
+    ) -> dict:
+        """
+        Resolve the user's role on a capsule ("owner" or "member") without
+        loading its media. Roles are cached per process, so repeated checks
+        (e.g. a batch of uploads) skip both the capsule and member queries.
+        Pass an already-loaded capsule row to avoid fetching it on a miss.
+        Raises 404 if the capsule does not exist and 403 without access.
+        """
+        entry = _access_cache.get(capsule_id)
+        if entry is None:
+            if capsule is None:
+                response = await execute(supabase_admin.table("capsules")
+                                         .select("id, owner_id, is_group, unlock_date")
+                                         .eq("id", capsule_id))
+                if not response.data:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Capsule not found"
+                    )
+                capsule = response.data[0]
+
+            entry = {
+                "owner_id": capsule["owner_id"],
+                "is_group": capsule["is_group"],
+                "unlock_date": capsule["unlock_date"],
+                "roles": {}
+            }
+            _access_cache.set(capsule_id, entry)
+
+        role = entry["roles"].get(user_id)
+        if role is None:
+            role = "none"
+            if entry["owner_id"] == user_id:
+                role = "owner"
+            elif entry["is_group"]:
+                member_check = await execute(supabase_admin.table("capsule_members")
+                                             .select("user_id")
+                                             .eq("capsule_id", capsule_id)
+                                             .eq("user_id", user_id))
+                if member_check.data:
+                    role = "member"
+            entry["roles"][user_id] = role
+
+        if role == "none":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have access to this capsule"
+            )
+
+        return {
+            "role": role,
+            "owner_id": entry["owner_id"],
+            "is_group": entry["is_group"],
+            "unlock_date": entry["unlock_date"],
+            "is_unlocked": UnlockService.is_capsule_unlocked(entry["unlock_date"])
+        }
+
+    @staticmethod
+    async def get_capsule_etag(capsule_id: str, user_id: str) -> str:
+        """ETag of a capsule's detail payload, checked without the media join"""
+        response = await execute(supabase_admin.table("capsules")
+                                 .select("id, owner_id, is_group, unlock_date, updated_at")
+                                 .eq("id", capsule_id))
 
         if not response.data:
             raise HTTPException(
@@ -125,36 +254,34 @@ class CapsuleService:
             )
 
         capsule = response.data[0]
+        await CapsuleService.check_access(capsule_id, user_id, capsule=capsule)
+        return CapsuleService.compute_etag([capsule])
 
-        # Check access rights
-        is_owner = capsule["owner_id"] == user_id
+    @staticmethod
+    async def get_capsule_by_id(capsule_id: str, user_id: str) -> dict:
+        """Get a specific capsule with access control"""
 
-        # Check if user is a group member
-        is_member = False
-        if capsule["is_group"]:
-            member_check = supabase_admin.table("capsule_members")\
-                .select("*")\
-                .eq("capsule_id", capsule_id)\
-                .eq("user_id", user_id)\
-                .execute()
-            is_member = len(member_check.data) > 0
+        response = await execute(supabase_admin.table("capsules")
+                                 .select("*, media!media_capsule_id_fkey(*)")
+                                 .eq("id", capsule_id))
 
-        if not is_owner and not is_member:
+        if not response.data:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have access to this capsule"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Capsule not found"
             )
 
+        capsule = response.data[0]
+
+        # Check access rights (membership is cached per capsule and user)
+        await CapsuleService.check_access(capsule_id, user_id, capsule=capsule)
+
         # Check if unlocked
-        unlock_date = datetime.fromisoformat(
-            capsule["unlock_date"].replace("Z", "+00:00"))
-        capsule["is_unlocked"] = datetime.utcnow(
-        ) >= unlock_date.replace(tzinfo=None)
+        capsule["is_unlocked"] = UnlockService.is_capsule_unlocked(
+            capsule["unlock_date"])
 
-        # If locked, hide media URLs
-        if not capsule["is_unlocked"] and capsule.get("media"):
-            for media in capsule["media"]:
-                media["file_url"] = None
+        # If locked, hide media URLs and placeholders
+        MediaService.present_media(capsule.get("media") or [], capsule["is_unlocked"])
 
         return capsule
 
@@ -166,16 +293,16 @@ class CapsuleService:
     ) -> dict:
         """Update a capsule (only if not unlocked yet)"""
 
-        # Get capsule and verify ownership
-        capsule = await CapsuleService.get_capsule_by_id(capsule_id, user_id)
+        # Verify ownership
+        access = await CapsuleService.check_access(capsule_id, user_id)
 
-        if capsule["owner_id"] != user_id:
+        if access["role"] != "owner":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Only the owner can update this capsule"
             )
 
-        if capsule["is_unlocked"]:
+        if access["is_unlocked"]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Cannot update an unlocked capsule"
@@ -186,7 +313,7 @@ class CapsuleService:
             exclude_unset=True).items()}
 
         if "unlock_date" in update_dict:
-            if update_dict["unlock_date"] <= datetime.utcnow():
+            if update_dict["unlock_date"] <= datetime.now(timezone.utc):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Unlock date must be in the future"
@@ -194,12 +321,19 @@ class CapsuleService:
             update_dict["unlock_date"] = update_dict["unlock_date"].isoformat()
 
         # Update capsule
-        response = supabase_admin.table("capsules")\
-            .update(update_dict)\
-            .eq("id", capsule_id)\
-            .execute()
+        response = await execute(supabase_admin.table("capsules")
+                                 .update(update_dict)
+                                 .eq("id", capsule_id))
+        CapsuleService.forget_access(capsule_id)
 
-        return response.data[0] if response.data else capsule
+        if response.data:
+            capsule = response.data[0]
+            capsule["is_unlocked"] = UnlockService.is_capsule_unlocked(
+                capsule["unlock_date"])
+            if "unlock_date" in update_dict:
+                UnlockScheduler.schedule(capsule)
+            return capsule
+        return await CapsuleService.get_capsule_by_id(capsule_id, user_id)
 
     @staticmethod
     async def delete_capsule(capsule_id: str, user_id: str):
@@ -214,17 +348,21 @@ class CapsuleService:
                 detail="Only the owner can delete this capsule"
             )
 
-        # Delete media files from storage
-        if capsule.get("media"):
-            for media in capsule["media"]:
-                try:
-                    supabase_admin.storage.from_(
-                        "capsule-media").remove([media["file_path"]])
-                except:
-                    pass  # Continue even if file deletion fails
-
-        # Delete capsule (cascade will delete media records and members)
-        supabase_admin.table("capsules").delete().eq(
-            "id", capsule_id).execute()
+        # Delete the capsule (cascade deletes media records, members and
+        # upload sessions) in the same transaction that releases the media's
+        # stored objects and queues those no other capsule shares, with their
+        # thumbnails and any uploaded parts, for background removal, so the
+        # request does not wait on storage
+        response = await execute(supabase_admin.rpc("delete_capsule", {
+            "p_capsule_id": capsule_id,
+            "p_owner_id": user_id
+        }))
+        paths = response.data or []
+        if paths:
+            MediaService.forget_signed_urls(paths)
+            StorageCleanup.queued(len(paths))
+
+        CapsuleService.forget_access(capsule_id)
+        UnlockScheduler.unschedule(capsule_id)
 
         return {"message": "Capsule deleted successfully"}
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import parseaddr
+from typing import List, Optional, Tuple
+import httpx
+from ..config import settings
+from ..metrics import EMAIL_DELIVERIES, EMAIL_SEND_DURATION
+from ..supabase_client import supabase_admin, execute
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_SEND_URL = "https://api.sendgrid.com/v3/mail/send"
+
+# Capsule column stamped once a message of this kind is delivered
+SENT_AT_COLUMNS = {
+    "capsule_created": "created_email_sent_at",
+    "capsule_reminder": "reminder_email_sent_at",
+}
+
+# Shared by all workers in this process; created on startup
+_client: Optional[httpx.AsyncClient] = None
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+
+
+class EmailOutbox:
+    """
+    Durable queue for outgoing email, backed by the `email_outbox` table.
+    Request handlers only insert rows; a pool of EMAIL_WORKERS background
+    tasks claims due messages, sends them through one long-lived pooled HTTP
+    client and records the outcome. Failed sends are retried with
+    exponential backoff up to EMAIL_MAX_ATTEMPTS. Delivery is at least once:
+    a worker that dies mid-send leaves its messages to be re-claimed after
+    EMAIL_LEASE_SECONDS. Message bodies (which may hold one-time codes) are
+    cleared once a message is settled, and settled rows are deleted after
+    EMAIL_RETENTION_DAYS.
+    """
+
+    @staticmethod
+    async def enqueue(messages: List[dict]) -> List[dict]:
+        """
+        Insert outbox rows and wake the local workers. Messages whose
+        dedupe_key is already queued are skipped; returns the rows inserted.
+        """
+        if not messages:
+            return []
+        response = await execute(
+            supabase_admin.table("email_outbox")
+            .upsert(messages, on_conflict="dedupe_key", ignore_duplicates=True))
+        EmailOutbox.wake()
+        return response.data or []
+
+    @staticmethod
+    def wake() -> None:
+        if _wakeup is not None:
+            _wakeup.set()
+
+    @staticmethod
+    async def _claim() -> List[dict]:
+        response = await execute(supabase_admin.rpc("claim_email_outbox", {
+            "p_limit": settings.EMAIL_BATCH_SIZE,
+            "p_lease_seconds": settings.EMAIL_LEASE_SECONDS
+        }))
+        return response.data or []
+
+    @staticmethod
+    async def _deliver(message: dict) -> Tuple[bool, bool, Optional[str]]:
+        """Send one message. Returns (sent, retryable, error)."""
+        name, address = parseaddr(settings.SENDGRID_FROM or "")
+        sender = {"email": address}
+        if name:
+            sender["name"] = name
+
+        # SendGrid requires text/plain to come before text/html
+        content = []
+        if message.get("text"):
+            content.append({"type": "text/plain", "value": message["text"]})
+        content.append({"type": "text/html", "value": message["html"]})
+
+        started = time.perf_counter()
+        try:
+            response = await _client.post(SENDGRID_SEND_URL, json={
+                "personalizations": [{"to": [{"email": message["to_email"]}]}],
+                "from": sender,
+                "subject": message["subject"],
+                "content": content
+            })
+        except httpx.HTTPError as exc:
+            return False, True, f"{type(exc).__name__}: {str(exc)}"
+        finally:
+            EMAIL_SEND_DURATION.labels(message["kind"]).observe(
+                time.perf_counter() - started)
+
+        if response.status_code < 300:
+            return True, False, None
+
+        retryable = response.status_code == 429 or response.status_code >= 500
+        return False, retryable, f"SendGrid {response.status_code}: {response.text[:500]}"
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> timedelta:
+        seconds = settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+    @staticmethod
+    async def _record(results: List[Tuple[dict, bool, bool, Optional[str]]]) -> None:
+        """Write delivery outcomes back to the outbox and the capsules table"""
+        now = datetime.now(timezone.utc)
+
+        sent = [message for message, ok, _, _ in results if ok]
+        if sent:
+            await execute(supabase_admin.table("email_outbox")
+                          .update({"status": "sent", "sent_at": now.isoformat(), "last_error": None,
+                                   "html": None, "text": None})
+                          .in_("id", [message["id"] for message in sent]))
+
+            for kind, column in SENT_AT_COLUMNS.items():
+                capsule_ids = [
+                    message["capsule_id"] for message in sent
+                    if message["kind"] == kind and message.get("capsule_id")
+                ]
+                if capsule_ids:
+                    await execute(supabase_admin.table("capsules")
+                                  .update({column: now.isoformat()})
+                                  .in_("id", capsule_ids))
+
+        for message, ok, retryable, error in results:
+            if ok:
+                EMAIL_DELIVERIES.labels(message["kind"], "sent").inc()
+                continue
+            if retryable and message["attempts"] < settings.EMAIL_MAX_ATTEMPTS:
+                EMAIL_DELIVERIES.labels(message["kind"], "retry").inc()
+                update = {
+                    "status": "pending",
+                    "next_attempt_at": (now + EmailOutbox._retry_delay(message["attempts"])).isoformat(),
+                    "last_error": error
+                }
+                logger.warning(
+                    f"Email {message['id']} attempt {message['attempts']} failed, retrying: {error}")
+            else:
+                EMAIL_DELIVERIES.labels(message["kind"], "failed").inc()
+                update = {"status": "failed", "last_error": error, "html": None, "text": None}
+                logger.error(
+                    f"Email {message['id']} to {message['to_email']} failed permanently: {error}")
+            await execute(supabase_admin.table("email_outbox")
+                          .update(update)
+                          .eq("id", message["id"]))
+
+    @staticmethod
+    async def purge() -> int:
+        """Delete sent and failed messages older than EMAIL_RETENTION_DAYS"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.EMAIL_RETENTION_DAYS)
+        response = await execute(supabase_admin.table("email_outbox")
+                                 .delete()
+                                 .in_("status", ["sent", "failed"])
+                                 .lt("created_at", cutoff.isoformat()))
+        purged = len(response.data or [])
+        if purged:
+            logger.info(f"Purged {purged} settled emails from the outbox")
+        return purged
+
+    @staticmethod
+    async def _work(worker_id: int) -> None:
+        last_purge = 0.0
+        while True:
+            try:
+                # One worker per process also prunes settled messages
+                if worker_id == 0 and time.monotonic() - last_purge >= settings.EMAIL_PURGE_INTERVAL_SECONDS:
+                    last_purge = time.monotonic()
+                    await EmailOutbox.purge()
+
+                # Clear before claiming so an enqueue during the claim still wakes us
+                _wakeup.clear()
+                messages = await EmailOutbox._claim()
+                if not messages:
+                    try:
+                        await asyncio.wait_for(
+                            _wakeup.wait(), timeout=settings.EMAIL_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                outcomes = await asyncio.gather(*[
+                    EmailOutbox._deliver(message) for message in messages
+                ])
+                await EmailOutbox._record([
+                    (message, *outcome) for message, outcome in zip(messages, outcomes)
+                ])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Email worker {worker_id} error: {str(exc)}", exc_info=True)
+                await asyncio.sleep(settings.EMAIL_POLL_SECONDS)
+
+    @staticmethod
+    async def start() -> None:
+        """Open the shared HTTP client and start the worker pool"""
+        global _client, _wakeup
+
+        if _workers or settings.EMAIL_WORKERS <= 0:
+            return
+        if not (settings.SENDGRID_API_KEY and settings.SENDGRID_FROM):
+            logger.warning("Email not configured. Outbox workers not started.")
+            return
+
+        connections = settings.EMAIL_WORKERS * settings.EMAIL_BATCH_SIZE
+        _client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {settings.SENDGRID_API_KEY}"},
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(
+                max_connections=connections, max_keepalive_connections=connections)
+        )
+        _wakeup = asyncio.Event()
+        for worker_id in range(settings.EMAIL_WORKERS):
+            _workers.append(asyncio.create_task(EmailOutbox._work(worker_id)))
+
+        logger.info(f"Started {settings.EMAIL_WORKERS} email outbox workers")
+
+    @staticmethod
+    async def stop() -> None:
+        """Cancel the workers and close the HTTP client"""
+        global _client, _wakeup
+
+        for task in _workers:
+            task.cancel()
+        await asyncio.gather(*_workers, return_exceptions=True)
+        _workers.clear()
+        _wakeup = None
+
+        if _client is not None:
+            await _client.aclose()
+            _client = None
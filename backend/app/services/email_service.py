@@ -1,55 +1,68 @@
-from datetime import datetime
 import logging
-from typing import Optional
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from typing import List, Optional
 from ..config import settings
+from ..metrics import EMAILS_QUEUED
+from .email_outbox import EmailOutbox
 
 logger = logging.getLogger(__name__)
 
 
 class EmailService:
+    """
+    Email templates. Messages are queued in the outbox and delivered by its
+    background workers, so callers never wait on the email provider.
+    """
+
     @staticmethod
     def _is_configured() -> bool:
         return bool(settings.SENDGRID_API_KEY and settings.SENDGRID_FROM)
 
     @staticmethod
-    def send_email(to_email: str, subject: str, html: str, text: Optional[str] = None) -> bool:
+    def build_message(
+        to_email: str,
+        subject: str,
+        html: str,
+        text: Optional[str] = None,
+        kind: str = "generic",
+        capsule_id: Optional[str] = None,
+        dedupe_key: Optional[str] = None
+    ) -> dict:
+        """An `email_outbox` row"""
+        return {
+            "kind": kind,
+            "to_email": to_email,
+            "subject": subject,
+            "html": html,
+            "text": text,
+            "capsule_id": capsule_id,
+            "dedupe_key": dedupe_key
+        }
+
+    @staticmethod
+    async def enqueue(messages: List[dict]) -> int:
+        """Queue messages for delivery. Returns how many were newly queued."""
         if not EmailService._is_configured():
             logger.warning("Email not configured. Skipping send.")
-            return False
-
-        logger.info(f"Sending email to {to_email} with subject: {subject}")
+            return 0
 
         try:
-            message = Mail(
-                from_email=settings.SENDGRID_FROM,
-                to_emails=to_email,
-                subject=subject,
-                html_content=html
-            )
-
-            if text:
-                message.plain_text_content = text
-
-            sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-            response = sg.send(message)
-
-            logger.info(f"SendGrid response status: {response.status_code}")
-
-            if response.status_code >= 400:
-                logger.error(f"SendGrid error: {response.body}")
-                return False
+            queued = await EmailOutbox.enqueue(messages)
+        except Exception as exc:
+            logger.error(f"Email enqueue failed: {str(exc)}", exc_info=True)
+            return 0
 
-            logger.info(f"Email sent successfully to {to_email}")
-            return True
+        for message in queued:
+            EMAILS_QUEUED.labels(message["kind"]).inc()
+        logger.debug("Queued %d of %d emails", len(queued), len(messages))
+        return len(queued)
 
-        except Exception as exc:
-            logger.error(f"Email send failed: {str(exc)}", exc_info=True)
-            return False
+    @staticmethod
+    async def send_email(to_email: str, subject: str, html: str, text: Optional[str] = None, **kwargs) -> bool:
+        message = EmailService.build_message(to_email, subject, html, text, **kwargs)
+        return await EmailService.enqueue([message]) > 0
 
     @staticmethod
-    def send_verification_email(to_email: str, verification_code: str) -> bool:
+    async def send_verification_email(to_email: str, verification_code: str) -> bool:
         html = f"""
         <h1>Verify Your Email</h1>
         <p>Welcome to Time Capsule! Please verify your email to get started.</p>
@@ -59,10 +72,11 @@ class EmailService:
         <p>If you didn't create a Time Capsule account, please ignore this email.</p>
         """
         text = f"Verify your email with this code: {verification_code}"
-        return EmailService.send_email(to_email, "Verify Your Time Capsule Email", html, text)
+        return await EmailService.send_email(
+            to_email, "Verify Your Time Capsule Email", html, text, kind="verification")
 
     @staticmethod
-    def send_otp_email(to_email: str, otp_code: str) -> bool:
+    async def send_otp_email(to_email: str, otp_code: str) -> bool:
         html = f"""
         <h1>Your OTP Code</h1>
         <p>Use this code to login to Time Capsule:</p>
@@ -71,10 +85,11 @@ class EmailService:
         <p>If you didn't request this code, please ignore this email.</p>
         """
         text = f"Your Time Capsule OTP is: {otp_code} (expires in 10 minutes)"
-        return EmailService.send_email(to_email, "Your Time Capsule OTP", html, text)
+        return await EmailService.send_email(
+            to_email, "Your Time Capsule OTP", html, text, kind="otp")
 
     @staticmethod
-    def send_capsule_created_email(to_email: str, capsule: dict) -> bool:
+    def capsule_created_message(to_email: str, capsule: dict) -> dict:
         unlock_date = capsule.get("unlock_date")
         subject = "Your time capsule is created"
         html = f"""
@@ -89,10 +104,20 @@ class EmailService:
             f"Your capsule '{capsule.get('title')}' is saved. "
             f"Unlock date: {unlock_date}. We will remind you 24 hours before it unlocks."
         )
-        return EmailService.send_email(to_email, subject, html, text)
+        return EmailService.build_message(
+            to_email, subject, html, text,
+            kind="capsule_created",
+            capsule_id=capsule["id"],
+            dedupe_key=f"capsule_created:{capsule['id']}"
+        )
+
+    @staticmethod
+    async def send_capsule_created_email(to_email: str, capsule: dict) -> bool:
+        message = EmailService.capsule_created_message(to_email, capsule)
+        return await EmailService.enqueue([message]) > 0
 
     @staticmethod
-    def send_capsule_reminder_email(to_email: str, capsule: dict) -> bool:
+    def capsule_reminder_message(to_email: str, capsule: dict) -> dict:
         unlock_date = capsule.get("unlock_date")
         subject = "Your time capsule unlocks soon"
         html = f"""
@@ -107,4 +132,14 @@ class EmailService:
             f"Your capsule '{capsule.get('title')}' unlocks in about 24 hours. "
             f"Unlock date: {unlock_date}."
         )
-        return EmailService.send_email(to_email, subject, html, text)
+        return EmailService.build_message(
+            to_email, subject, html, text,
+            kind="capsule_reminder",
+            capsule_id=capsule["id"],
+            dedupe_key=f"capsule_reminder:{capsule['id']}"
+        )
+
+    @staticmethod
+    async def send_capsule_reminder_email(to_email: str, capsule: dict) -> bool:
+        message = EmailService.capsule_reminder_message(to_email, capsule)
+        return await EmailService.enqueue([message]) > 0
@@ -0,0 +1,465 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from ..cache import TTLCache
+from ..config import settings
+from ..storage import get_storage
+from ..supabase_client import supabase_admin, execute
+from .realtime_service import RealtimeService
+from .storage_cleanup import StorageCleanup
+from .thumbnail_service import ThumbnailService
+
+logger = logging.getLogger(__name__)
+
+
+# Lifetime of signed media URLs, in seconds
+SIGNED_URL_EXPIRES_IN = 3600
+
+ALLOWED_TYPES = {
+    "image": ["image/jpeg", "image/png", "image/gif", "image/webp"],
+    "video": ["video/mp4", "video/webm", "video/quicktime"],
+    "audio": ["audio/mpeg", "audio/wav", "audio/ogg"],
+    "text": ["text/plain"]
+}
+
+
+@dataclass
+class SpooledFile:
+    """An upload copied to a local temp file, ready to stream to storage"""
+    path: str
+    size: int
+    sha256: Optional[str] = None  # hex digest, when computed while spooling
+
+
+@dataclass
+class SignedUrl:
+    url: str
+    expires_at: float  # unix time
+
+    @property
+    def expires_in(self) -> int:
+        return max(0, int(self.expires_at - time.time()))
+
+
+# storage path -> SignedUrl, dropped a safety margin before the URL expires
+_signed_url_cache = TTLCache(
+    maxsize=settings.SIGNED_URL_CACHE_SIZE, ttl=SIGNED_URL_EXPIRES_IN)
+
+
+def _file_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds {max_size / 1024 / 1024}MB limit"
+    )
+
+
+def _copy_chunks(source: BinaryIO, dest_path: str, max_size: int, digest) -> int:
+    size = 0
+    with open(dest_path, "wb") as dest:
+        while True:
+            chunk = source.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise _file_too_large(max_size)
+            digest.update(chunk)
+            dest.write(chunk)
+    return size
+
+
+def _write_all(path: str, chunks: List[bytes], digest) -> None:
+    with open(path, "ab") as dest:
+        for chunk in chunks:
+            digest.update(chunk)
+            dest.write(chunk)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaService:
+
+    @staticmethod
+    def resolve_file_type(content_type: Optional[str]) -> str:
+        """Map a MIME type to its media category or reject it"""
+        for category, mime_types in ALLOWED_TYPES.items():
+            if content_type in mime_types:
+                return category
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type {content_type} not supported"
+        )
+
+    @staticmethod
+    def build_object_path(user_id: str, filename: str) -> str:
+        """
+        A new path for a stored object. Objects are shared by every capsule
+        the user attaches the same content to, so they live in the user's
+        `objects/` folder rather than under one capsule.
+        """
+        file_extension = filename.split(".")[-1] if "." in filename else ""
+        return f"{user_id}/objects/{uuid.uuid4()}.{file_extension}"
+
+    @staticmethod
+    async def spool_upload(file: UploadFile, max_size: Optional[int] = None) -> SpooledFile:
+        """
+        Copy an upload to a temp file in UPLOAD_CHUNK_SIZE pieces, hashing it
+        on the way. The size limit is enforced chunk by chunk, so memory use is
+        bounded by the chunk size and oversize files are rejected as soon as
+        they cross it.
+        """
+        max_size = settings.MAX_FILE_SIZE if max_size is None else max_size
+        fd, path = tempfile.mkstemp(prefix="capsule-upload-")
+        os.close(fd)
+
+        digest = hashlib.sha256()
+        try:
+            size = await run_in_threadpool(_copy_chunks, file.file, path, max_size, digest)
+        except BaseException:
+            MediaService.discard(SpooledFile(path=path, size=0))
+            raise
+
+        return SpooledFile(path=path, size=size, sha256=digest.hexdigest())
+
+    @staticmethod
+    async def spool_stream(chunks: AsyncIterator[bytes], max_size: int) -> SpooledFile:
+        """Like spool_upload, for a raw request body (or any async byte stream)"""
+        fd, path = tempfile.mkstemp(prefix="capsule-upload-")
+        os.close(fd)
+
+        size = 0
+        pending: List[bytes] = []
+        pending_size = 0
+        digest = hashlib.sha256()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise _file_too_large(max_size)
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= settings.UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(_write_all, path, pending, digest)
+                    pending, pending_size = [], 0
+            if pending:
+                await run_in_threadpool(_write_all, path, pending, digest)
+        except BaseException:
+            MediaService.discard(SpooledFile(path=path, size=0))
+            raise
+
+        return SpooledFile(path=path, size=size, sha256=digest.hexdigest())
+
+    @staticmethod
+    def discard(spooled: SpooledFile) -> None:
+        try:
+            os.remove(spooled.path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    async def upload_object(
+        path: str,
+        spooled: SpooledFile,
+        content_type: str,
+        upsert: bool = False
+    ):
+        """Stream a spooled file to storage without loading it into memory"""
+        await get_storage().upload(path, spooled.path, content_type, upsert=upsert)
+
+    @staticmethod
+    async def download_object(path: str) -> bytes:
+        return await get_storage().download(path)
+
+    @staticmethod
+    async def acquire_object(user_id: str, spooled: SpooledFile, filename: str) -> dict:
+        """
+        Take a reference on the stored object holding this content, via the
+        user's content-hash index (`media_objects`). New content gets a fresh
+        path. Returns {"file_path", "stored"}; `stored` is false until some
+        upload of the content has reached storage.
+        """
+        if spooled.sha256 is None:
+            spooled.sha256 = await run_in_threadpool(_hash_file, spooled.path)
+
+        response = await execute(supabase_admin.rpc("acquire_media_object", {
+            "p_owner_id": user_id,
+            "p_content_hash": spooled.sha256,
+            "p_file_path": MediaService.build_object_path(user_id, filename),
+            "p_size": spooled.size
+        }))
+        return response.data[0]
+
+    @staticmethod
+    async def release_media(media_items: List[dict]) -> None:
+        """
+        Drop the media rows' references on their stored objects, and queue
+        the objects (with their thumbnails) that nothing references any more
+        for removal by StorageCleanup. Media stored before the content-hash
+        index existed are not indexed and are queued outright.
+        """
+        if not media_items:
+            return
+        response = await execute(supabase_admin.rpc("release_media_objects", {
+            "p_file_paths": [media["file_path"] for media in media_items]
+        }))
+        released = set(response.data or [])
+
+        paths: List[str] = []
+        for media in media_items:
+            if media["file_path"] in released:
+                released.discard(media["file_path"])
+                paths.extend(MediaService.object_paths(media))
+        if paths:
+            MediaService.forget_signed_urls(paths)
+            await StorageCleanup.enqueue(paths)
+
+    @staticmethod
+    def object_paths(media: dict) -> List[str]:
+        """Every storage object of a media row: the original and its thumbnails"""
+        return [media["file_path"], *(media.get("thumbnail_paths") or {}).values()]
+
+    @staticmethod
+    def present_media(media_items: List[dict], is_unlocked: bool) -> None:
+        """
+        Shape media rows for capsule responses: locked media expose neither
+        a URL nor their BlurHash placeholder. Signed URLs (originals and
+        thumbnails) come from the capsule URLs endpoint, so cached capsule
+        responses never hold expiring links.
+        """
+        if is_unlocked:
+            return
+        for media in media_items:
+            media["file_url"] = None
+            media["blurhash"] = None
+
+    @staticmethod
+    def forget_signed_urls(paths: List[str]) -> None:
+        for path in paths:
+            _signed_url_cache.pop(path)
+
+    @staticmethod
+    async def create_signed_urls(paths: List[str]) -> Dict[str, SignedUrl]:
+        """
+        Sign storage paths, reusing cached URLs that are still comfortably
+        valid. Whatever is not cached is signed with a single storage call.
+        """
+        signed: Dict[str, SignedUrl] = {}
+        missing = []
+        for path in dict.fromkeys(paths):
+            cached = _signed_url_cache.get(path)
+            if cached is not None:
+                signed[path] = cached
+            else:
+                missing.append(path)
+
+        if not missing:
+            return signed
+
+        expires_at = time.time() + SIGNED_URL_EXPIRES_IN
+        urls = await get_storage().create_signed_urls(missing, SIGNED_URL_EXPIRES_IN)
+
+        for path in missing:
+            url = urls.get(path)
+            if not url:
+                logger.warning(f"Could not sign {path}")
+                continue
+            entry = SignedUrl(url=url, expires_at=expires_at)
+            _signed_url_cache.set(
+                path, entry,
+                expires_at=expires_at - settings.SIGNED_URL_CACHE_MARGIN_SECONDS)
+            signed[path] = entry
+        return signed
+
+    @staticmethod
+    async def create_signed_url(path: str) -> Optional[SignedUrl]:
+        signed = await MediaService.create_signed_urls([path])
+        return signed.get(path)
+
+    @staticmethod
+    async def put_object(
+        user_id: str,
+        filename: str,
+        content_type: str,
+        spooled: SpooledFile
+    ) -> Tuple[dict, bool]:
+        """
+        Make sure the spooled content is in storage, via the content-hash
+        index. Content the user has stored before is not transferred again.
+        Returns the storage fields of a media row (`file_path`, plus any
+        thumbnails already made for the object) and whether this call
+        transferred the bytes. Holds one reference; release_media drops it.
+        """
+        acquired = await MediaService.acquire_object(user_id, spooled, filename)
+        stored = {"file_path": acquired["file_path"]}
+
+        try:
+            if not acquired["stored"]:
+                # upsert: a concurrent upload of the same content may have
+                # written the object already
+                await MediaService.upload_object(
+                    stored["file_path"], spooled, content_type, upsert=True)
+                await execute(supabase_admin.table("media_objects")
+                              .update({"stored": True})
+                              .eq("file_path", stored["file_path"]))
+            else:
+                # Already stored: reuse the thumbnails made for an earlier copy
+                sibling = await execute(supabase_admin.table("media")
+                                        .select("thumbnail_paths, blurhash")
+                                        .eq("file_path", stored["file_path"])
+                                        .limit(1))
+                if sibling.data:
+                    stored["thumbnail_paths"] = sibling.data[0].get("thumbnail_paths")
+                    stored["blurhash"] = sibling.data[0].get("blurhash")
+        except Exception:
+            await MediaService._release_after_failure([stored])
+            raise
+
+        return stored, not acquired["stored"]
+
+    @staticmethod
+    async def _release_after_failure(media_items: List[dict]) -> None:
+        """Rollback: drop references (removing objects that were ours alone)"""
+        try:
+            await MediaService.release_media(media_items)
+        except Exception as e:
+            logger.error(
+                f"Could not release {len(media_items)} objects after a failed upload: {str(e)}")
+
+    @staticmethod
+    async def store_media(
+        capsule_id: str,
+        user_id: str,
+        filename: str,
+        content_type: str,
+        file_type: str,
+        spooled: SpooledFile
+    ) -> dict:
+        """
+        Store a spooled file (see put_object) and create its `media` row.
+        The reference is released again if the row cannot be written. New
+        images are queued for thumbnails, and connected owners and members
+        get a `media_added` event.
+        """
+        stored, transferred = await MediaService.put_object(
+            user_id, filename, content_type, spooled)
+        media_data = {
+            "capsule_id": capsule_id,
+            "filename": filename,
+            "file_type": file_type,
+            "uploaded_at": datetime.now(timezone.utc).isoformat(),
+            **stored
+        }
+
+        try:
+            db_response = await execute(
+                supabase_admin.table("media").insert(media_data))
+            if not db_response.data:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to save media record"
+                )
+        except Exception:
+            await MediaService._release_after_failure([media_data])
+            raise
+
+        if transferred:
+            await ThumbnailService.schedule(db_response.data[0], spooled.path)
+        RealtimeService.notify_media_added(capsule_id, db_response.data)
+        return db_response.data[0]
+
+    @staticmethod
+    async def store_media_batch(
+        capsule_id: str,
+        user_id: str,
+        files: List[UploadFile]
+    ) -> List[dict]:
+        """
+        Store many uploads for one capsule. Files are validated, spooled and
+        stored with at most BULK_UPLOAD_CONCURRENCY in flight, then all their
+        `media` rows are inserted in one batch. Returns one result per file,
+        in request order; a file that fails does not stop the others. If the
+        batch insert fails, every stored object is released again and the
+        error is raised. One `media_added` event covers the whole batch.
+        """
+        results = [
+            {"filename": file.filename or "", "status": "failed"} for file in files
+        ]
+        spools: List[Optional[SpooledFile]] = [None] * len(files)
+        rows: List[Optional[dict]] = [None] * len(files)
+        transferred = [False] * len(files)
+        semaphore = asyncio.Semaphore(settings.BULK_UPLOAD_CONCURRENCY)
+        # Offsets keep the files in request order when sorted by upload time
+        uploaded_at = datetime.now(timezone.utc)
+
+        async def store(index: int, file: UploadFile) -> None:
+            async with semaphore:
+                try:
+                    file_type = MediaService.resolve_file_type(file.content_type)
+                    spools[index] = await MediaService.spool_upload(file)
+                    stored, transferred[index] = await MediaService.put_object(
+                        user_id, file.filename, file.content_type, spools[index])
+                except HTTPException as e:
+                    results[index]["error"] = e.detail
+                    return
+                except Exception as e:
+                    logger.error(f"Bulk upload of {file.filename} failed: {str(e)}")
+                    results[index]["error"] = f"Upload failed: {str(e)}"
+                    return
+
+            rows[index] = {
+                "capsule_id": capsule_id,
+                "filename": file.filename,
+                "file_type": file_type,
+                "uploaded_at": (uploaded_at + timedelta(microseconds=index)).isoformat(),
+                **stored
+            }
+
+        try:
+            await asyncio.gather(*[store(index, file) for index, file in enumerate(files)])
+
+            pending = [index for index, row in enumerate(rows) if row is not None]
+            if not pending:
+                return results
+
+            try:
+                db_response = await execute(supabase_admin.table("media")
+                                            .insert([rows[index] for index in pending]))
+                if len(db_response.data or []) != len(pending):
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Failed to save media records"
+                    )
+            except Exception:
+                await MediaService._release_after_failure([rows[index] for index in pending])
+                raise
+
+            for index, record in zip(pending, db_response.data):
+                results[index].update(
+                    status="uploaded", id=record["id"], file_type=record["file_type"])
+                if transferred[index]:
+                    await ThumbnailService.schedule(record, spools[index].path)
+            RealtimeService.notify_media_added(capsule_id, db_response.data)
+            return results
+        finally:
+            for spooled in spools:
+                if spooled is not None:
+                    MediaService.discard(spooled)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set
+from fastapi import WebSocket
+from ..config import settings
+from ..supabase_client import supabase_admin, execute
+from .unlock_service import UnlockScheduler
+
+logger = logging.getLogger(__name__)
+
+# user id -> that user's open sockets, oldest first
+_connections: Dict[str, "OrderedDict[WebSocket, None]"] = {}
+
+
+class RealtimeService:
+    """
+    Per-user registry of open WebSocket connections and the events pushed
+    to them. Capsule events go to the owner and, for group capsules, every
+    member. The registry lives in this process, matching the single-process
+    deployment; the unlock scheduler dispatches from the same process.
+    """
+
+    @staticmethod
+    def connect(user_id: str, websocket: WebSocket) -> List[WebSocket]:
+        """Register a socket; returns older sockets evicted by the per-user cap"""
+        sockets = _connections.setdefault(user_id, OrderedDict())
+        sockets[websocket] = None
+        evicted = []
+        while len(sockets) > settings.WS_MAX_CONNECTIONS_PER_USER:
+            oldest, _ = sockets.popitem(last=False)
+            evicted.append(oldest)
+        return evicted
+
+    @staticmethod
+    def disconnect(user_id: str, websocket: WebSocket) -> None:
+        sockets = _connections.get(user_id)
+        if sockets is None:
+            return
+        sockets.pop(websocket, None)
+        if not sockets:
+            _connections.pop(user_id, None)
+
+    @staticmethod
+    def connected_users() -> Set[str]:
+        return set(_connections)
+
+    @staticmethod
+    async def _send(user_id: str, websocket: WebSocket, event: dict) -> None:
+        try:
+            await asyncio.wait_for(
+                websocket.send_json(event), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except Exception as e:
+            # Slow or broken client: drop it rather than hold up everyone else
+            logger.info(f"Dropping WebSocket for user {user_id}: {type(e).__name__}")
+            RealtimeService.disconnect(user_id, websocket)
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    async def send_to_users(user_ids: Iterable[str], event: dict) -> int:
+        """Push an event to every open socket of the given users"""
+        targets = [
+            (user_id, websocket)
+            for user_id in set(user_ids)
+            for websocket in list(_connections.get(user_id, ()))
+        ]
+        await asyncio.gather(*[
+            RealtimeService._send(user_id, websocket, event)
+            for user_id, websocket in targets
+        ])
+        return len(targets)
+
+    @staticmethod
+    async def _audiences(capsules: List[dict]) -> Dict[str, Set[str]]:
+        """capsule id -> owner plus members, with one member query for all groups"""
+        audiences = {capsule["id"]: {capsule["owner_id"]} for capsule in capsules}
+        group_ids = [capsule["id"] for capsule in capsules if capsule.get("is_group")]
+        if group_ids:
+            response = await execute(supabase_admin.table("capsule_members")
+                                     .select("capsule_id, user_id")
+                                     .in_("capsule_id", group_ids))
+            for member in response.data or []:
+                audiences[member["capsule_id"]].add(member["user_id"])
+        return audiences
+
+    @staticmethod
+    async def publish_capsule_unlocked(capsules: List[dict]) -> None:
+        """Unlock scheduler listener: tell owners and members a capsule opened"""
+        if not _connections:
+            return
+        audiences = await RealtimeService._audiences(capsules)
+        await asyncio.gather(*[
+            RealtimeService.send_to_users(audiences[capsule["id"]], {
+                "type": "capsule_unlocked",
+                "capsule": {
+                    "id": capsule["id"],
+                    "title": capsule.get("title"),
+                    "unlock_date": capsule["unlock_date"],
+                    "unlocked_at": capsule.get("unlocked_at")
+                }
+            })
+            for capsule in capsules
+        ])
+
+    @staticmethod
+    async def publish_media_added(capsule_id: str, media_items: List[dict]) -> None:
+        """Tell owners and members that media was added to a capsule"""
+        if not _connections or not media_items:
+            return
+        response = await execute(supabase_admin.table("capsules")
+                                 .select("id, owner_id, is_group")
+                                 .eq("id", capsule_id))
+        if not response.data:
+            return
+        audiences = await RealtimeService._audiences(response.data)
+        await RealtimeService.send_to_users(audiences[capsule_id], {
+            "type": "media_added",
+            "capsule_id": capsule_id,
+            "media": [
+                {
+                    "id": media["id"],
+                    "filename": media["filename"],
+                    "file_type": media["file_type"],
+                    "uploaded_at": media.get("uploaded_at")
+                }
+                for media in media_items
+            ]
+        })
+
+    @staticmethod
+    def notify_media_added(capsule_id: str, media_items: List[dict]) -> None:
+        """Fire-and-forget publish_media_added, so uploads never wait on pushes"""
+        if not _connections:
+            return
+        task = asyncio.create_task(
+            RealtimeService.publish_media_added(capsule_id, media_items))
+        task.add_done_callback(_log_task_error)
+
+
+def _log_task_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Realtime publish failed: {task.exception()}")
+
+
+UnlockScheduler.add_listener(RealtimeService.publish_capsule_unlocked)
@@ -0,0 +1,104 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from ..config import settings
+from ..supabase_client import supabase_admin, execute
+from .email_service import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderService:
+    """
+    Sends "unlocks soon" emails for capsules entering the reminder window.
+    Due capsules are processed in batches of REMINDER_BATCH_SIZE: owner
+    emails are resolved with one query per batch and the batch's reminders
+    are queued in the email outbox with one bulk insert. The outbox workers
+    deliver them and stamp `reminder_email_sent_at` in bulk; a reminder that
+    is already queued is not queued again.
+    """
+
+    @staticmethod
+    async def _fetch_due(now: datetime, after_id: Optional[str] = None) -> List[dict]:
+        window_end = now + timedelta(hours=settings.NOTIFY_WINDOW_HOURS)
+        query = (supabase_admin.table("capsules")
+                 .select("id, title, unlock_date, owner_id")
+                 .gt("unlock_date", now.isoformat())
+                 .lte("unlock_date", window_end.isoformat())
+                 .is_("reminder_email_sent_at", "null"))
+        if after_id:
+            query = query.gt("id", after_id)
+        response = await execute(
+            query.order("id").limit(settings.REMINDER_BATCH_SIZE))
+        return response.data or []
+
+    @staticmethod
+    async def _resolve_emails(user_ids: List[str], known: Dict[str, Optional[str]]) -> None:
+        """Fill `known` with the emails of user ids not looked up yet"""
+        missing = [user_id for user_id in dict.fromkeys(user_ids)
+                   if user_id not in known]
+        if not missing:
+            return
+        response = await execute(
+            supabase_admin.rpc("get_user_emails", {"p_user_ids": missing}))
+        for row in response.data or []:
+            known[row["id"]] = row["email"]
+        for user_id in missing:
+            known.setdefault(user_id, None)
+
+    @staticmethod
+    async def send_due_reminders() -> dict:
+        """
+        Run the reminder pipeline once and return counts plus the time spent
+        in each stage (milliseconds, summed over batches). `sent` and
+        `failed` are kept for existing cron consumers: `sent` is the number
+        queued, and delivery failures are recorded by the outbox instead.
+        """
+        now = datetime.now(timezone.utc)
+        timings = {"fetch_ms": 0.0, "resolve_ms": 0.0, "enqueue_ms": 0.0}
+        stats = {"due": 0, "queued": 0, "no_email": 0, "batches": 0}
+        emails: Dict[str, Optional[str]] = {}
+        started = time.perf_counter()
+
+        after_id = None
+        while True:
+            stage = time.perf_counter()
+            capsules = await ReminderService._fetch_due(now, after_id)
+            timings["fetch_ms"] += (time.perf_counter() - stage) * 1000
+            if not capsules:
+                break
+
+            stats["batches"] += 1
+            stats["due"] += len(capsules)
+            after_id = capsules[-1]["id"]
+
+            stage = time.perf_counter()
+            await ReminderService._resolve_emails(
+                [capsule["owner_id"] for capsule in capsules], emails)
+            timings["resolve_ms"] += (time.perf_counter() - stage) * 1000
+
+            deliverable = [c for c in capsules if emails.get(c["owner_id"])]
+            stats["no_email"] += len(capsules) - len(deliverable)
+
+            stage = time.perf_counter()
+            stats["queued"] += await EmailService.enqueue([
+                EmailService.capsule_reminder_message(emails[c["owner_id"]], c)
+                for c in deliverable
+            ])
+            timings["enqueue_ms"] += (time.perf_counter() - stage) * 1000
+
+            if len(capsules) < settings.REMINDER_BATCH_SIZE:
+                break
+
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        stats["owners"] = len(emails)
+        stats["sent"] = stats["queued"]
+        stats["failed"] = 0
+        stats["timings"] = {name: round(value, 1) for name, value in timings.items()}
+
+        logger.info(
+            f"Reminder run: {stats['queued']}/{stats['due']} queued in "
+            f"{stats['batches']} batches ({stats['timings']['total_ms']}ms)",
+            extra={"reminder_stats": stats})
+        return stats
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from ..config import settings
+from ..metrics import STORAGE_CLEANUP_OBJECTS
+from ..storage import get_storage
+from ..supabase_client import supabase_admin, execute
+
+logger = logging.getLogger(__name__)
+
+# Paths per DELETE/UPDATE when settling a batch. Paths are ~115 characters,
+# so this keeps the `path=in.(...)` filter, and the URL, to a few KB.
+SETTLE_CHUNK_SIZE = 50
+
+# Shared by all workers in this process; created on startup
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+
+
+class StorageCleanup:
+    """
+    Durable queue of storage objects to delete, backed by the
+    `storage_cleanup` table. Deletes only queue the paths of objects nothing
+    references any more; STORAGE_CLEANUP_WORKERS background tasks claim due
+    paths in batches of STORAGE_CLEANUP_BATCH_SIZE, remove each batch with
+    one storage call and settle its rows in chunks of SETTLE_CHUNK_SIZE.
+    Failed batches are retried with exponential backoff; paths still failing after STORAGE_CLEANUP_MAX_ATTEMPTS stay in
+    the table as 'failed' for reconciliation.
+    """
+
+    @staticmethod
+    async def enqueue(paths: List[str]) -> None:
+        """Queue paths for removal and wake the local workers"""
+        if not paths:
+            return
+        rows = [{"path": path} for path in dict.fromkeys(paths)]
+        await execute(supabase_admin.table("storage_cleanup")
+                      .upsert(rows, on_conflict="path", ignore_duplicates=True))
+        StorageCleanup.queued(len(rows))
+
+    @staticmethod
+    def queued(count: int) -> None:
+        """Record paths queued elsewhere (e.g. by a database function) and wake the workers"""
+        STORAGE_CLEANUP_OBJECTS.labels("queued").inc(count)
+        StorageCleanup.wake()
+
+    @staticmethod
+    def wake() -> None:
+        if _wakeup is not None:
+            _wakeup.set()
+
+    @staticmethod
+    async def _claim() -> List[dict]:
+        response = await execute(supabase_admin.rpc("claim_storage_cleanup", {
+            "p_limit": settings.STORAGE_CLEANUP_BATCH_SIZE,
+            "p_lease_seconds": settings.STORAGE_CLEANUP_LEASE_SECONDS
+        }))
+        return response.data or []
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> timedelta:
+        seconds = settings.STORAGE_CLEANUP_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+    @staticmethod
+    async def _remove(entries: List[dict]) -> None:
+        """Remove one claimed batch and record the outcome"""
+        paths = [entry["path"] for entry in entries]
+        try:
+            # Paths storage does not report as removed were already gone
+            await get_storage().remove(paths)
+        except Exception as exc:
+            await StorageCleanup._record_failure(entries, f"{type(exc).__name__}: {str(exc)}")
+            return
+
+        for start in range(0, len(paths), SETTLE_CHUNK_SIZE):
+            await execute(supabase_admin.table("storage_cleanup")
+                          .delete()
+                          .in_("path", paths[start:start + SETTLE_CHUNK_SIZE]))
+        STORAGE_CLEANUP_OBJECTS.labels("removed").inc(len(paths))
+
+    @staticmethod
+    async def _record_failure(entries: List[dict], error: str) -> None:
+        now = datetime.now(timezone.utc)
+
+        # Entries claimed together mostly share an attempt count: one update each
+        by_attempts: Dict[int, List[str]] = {}
+        for entry in entries:
+            by_attempts.setdefault(entry["attempts"], []).append(entry["path"])
+
+        for attempts, paths in by_attempts.items():
+            if attempts < settings.STORAGE_CLEANUP_MAX_ATTEMPTS:
+                STORAGE_CLEANUP_OBJECTS.labels("retry").inc(len(paths))
+                update = {
+                    "status": "pending",
+                    "next_attempt_at": (now + StorageCleanup._retry_delay(attempts)).isoformat(),
+                    "last_error": error
+                }
+                logger.warning(
+                    f"Removing {len(paths)} storage objects failed "
+                    f"(attempt {attempts}), retrying: {error}")
+            else:
+                STORAGE_CLEANUP_OBJECTS.labels("failed").inc(len(paths))
+                update = {"status": "failed", "last_error": error}
+                logger.error(
+                    f"Giving up on removing {len(paths)} storage objects; "
+                    f"left in storage_cleanup for reconciliation: {error}")
+            for start in range(0, len(paths), SETTLE_CHUNK_SIZE):
+                await execute(supabase_admin.table("storage_cleanup")
+                              .update(update)
+                              .in_("path", paths[start:start + SETTLE_CHUNK_SIZE]))
+
+    @staticmethod
+    async def _work(worker_id: int) -> None:
+        while True:
+            try:
+                # Clear before claiming so an enqueue during the claim still wakes us
+                _wakeup.clear()
+                entries = await StorageCleanup._claim()
+                if not entries:
+                    try:
+                        await asyncio.wait_for(
+                            _wakeup.wait(), timeout=settings.STORAGE_CLEANUP_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await StorageCleanup._remove(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Storage cleanup worker {worker_id} error: {str(exc)}", exc_info=True)
+                await asyncio.sleep(settings.STORAGE_CLEANUP_POLL_SECONDS)
+
+    @staticmethod
+    async def start() -> None:
+        """Start the worker pool (STORAGE_CLEANUP_WORKERS tasks; 0 disables removal here)"""
+        global _wakeup
+
+        if _workers or settings.STORAGE_CLEANUP_WORKERS <= 0:
+            return
+
+        _wakeup = asyncio.Event()
+        for worker_id in range(settings.STORAGE_CLEANUP_WORKERS):
+            _workers.append(asyncio.create_task(StorageCleanup._work(worker_id)))
+
+        logger.info(f"Started {settings.STORAGE_CLEANUP_WORKERS} storage cleanup workers")
+
+    @staticmethod
+    async def stop() -> None:
+        """Cancel the workers; claimed batches become due again after their lease"""
+        global _wakeup
+
+        for task in _workers:
+            task.cancel()
+        await asyncio.gather(*_workers, return_exceptions=True)
+        _workers.clear()
+        _wakeup = None
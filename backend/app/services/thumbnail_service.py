@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+from starlette.concurrency import run_in_threadpool
+from ..config import settings
+from ..imaging import render_derivatives
+from ..metrics import THUMBNAIL_JOBS, THUMBNAIL_RENDER_DURATION
+from ..storage import get_storage
+from ..supabase_client import supabase_admin, execute
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for in-flight jobs before cancelling them
+STOP_GRACE_SECONDS = 10
+
+_pool: Optional[ProcessPoolExecutor] = None
+_jobs: Set[asyncio.Task] = set()
+
+
+def _prepare_workdir(source_path: str) -> str:
+    """
+    A private temp dir holding a link to (or copy of) the uploaded file, so
+    the job keeps its input after the upload discards its own temp file.
+    """
+    work_dir = tempfile.mkdtemp(prefix="capsule-thumbs-")
+    held = os.path.join(work_dir, "source")
+    try:
+        os.link(source_path, held)
+    except OSError:
+        shutil.copyfile(source_path, held)
+    return work_dir
+
+
+class ThumbnailService:
+    """
+    Image derivatives made after upload: WebP thumbnails at THUMBNAIL_SIZES
+    (longest edge) and a BlurHash placeholder. Rendering runs in a process
+    pool so API workers never spend CPU on images. Thumbnails are stored
+    next to the original and recorded on every media row sharing it, in
+    `thumbnail_paths` (size -> storage path) and `blurhash`.
+    """
+
+    @staticmethod
+    def derivative_path(file_path: str, size: str) -> str:
+        """`<user>/objects/<uuid>.jpg` -> `<user>/objects/<uuid>_w320.webp`"""
+        directory, _, name = file_path.rpartition("/")
+        stem = name.rsplit(".", 1)[0] if "." in name else name
+        return f"{directory}/{stem}_w{size}.webp" if directory else f"{stem}_w{size}.webp"
+
+    @staticmethod
+    async def schedule(media: dict, source_path: str) -> None:
+        """
+        Queue derivative generation for a freshly stored image. Returns once
+        the job holds its own reference to the file; rendering and storing
+        happen in the background.
+        """
+        if _pool is None or media.get("file_type") != "image":
+            return
+
+        try:
+            work_dir = await run_in_threadpool(_prepare_workdir, source_path)
+        except OSError as exc:
+            logger.warning(f"Could not queue thumbnails for media {media['id']}: {exc}")
+            return
+
+        task = asyncio.create_task(ThumbnailService._generate(media, work_dir))
+        _jobs.add(task)
+        task.add_done_callback(_jobs.discard)
+
+    @staticmethod
+    async def _generate(media: dict, work_dir: str) -> None:
+        paths: Dict[str, str] = {}
+        try:
+            started = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(
+                _pool,
+                render_derivatives,
+                os.path.join(work_dir, "source"),
+                work_dir,
+                settings.THUMBNAIL_SIZES,
+                settings.THUMBNAIL_QUALITY,
+                settings.BLURHASH_COMPONENTS
+            )
+            THUMBNAIL_RENDER_DURATION.observe(time.perf_counter() - started)
+
+            storage = get_storage()
+            paths = {
+                size: ThumbnailService.derivative_path(media["file_path"], size)
+                for size in result["thumbnails"]
+            }
+            await asyncio.gather(*[
+                storage.upload(paths[size], local_file, "image/webp", upsert=True)
+                for size, local_file in result["thumbnails"].items()
+            ])
+
+            # Every media row sharing the stored object gets the thumbnails
+            response = await execute(supabase_admin.table("media")
+                                     .update({"thumbnail_paths": paths,
+                                              "blurhash": result["blurhash"]})
+                                     .eq("file_path", media["file_path"]))
+            if not response.data:
+                # The media was deleted while its thumbnails were being made
+                await storage.remove(list(paths.values()))
+                THUMBNAIL_JOBS.labels("orphaned").inc()
+                return
+
+            THUMBNAIL_JOBS.labels("stored").inc()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            THUMBNAIL_JOBS.labels("failed").inc()
+            logger.warning(
+                f"Could not create thumbnails for media {media['id']}: "
+                f"{type(exc).__name__}: {exc}")
+            if paths:
+                try:
+                    await get_storage().remove(list(paths.values()))
+                except Exception as remove_exc:
+                    logger.warning(f"Could not remove partial thumbnails: {remove_exc}")
+        finally:
+            await run_in_threadpool(shutil.rmtree, work_dir, True)
+
+    @staticmethod
+    async def start() -> None:
+        """Start the render pool (THUMBNAIL_WORKERS processes; 0 disables thumbnails)"""
+        global _pool
+
+        if _pool is not None or settings.THUMBNAIL_WORKERS <= 0:
+            return
+        # Fresh interpreters rather than forks of a process running threads
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started {settings.THUMBNAIL_WORKERS} thumbnail workers")
+
+    @staticmethod
+    async def stop() -> None:
+        """Let in-flight jobs finish briefly, then cancel the rest and stop the pool"""
+        global _pool
+
+        if _jobs:
+            await asyncio.wait(set(_jobs), timeout=STOP_GRACE_SECONDS)
+        pending: List[asyncio.Task] = list(_jobs)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -1,42 +1,84 @@
-from datetime import datetime
-from typing import List
-from app.supabase_client import supabase_admin
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.supabase_client import supabase_admin, execute
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Capsule ids per conditional UPDATE when claiming unlocks (keeps the URL short)
+CLAIM_CHUNK_SIZE = 200
+
+UnlockListener = Callable[[List[dict]], Awaitable[None]]
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
 
 class UnlockService:
     """
     Background service to automatically unlock capsules.
-    This should be called periodically (e.g., via a cron job or background task).
+    A capsule is unlocked exactly once: `unlocked_at` is set by a conditional
+    update, so only one caller (across processes) gets the row back and
+    dispatches the unlock event.
     """
 
     @staticmethod
-    async def unlock_ready_capsules() -> List[str]:
+    async def fetch_pending(after: Optional[str], limit: int) -> List[dict]:
+        """Not-yet-unlocked capsules in unlock order, strictly after `after`"""
+        query = (supabase_admin.table("capsules")
+                 .select("id, unlock_date")
+                 .is_("unlocked_at", "null"))
+        if after:
+            query = query.gt("unlock_date", after)
+        response = await execute(
+            query.order("unlock_date").order("id").limit(limit))
+        return response.data or []
+
+    @staticmethod
+    async def claim_unlocks(capsule_ids: List[str]) -> List[dict]:
         """
-        Find and unlock all capsules that have reached their unlock date.
+        Mark due capsules as unlocked. Returns only the rows this call
+        unlocked; capsules already unlocked, deleted or moved to a later
+        date are left alone.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        claimed = []
+        for start in range(0, len(capsule_ids), CLAIM_CHUNK_SIZE):
+            response = await execute(supabase_admin.table("capsules")
+                                     .update({"unlocked_at": now})
+                                     .in_("id", capsule_ids[start:start + CLAIM_CHUNK_SIZE])
+                                     .is_("unlocked_at", "null")
+                                     .lte("unlock_date", now))
+            claimed.extend(response.data or [])
+        return claimed
+
+    @staticmethod
+    async def unlock_ready_capsules(limit: int = 1000) -> List[str]:
+        """
+        Find and unlock capsules that have reached their unlock date but were
+        not unlocked yet (e.g. while no scheduler was running).
         Returns list of unlocked capsule IDs.
         """
         try:
-            # Get all capsules that should be unlocked but aren't yet
-            current_time = datetime.utcnow().isoformat()
-
-            response = supabase_admin.table("capsules")\
-                .select("id, title, unlock_date")\
-                .lte("unlock_date", current_time)\
-                .execute()
+            current_time = datetime.now(timezone.utc).isoformat()
 
-            unlocked_ids = []
+            response = await execute(supabase_admin.table("capsules")
+                                     .select("id")
+                                     .is_("unlocked_at", "null")
+                                     .lte("unlock_date", current_time)
+                                     .order("unlock_date")
+                                     .limit(limit))
 
-            for capsule in response.data:
-                logger.info(
-                    f"Capsule '{capsule['title']}' (ID: {capsule['id']}) is now unlocked")
-                unlocked_ids.append(capsule["id"])
+            claimed = await UnlockService.claim_unlocks(
+                [capsule["id"] for capsule in response.data or []])
+            await UnlockScheduler.dispatch(claimed)
 
-            logger.info(
-                f"Processed {len(unlocked_ids)} capsules for unlocking")
-            return unlocked_ids
+            return [capsule["id"] for capsule in claimed]
 
         except Exception as e:
             logger.error(f"Error in unlock service: {str(e)}")
@@ -46,6 +88,168 @@ class UnlockService:
     def is_capsule_unlocked(unlock_date: str) -> bool:
         """
         Check if a capsule should be unlocked based on its unlock date.
+        Dates without an offset are taken as UTC.
         """
-        unlock_dt = datetime.fromisoformat(unlock_date.replace("Z", "+00:00"))
-        return datetime.utcnow() >= unlock_dt.replace(tzinfo=None)
+        unlock_dt = _parse_timestamp(unlock_date)
+        if unlock_dt.tzinfo is None:
+            unlock_dt = unlock_dt.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) >= unlock_dt
+
+
+# Upcoming unlocks held in memory: min-heap of (unlock time, capsule id).
+# `_scheduled` maps each live entry to its time; heap entries whose time no
+# longer matches (capsule rescheduled or deleted) are skipped when popped.
+_heap: List[Tuple[datetime, str]] = []
+_scheduled: Dict[str, datetime] = {}
+_watermark: Optional[datetime] = None  # latest unlock time loaded from the database
+_exhausted = False  # the last refill reached the end of the pending unlocks
+_listeners: List[UnlockListener] = []
+_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+class UnlockScheduler:
+    """
+    Fires unlock events at each capsule's unlock time.
+    The next UNLOCK_SCHEDULER_BATCH pending unlocks are loaded into a heap
+    and the scheduler sleeps until the earliest one; the heap is refilled
+    from the `unlock_date > watermark` range of a partial index, so the work
+    done scales with the number of unlocks, not the size of the table.
+    Capsules created or rescheduled in this process are added directly.
+    Every UNLOCK_SCHEDULER_MAX_SLEEP_SECONDS overdue capsules are swept as
+    well, which covers capsules created by other processes.
+    """
+
+    @staticmethod
+    def add_listener(listener: UnlockListener) -> None:
+        """Register a coroutine called with the capsule rows that just unlocked"""
+        _listeners.append(listener)
+
+    @staticmethod
+    async def dispatch(capsules: List[dict]) -> None:
+        if not capsules:
+            return
+        logger.info(f"Unlocked {len(capsules)} capsules")
+        for listener in _listeners:
+            try:
+                await listener(capsules)
+            except Exception as e:
+                logger.error(f"Unlock listener failed: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def schedule(capsule: dict) -> None:
+        """Track a new or rescheduled capsule if it falls in the loaded range"""
+        if _task is None:
+            return
+        when = _parse_timestamp(capsule["unlock_date"])
+        if not _exhausted and (_watermark is None or when > _watermark):
+            # Beyond the loaded range: a later refill picks it up
+            _scheduled.pop(capsule["id"], None)
+            return
+        _scheduled[capsule["id"]] = when
+        heapq.heappush(_heap, (when, capsule["id"]))
+        if _wakeup is not None:
+            _wakeup.set()
+
+    @staticmethod
+    def unschedule(capsule_id: str) -> None:
+        _scheduled.pop(capsule_id, None)
+
+    @staticmethod
+    async def _refill() -> None:
+        global _watermark, _exhausted
+
+        limit = settings.UNLOCK_SCHEDULER_BATCH
+        after = _watermark.isoformat() if _watermark else None
+        rows = await UnlockService.fetch_pending(after, limit)
+
+        if len(rows) < limit:
+            _exhausted = True
+            if rows:
+                _watermark = _parse_timestamp(rows[-1]["unlock_date"])
+        else:
+            # More pending unlocks may follow (e.g. added by other processes
+            # since a short page), so go back to refilling ahead of the heap
+            _exhausted = False
+            # Capsules sharing the last unlock time may continue past this
+            # page, so leave that time for the next refill (unless the whole
+            # page shares it; the overdue sweep then catches the remainder)
+            last = rows[-1]["unlock_date"]
+            trimmed = [row for row in rows if row["unlock_date"] != last]
+            if trimmed:
+                rows = trimmed
+            _watermark = _parse_timestamp(rows[-1]["unlock_date"])
+
+        for row in rows:
+            if row["id"] not in _scheduled:
+                when = _parse_timestamp(row["unlock_date"])
+                _scheduled[row["id"]] = when
+                heapq.heappush(_heap, (when, row["id"]))
+
+    @staticmethod
+    def _pop_due(now: datetime) -> List[str]:
+        due = []
+        while _heap and _heap[0][0] <= now:
+            when, capsule_id = heapq.heappop(_heap)
+            if _scheduled.get(capsule_id) == when:
+                del _scheduled[capsule_id]
+                due.append(capsule_id)
+        return due
+
+    @staticmethod
+    async def _run() -> None:
+        last_sweep = 0.0
+        while True:
+            try:
+                _wakeup.clear()
+                if not _exhausted and len(_scheduled) < settings.UNLOCK_SCHEDULER_BATCH // 2:
+                    await UnlockScheduler._refill()
+
+                now = datetime.now(timezone.utc)
+                due = UnlockScheduler._pop_due(now)
+                if due:
+                    await UnlockScheduler.dispatch(
+                        await UnlockService.claim_unlocks(due))
+
+                if time.monotonic() - last_sweep >= settings.UNLOCK_SCHEDULER_MAX_SLEEP_SECONDS:
+                    await UnlockService.unlock_ready_capsules(settings.UNLOCK_SCHEDULER_BATCH)
+                    if _exhausted:
+                        # Pick up capsules other processes added past the watermark
+                        await UnlockScheduler._refill()
+                    last_sweep = time.monotonic()
+
+                delay = settings.UNLOCK_SCHEDULER_MAX_SLEEP_SECONDS
+                if _heap:
+                    delay = min(delay, max(0.0, (_heap[0][0] - now).total_seconds()))
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Unlock scheduler error: {str(e)}", exc_info=True)
+                await asyncio.sleep(settings.UNLOCK_SCHEDULER_MAX_SLEEP_SECONDS)
+
+    @staticmethod
+    async def start() -> None:
+        global _task, _wakeup
+        if _task is not None or not settings.UNLOCK_SCHEDULER_ENABLED:
+            return
+        _wakeup = asyncio.Event()
+        _task = asyncio.create_task(UnlockScheduler._run())
+        logger.info("Unlock scheduler started")
+
+    @staticmethod
+    async def stop() -> None:
+        global _task, _wakeup, _watermark, _exhausted
+        if _task is None:
+            return
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+        _wakeup = None
+        _heap.clear()
+        _scheduled.clear()
+        _watermark = None
+        _exhausted = False
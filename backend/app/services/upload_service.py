@@ -0,0 +1,425 @@
+import asyncio
+import logging
+import math
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from ..config import settings
+from ..schemas import ResumableUploadCreate
+from ..supabase_client import supabase_admin, execute
+from .capsule_service import CapsuleService
+from .media_service import MediaService, SpooledFile
+from .storage_cleanup import StorageCleanup
+
+logger = logging.getLogger(__name__)
+
+# Parts fetched at once while assembling the final object
+ASSEMBLY_CONCURRENCY = 4
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _write_at(path: str, data: bytes, offset: int) -> None:
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+
+
+class ResumableUploadService:
+    """
+    Initiate / part / complete uploads for large capsule media.
+    Each part is stored as its own object under `<user>/<capsule>/uploads/`
+    and recorded in `media_upload_parts`, so a client can upload parts in
+    parallel, ask which parts were acknowledged after a dropped connection
+    and resend only the missing ones. Completing the upload assembles the
+    parts into one object and creates the `media` row. Every
+    UPLOAD_EXPIRY_SWEEP_SECONDS, sessions past `expires_at` are deleted and
+    their parts queued for removal; sessions stuck assembling for
+    UPLOAD_ASSEMBLY_TIMEOUT_SECONDS are reopened.
+    """
+
+    @staticmethod
+    def _part_count(upload: dict) -> int:
+        return math.ceil(upload["total_size"] / upload["part_size"])
+
+    @staticmethod
+    def _expected_part_size(upload: dict, part_number: int) -> int:
+        if part_number < ResumableUploadService._part_count(upload):
+            return upload["part_size"]
+        return upload["total_size"] - upload["part_size"] * (part_number - 1)
+
+    @staticmethod
+    def _part_path(upload: dict, part_number: int) -> str:
+        return (
+            f"{upload['user_id']}/{upload['capsule_id']}/uploads/"
+            f"{upload['id']}/{part_number:05d}"
+        )
+
+    @staticmethod
+    async def _ensure_capsule_open(capsule_id: str, user_id: str) -> dict:
+        access = await CapsuleService.check_access(capsule_id, user_id)
+        if access["is_unlocked"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot add media to an unlocked capsule"
+            )
+        return access
+
+    @staticmethod
+    async def create_upload(
+        capsule_id: str,
+        user_id: str,
+        upload_data: ResumableUploadCreate
+    ) -> dict:
+        """Start a resumable upload and return its part layout"""
+        await ResumableUploadService._ensure_capsule_open(capsule_id, user_id)
+        file_type = MediaService.resolve_file_type(upload_data.content_type)
+
+        if upload_data.size > settings.MAX_RESUMABLE_FILE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File size exceeds {settings.MAX_RESUMABLE_FILE_SIZE / 1024 / 1024}MB limit"
+            )
+
+        now = datetime.now(timezone.utc)
+        upload_row = {
+            "capsule_id": capsule_id,
+            "user_id": user_id,
+            "filename": upload_data.filename,
+            "content_type": upload_data.content_type,
+            "file_type": file_type,
+            "total_size": upload_data.size,
+            "part_size": settings.UPLOAD_PART_SIZE,
+            "status": "pending",
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)).isoformat()
+        }
+
+        response = await execute(
+            supabase_admin.table("media_uploads").insert(upload_row))
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to start upload"
+            )
+
+        upload = response.data[0]
+        return {
+            "upload_id": upload["id"],
+            "part_size": upload["part_size"],
+            "part_count": ResumableUploadService._part_count(upload),
+            "expires_at": upload["expires_at"]
+        }
+
+    @staticmethod
+    async def get_upload(upload_id: str, user_id: str) -> dict:
+        """Load an upload session owned by the user, with its parts"""
+        response = await execute(
+            supabase_admin.table("media_uploads")
+            .select("*, media_upload_parts(part_number, size, storage_path)")
+            .eq("id", upload_id))
+
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload not found"
+            )
+
+        upload = response.data[0]
+        if upload["user_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have access to this upload"
+            )
+
+        return upload
+
+    @staticmethod
+    def _ensure_pending(upload: dict) -> None:
+        if upload["status"] != "pending":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload is already {upload['status']}"
+            )
+        if datetime.now(timezone.utc) >= _parse_timestamp(upload["expires_at"]):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Upload session expired"
+            )
+
+    @staticmethod
+    def describe(upload: dict) -> dict:
+        """Progress summary a client can resume from"""
+        part_count = ResumableUploadService._part_count(upload)
+        parts = sorted(p["part_number"] for p in upload.get("media_upload_parts") or [])
+        received = set(parts)
+
+        # Bytes acknowledged contiguously from the start of the file
+        next_offset = 0
+        for part_number in range(1, part_count + 1):
+            if part_number not in received:
+                break
+            next_offset += ResumableUploadService._expected_part_size(
+                upload, part_number)
+
+        return {
+            "upload_id": upload["id"],
+            "status": upload["status"],
+            "part_size": upload["part_size"],
+            "part_count": part_count,
+            "parts": parts,
+            "missing_parts": [n for n in range(1, part_count + 1) if n not in received],
+            "uploaded_bytes": sum(
+                p["size"] for p in upload.get("media_upload_parts") or []),
+            "next_offset": next_offset,
+            "media_id": upload.get("media_id"),
+            "expires_at": upload["expires_at"]
+        }
+
+    @staticmethod
+    async def upload_part(
+        upload_id: str,
+        part_number: int,
+        user_id: str,
+        body: AsyncIterator[bytes],
+        content_length: Optional[int] = None
+    ) -> dict:
+        """Store one part. Re-sending a part overwrites the earlier copy."""
+        upload = await ResumableUploadService.get_upload(upload_id, user_id)
+        ResumableUploadService._ensure_pending(upload)
+
+        part_count = ResumableUploadService._part_count(upload)
+        if part_number < 1 or part_number > part_count:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Part number must be between 1 and {part_count}"
+            )
+
+        expected_size = ResumableUploadService._expected_part_size(
+            upload, part_number)
+        if content_length is not None and content_length > expected_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Part {part_number} must be {expected_size} bytes"
+            )
+
+        spooled = await MediaService.spool_stream(body, expected_size)
+        try:
+            if spooled.size != expected_size:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Part {part_number} must be {expected_size} bytes, got {spooled.size}"
+                )
+
+            part_path = ResumableUploadService._part_path(upload, part_number)
+            await MediaService.upload_object(
+                part_path, spooled, "application/octet-stream", upsert=True)
+        finally:
+            MediaService.discard(spooled)
+
+        await execute(
+            supabase_admin.table("media_upload_parts").upsert({
+                "upload_id": upload_id,
+                "part_number": part_number,
+                "size": expected_size,
+                "storage_path": part_path,
+                "uploaded_at": datetime.now(timezone.utc).isoformat()
+            }, on_conflict="upload_id,part_number"))
+
+        return {"part_number": part_number, "size": expected_size}
+
+    @staticmethod
+    async def _assemble(upload: dict) -> SpooledFile:
+        """Download every part into one temp file at its offset"""
+        fd, path = tempfile.mkstemp(prefix="capsule-upload-")
+        os.close(fd)
+        spooled = SpooledFile(path=path, size=upload["total_size"])
+        semaphore = asyncio.Semaphore(ASSEMBLY_CONCURRENCY)
+
+        async def fetch(part: dict) -> None:
+            async with semaphore:
+                data = await MediaService.download_object(part["storage_path"])
+            if len(data) != part["size"]:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Part {part['part_number']} is incomplete, upload it again"
+                )
+            offset = upload["part_size"] * (part["part_number"] - 1)
+            await run_in_threadpool(_write_at, path, data, offset)
+
+        try:
+            await asyncio.gather(*[
+                fetch(part) for part in upload["media_upload_parts"]
+            ])
+        except BaseException:
+            MediaService.discard(spooled)
+            raise
+
+        return spooled
+
+    @staticmethod
+    async def complete_upload(upload_id: str, user_id: str) -> dict:
+        """Assemble all parts into the final object and create the media row"""
+        upload = await ResumableUploadService.get_upload(upload_id, user_id)
+        ResumableUploadService._ensure_pending(upload)
+        await ResumableUploadService._ensure_capsule_open(
+            upload["capsule_id"], user_id)
+
+        progress = ResumableUploadService.describe(upload)
+        if progress["missing_parts"]:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Missing parts: {progress['missing_parts']}"
+            )
+
+        # Claim the upload so a repeated complete call cannot assemble twice;
+        # the expiry sweep reopens it if this call dies before settling it
+        claimed = await execute(
+            supabase_admin.table("media_uploads")
+            .update({"status": "assembling",
+                     "assembling_since": datetime.now(timezone.utc).isoformat()})
+            .eq("id", upload_id)
+            .eq("status", "pending"))
+        if not claimed.data:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Upload is already being completed"
+            )
+
+        media_record = None
+        try:
+            spooled = await ResumableUploadService._assemble(upload)
+            try:
+                media_record = await MediaService.store_media(
+                    upload["capsule_id"],
+                    user_id,
+                    upload["filename"],
+                    upload["content_type"],
+                    upload["file_type"],
+                    spooled
+                )
+            finally:
+                MediaService.discard(spooled)
+
+            completed = await execute(
+                supabase_admin.table("media_uploads")
+                .update({"status": "completed", "media_id": media_record["id"]})
+                .eq("id", upload_id)
+                .eq("status", "assembling"))
+            if not completed.data:
+                # Reopened by the sweep or deleted while we were assembling
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Upload changed while it was being completed, try again"
+                )
+        except BaseException:
+            if media_record is not None:
+                await ResumableUploadService._discard_media(media_record)
+            await execute(
+                supabase_admin.table("media_uploads")
+                .update({"status": "pending", "assembling_since": None})
+                .eq("id", upload_id)
+                .eq("status", "assembling"))
+            raise
+
+        part_paths = [p["storage_path"] for p in upload["media_upload_parts"]]
+        try:
+            await StorageCleanup.enqueue(part_paths)
+        except Exception as e:
+            # The session is deleted once it expires, queueing the parts again
+            logger.warning(f"Could not queue parts of upload {upload_id} for removal: {str(e)}")
+
+        return {
+            "id": media_record["id"],
+            "filename": upload["filename"],
+            "file_type": upload["file_type"],
+            "capsule_id": upload["capsule_id"],
+            "message": "Media uploaded successfully"
+        }
+
+    @staticmethod
+    async def _discard_media(media: dict) -> None:
+        """Rollback of a completion: drop the new media row and its object reference"""
+        try:
+            await execute(supabase_admin.table("media").delete().eq("id", media["id"]))
+            await MediaService.release_media([media])
+        except Exception as e:
+            logger.error(f"Could not discard media {media['id']} of a failed upload: {str(e)}")
+
+    @staticmethod
+    async def abort_upload(upload_id: str, user_id: str) -> dict:
+        """Discard an unfinished upload and its stored parts"""
+        upload = await ResumableUploadService.get_upload(upload_id, user_id)
+        if upload["status"] != "pending":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload is already {upload['status']}"
+            )
+
+        part_paths = [p["storage_path"] for p in upload["media_upload_parts"] or []]
+        await StorageCleanup.enqueue(part_paths)
+        await execute(
+            supabase_admin.table("media_uploads").delete().eq("id", upload_id))
+
+        return {"message": "Upload aborted"}
+
+    @staticmethod
+    async def expire_uploads() -> int:
+        """
+        Reopen sessions stuck assembling, then delete sessions whose
+        `expires_at` has passed, queueing their parts for removal in the
+        same transaction. Returns the number of sessions deleted.
+        """
+        expired = 0
+        while True:
+            response = await execute(supabase_admin.rpc("expire_media_uploads", {
+                "p_limit": settings.UPLOAD_EXPIRY_BATCH,
+                "p_assembly_timeout_seconds": settings.UPLOAD_ASSEMBLY_TIMEOUT_SECONDS
+            }))
+            count = response.data or 0
+            expired += count
+            if count < settings.UPLOAD_EXPIRY_BATCH:
+                break
+
+        if expired:
+            StorageCleanup.wake()
+            logger.info(f"Expired {expired} resumable uploads")
+        return expired
+
+    @staticmethod
+    async def _sweep() -> None:
+        while True:
+            try:
+                await ResumableUploadService.expire_uploads()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Upload expiry sweep failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(settings.UPLOAD_EXPIRY_SWEEP_SECONDS)
+
+    @staticmethod
+    async def start() -> None:
+        """Start the expired-session sweep (UPLOAD_EXPIRY_SWEEP_SECONDS=0 disables it)"""
+        global _sweeper
+
+        if _sweeper is not None or settings.UPLOAD_EXPIRY_SWEEP_SECONDS <= 0:
+            return
+        _sweeper = asyncio.create_task(ResumableUploadService._sweep())
+
+    @staticmethod
+    async def stop() -> None:
+        global _sweeper
+
+        if _sweeper is not None:
+            _sweeper.cancel()
+            await asyncio.gather(_sweeper, return_exceptions=True)
+            _sweeper = None
@@ -0,0 +1,89 @@
+import logging
+from typing import Any, Optional
+from ..cache import TTLCache
+from ..config import settings
+from ..supabase_client import supabase_admin, execute, run_blocking
+
+logger = logging.getLogger(__name__)
+
+# email (lower-cased) -> auth user id
+_email_index = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+def _normalize(email: str) -> str:
+    return email.strip().lower()
+
+
+class UserService:
+    """
+    Email -> user lookups for the auth flows.
+    Resolves ids through the indexed `get_user_id_by_email` database function
+    instead of paging through auth.admin.list_users(), and keeps the mapping
+    in a per-process cache. Only ids are cached: user metadata carries
+    one-time codes and is always read fresh.
+    """
+
+    @staticmethod
+    def remember_user(email: str, user_id: str) -> None:
+        """Record (or replace) the id for an email, e.g. right after signup"""
+        _email_index.set(_normalize(email), user_id)
+
+    @staticmethod
+    def forget_user(email: str) -> None:
+        _email_index.pop(_normalize(email))
+
+    @staticmethod
+    async def get_user_id_by_email(email: str) -> Optional[str]:
+        """Return the auth user id for an email, or None if no such user"""
+        key = _normalize(email)
+        user_id = _email_index.get(key)
+        if user_id:
+            return user_id
+
+        response = await execute(
+            supabase_admin.rpc("get_user_id_by_email", {"p_email": key}))
+        user_id = response.data or None
+        if user_id:
+            _email_index.set(key, user_id)
+        return user_id
+
+    @staticmethod
+    async def get_user_by_id(user_id: str) -> Optional[Any]:
+        response = await run_blocking(
+            supabase_admin.auth.admin.get_user_by_id, user_id)
+        return getattr(response, "user", None)
+
+    @staticmethod
+    async def get_user_by_email(email: str) -> Optional[Any]:
+        """Return the full auth user for an email, or None if no such user"""
+        user_id = await UserService.get_user_id_by_email(email)
+        if not user_id:
+            return None
+
+        try:
+            user = await UserService.get_user_by_id(user_id)
+        except Exception as e:
+            logger.warning(f"Cached user id for {email} is stale: {str(e)}")
+            user = None
+
+        if user is None or _normalize(user.email or "") != _normalize(email):
+            # The cached mapping no longer holds (user deleted or email
+            # changed); look the email up again once.
+            UserService.forget_user(email)
+            user_id = await UserService.get_user_id_by_email(email)
+            if not user_id:
+                return None
+            user = await UserService.get_user_by_id(user_id)
+
+        return user
+
+    @staticmethod
+    async def update_user(user_id: str, attributes: dict) -> Optional[Any]:
+        """Update an auth user and refresh its cached email mapping"""
+        response = await run_blocking(
+            supabase_admin.auth.admin.update_user_by_id, user_id, attributes)
+        user = getattr(response, "user", None)
+        if user is not None and user.email:
+            UserService.remember_user(user.email, user.id)
+        return user
@@ -0,0 +1,203 @@
+import base64
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .supabase_client import supabase_admin, run_blocking
+
+
+class StorageBackend(ABC):
+    """
+    Where media objects live. Paths are bucket-relative keys:
+    `<user id>/objects/<uuid>.jpg` for stored media (shared by identical
+    uploads), `<user id>/objects/<uuid>_w320.webp` for their thumbnails and
+    `<user id>/<capsule id>/uploads/<upload id>/<part>` for resumable upload
+    parts. Implementations are selected with STORAGE_BACKEND; callers go
+    through get_storage().
+    """
+
+    @abstractmethod
+    async def upload(self, path: str, source_path: str, content_type: str,
+                     upsert: bool = False) -> None:
+        """Store the local file at `source_path` under `path`"""
+
+    @abstractmethod
+    async def download(self, path: str) -> bytes:
+        """The object's bytes"""
+
+    @abstractmethod
+    async def remove(self, paths: List[str]) -> List[str]:
+        """Delete objects in one call; returns the paths actually removed"""
+
+    @abstractmethod
+    async def create_signed_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        """Time-limited URLs for `paths`; paths that cannot be signed are omitted"""
+
+    async def create_signed_url(self, path: str, expires_in: int) -> Optional[str]:
+        signed = await self.create_signed_urls([path], expires_in)
+        return signed.get(path)
+
+    def local_path(self, path: str) -> Optional[str]:
+        """Filesystem path of an object, for backends that keep files on local disk"""
+        return None
+
+
+class SupabaseStorage(StorageBackend):
+    """Objects in a Supabase Storage bucket, signed by Supabase"""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def _bucket(self):
+        return supabase_admin.storage.from_(self.bucket)
+
+    async def upload(self, path: str, source_path: str, content_type: str,
+                     upsert: bool = False) -> None:
+        file_options = {
+            "content-type": content_type,
+            "cache-control": "3600"
+        }
+        if upsert:
+            file_options["upsert"] = "true"
+
+        # storage3 opens a str path itself and httpx streams the file body
+        await run_blocking(self._bucket().upload, path, source_path, file_options)
+
+    async def download(self, path: str) -> bytes:
+        return await run_blocking(self._bucket().download, path)
+
+    async def remove(self, paths: List[str]) -> List[str]:
+        if not paths:
+            return []
+        removed = await run_blocking(self._bucket().remove, paths)
+        return [item.get("name") for item in removed or [] if isinstance(item, dict)]
+
+    async def create_signed_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        if not paths:
+            return {}
+        results = await run_blocking(self._bucket().create_signed_urls, paths, expires_in)
+        signed = {}
+        for item in results:
+            url = item.get("signedURL") or item.get("signedUrl")
+            if not item.get("error") and url:
+                signed[item["path"]] = url
+        return signed
+
+
+def _copy_into(source_path: str, dest: Path, upsert: bool) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if not upsert and dest.exists():
+        raise FileExistsError(f"Object already exists: {dest.name}")
+    # Write beside the target and rename, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp, open(source_path, "rb") as source:
+            shutil.copyfileobj(source, tmp, settings.UPLOAD_CHUNK_SIZE)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _read(path: Path) -> bytes:
+    return path.read_bytes()
+
+
+def _unlink_all(paths: List[Path]) -> List[int]:
+    removed = []
+    for index, path in enumerate(paths):
+        try:
+            path.unlink()
+            removed.append(index)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class LocalStorage(StorageBackend):
+    """
+    Objects as files under LOCAL_STORAGE_PATH. Signed URLs point at the
+    API's own /api/media/files/ route and carry an HMAC of the path and
+    expiry, so they work like Supabase signed URLs without any network hop.
+    """
+
+    def __init__(self, root: str, secret: str, base_url: str):
+        self.root = Path(root).resolve()
+        self.secret = secret.encode()
+        self.base_url = base_url.rstrip("/")
+
+    def _resolve(self, path: str) -> Path:
+        target = (self.root / path).resolve()
+        if self.root not in target.parents:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid storage path"
+            )
+        return target
+
+    def local_path(self, path: str) -> Optional[str]:
+        return str(self._resolve(path))
+
+    async def upload(self, path: str, source_path: str, content_type: str,
+                     upsert: bool = False) -> None:
+        await run_in_threadpool(_copy_into, source_path, self._resolve(path), upsert)
+
+    async def download(self, path: str) -> bytes:
+        return await run_in_threadpool(_read, self._resolve(path))
+
+    async def remove(self, paths: List[str]) -> List[str]:
+        if not paths:
+            return []
+        removed = await run_in_threadpool(_unlink_all, [self._resolve(p) for p in paths])
+        return [paths[index] for index in removed]
+
+    def sign(self, path: str, expires: int) -> str:
+        digest = hmac.new(self.secret, f"{path}:{expires}".encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def verify(self, path: str, expires: int, signature: str) -> bool:
+        """Check a signed URL's signature and that it has not expired"""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self.sign(path, expires), signature)
+
+    async def create_signed_urls(self, paths: List[str], expires_in: int) -> Dict[str, str]:
+        expires = int(time.time()) + expires_in
+        return {
+            path: f"{self.base_url}/api/media/files/{quote(path)}"
+                  f"?expires={expires}&signature={self.sign(path, expires)}"
+            for path in paths
+        }
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """The configured storage backend (created on first use)"""
+    global _backend
+
+    if _backend is None:
+        if settings.STORAGE_BACKEND == "local":
+            _backend = LocalStorage(
+                settings.LOCAL_STORAGE_PATH,
+                settings.STORAGE_SIGNING_SECRET or settings.SUPABASE_JWT_SECRET,
+                settings.PUBLIC_API_URL
+            )
+        elif settings.STORAGE_BACKEND == "supabase":
+            _backend = SupabaseStorage(settings.STORAGE_BUCKET)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return _backend
@@ -0,0 +1,225 @@
+import logging
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Mapping, Optional, Tuple
+import httpx
+from fastapi import HTTPException, status
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Response headers copied from an upstream (Supabase Storage) media response
+_PASSTHROUGH_HEADERS = (
+    "content-length",
+    "content-range",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    The inclusive (start, end) byte range a `Range` header asks for, or None
+    to send the whole object. Only single ranges are served; multi-range and
+    malformed headers fall back to the full object, as RFC 9110 allows.
+    Raises 416 when the range lies entirely past the end of the object.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(0, size - suffix), size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_matches(if_range: Optional[str], etag: str, last_modified: int) -> bool:
+    """
+    Whether a `Range` may be honoured given the request's `If-Range`
+    validator: an entity tag (strong comparison) or an HTTP date.
+    """
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return not if_range.startswith("W/") and if_range == etag
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == last_modified
+    except (TypeError, ValueError):
+        return False
+
+
+async def _read_chunks(path: str, offset: int, length: int) -> AsyncIterator[bytes]:
+    fd = await run_in_threadpool(os.open, path, os.O_RDONLY)
+    try:
+        while length > 0:
+            chunk = await run_in_threadpool(
+                os.pread, fd, min(settings.MEDIA_STREAM_CHUNK_SIZE, length), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            length -= len(chunk)
+            yield chunk
+    finally:
+        os.close(fd)
+
+
+class LocalFileResponse(StreamingResponse):
+    """
+    A byte range of a file on local disk. Servers that offer the ASGI
+    `http.response.zerocopysend` extension get the file descriptor and send
+    it with sendfile(2); otherwise the range is read in
+    MEDIA_STREAM_CHUNK_SIZE pieces off the event loop.
+    """
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int,
+                 headers: Mapping[str, str], media_type: str):
+        super().__init__(
+            _read_chunks(path, offset, length),
+            status_code=status_code,
+            headers={**headers, "Content-Length": str(length)},
+            media_type=media_type
+        )
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if "http.response.zerocopysend" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+
+        await self.body_iterator.aclose()
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": file,
+                "offset": self.offset,
+                "count": self.length,
+                "more_body": False,
+            })
+
+
+def stream_local_file(path: str, request_headers: Mapping[str, str],
+                      media_type: str, headers: Mapping[str, str]) -> LocalFileResponse:
+    """Serve `path` honouring the request's Range and If-Range headers"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media file not found")
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        **headers,
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+    }
+
+    byte_range = None
+    if if_range_matches(request_headers.get("if-range"), etag, last_modified):
+        byte_range = parse_range(request_headers.get("range"), size)
+
+    if byte_range is None:
+        return LocalFileResponse(path, 0, size, status.HTTP_200_OK, headers, media_type)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return LocalFileResponse(
+        path, start, end - start + 1, status.HTTP_206_PARTIAL_CONTENT, headers, media_type)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_keepalive_connections=settings.MEDIA_STREAM_CONNECTIONS,
+                                max_connections=settings.MEDIA_STREAM_CONNECTIONS)
+        )
+    return _client
+
+
+async def stream_url(url: str, request_headers: Mapping[str, str],
+                     media_type: str, headers: Mapping[str, str]) -> StreamingResponse:
+    """
+    Relay an object from a signed storage URL. Range and If-Range are
+    forwarded so the storage service reads only the requested bytes, and
+    the body is passed through in chunks as it arrives.
+    """
+    forward = {"Accept-Encoding": "identity"}
+    for name in ("range", "if-range"):
+        if request_headers.get(name):
+            forward[name] = request_headers[name]
+
+    client = _get_client()
+    try:
+        upstream = await client.send(client.build_request("GET", url, headers=forward), stream=True)
+    except httpx.HTTPError as exc:
+        logger.error(f"Media stream request failed: {type(exc).__name__}: {exc}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Storage unavailable")
+
+    if upstream.status_code not in (200, 206, 416):
+        await upstream.aclose()
+        if upstream.status_code in (400, 404):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media file not found")
+        logger.error(f"Media stream upstream returned {upstream.status_code}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Storage unavailable")
+
+    relayed = {**headers, "accept-ranges": "bytes"}
+    for name in _PASSTHROUGH_HEADERS:
+        if name in upstream.headers:
+            relayed[name] = upstream.headers[name]
+    if "content-encoding" in upstream.headers:
+        # The body is decoded on the way through, so the upstream length is wrong
+        relayed.pop("content-length", None)
+
+    return StreamingResponse(
+        upstream.aiter_bytes(settings.MEDIA_STREAM_CHUNK_SIZE),
+        status_code=upstream.status_code,
+        headers=relayed,
+        media_type=media_type,
+        background=BackgroundTask(upstream.aclose)
+    )
+
+
+async def close() -> None:
+    """Close the shared HTTP client used for relaying storage responses"""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
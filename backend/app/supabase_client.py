@@ -1,5 +1,17 @@
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+import anyio
 from supabase import create_client, Client
 from .config import settings
+from .metrics import (
+    SUPABASE_CALL_DURATION,
+    SUPABASE_CALL_ERRORS,
+    SUPABASE_POOL_WAIT,
+    supabase_call_labels,
+)
+
+T = TypeVar("T")
 
 # Main Supabase client (uses anon key)
 supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
@@ -7,3 +19,43 @@ supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 # Admin client (uses service role key for bypassing RLS)
 supabase_admin: Client = create_client(
     settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+
+# The supabase-py clients above are synchronous. Every network call made from
+# an async handler goes through run_blocking() so it runs on a worker thread
+# instead of freezing the event loop. The limiter bounds how many Supabase
+# calls a single worker has in flight at once; everything past that waits
+# without holding a thread.
+_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(settings.SUPABASE_MAX_CONCURRENCY)
+    return _limiter
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking Supabase call (table, storage or auth) off the event loop"""
+    labels = supabase_call_labels(func)
+    submitted = time.perf_counter()
+
+    def timed_call() -> T:
+        # Timed on the worker thread, so pool wait and call time are separate
+        started = time.perf_counter()
+        SUPABASE_POOL_WAIT.observe(started - submitted)
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            SUPABASE_CALL_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            SUPABASE_CALL_DURATION.labels(*labels).observe(
+                time.perf_counter() - started)
+
+    return await anyio.to_thread.run_sync(timed_call, limiter=_get_limiter())
+
+
+async def execute(query) -> Any:
+    """Execute a PostgREST query builder off the event loop"""
+    return await run_blocking(query.execute)
@@ -0,0 +1 @@
+"""Benchmarks and load tests that run against an in-memory Supabase fake."""
@@ -0,0 +1,247 @@
+"""
+Service-level benchmarks against the in-memory Supabase fake.
+
+Times the hot service methods and dependencies (auth, capsule listing and
+detail, access checks, capsule creation, media upload, signed URLs and the
+reminder job) across dataset sizes, and reports ops/sec, latency
+percentiles and Supabase calls per operation.
+
+    cd backend
+    python -m benchmarks.bench_services --capsules 10,100,1000 --media 0,10 \\
+        --latency-ms 2 --iterations 200 --json bench.json
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import platform
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.harness import (
+    access_token,
+    install,
+    run_concurrently,
+    seed,
+    summarize,
+)
+from benchmarks.fake_supabase import FakeSupabase
+
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.datastructures import Headers, UploadFile
+
+from app.cache import TTLCache
+from app.dependencies import get_current_user
+from app.routes.media import bulk_upload_media, get_capsule_media_urls, upload_media
+from app.schemas import CapsuleCreate
+from app.services.capsule_service import CapsuleService
+from app.services.reminder_service import ReminderService
+
+Operation = Callable[[int], Awaitable[object]]
+
+
+def reset_caches() -> None:
+    """Empty every module-level TTLCache so datasets do not share warm state"""
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app") or module is None:
+            continue
+        for value in vars(module).values():
+            if isinstance(value, TTLCache):
+                value.clear()
+
+
+# Files per bulk_upload_media request
+BULK_UPLOAD_FILES = 10
+
+
+def build_operations(dataset, iterations: int, upload_bytes: int) -> Dict[str, Operation]:
+    """Benchmark name -> operation(i), for the first seeded user"""
+    user = dataset.users[0]
+    current_user = {"id": user.id, "email": user.email, "username": ""}
+    capsules = dataset.capsules[user.id]
+    unlocked = dataset.unlocked[user.id] or capsules
+    locked = dataset.locked[user.id] or capsules
+
+    warm_token = access_token(user)
+    # Distinct tokens, minted up front, so each call verifies a signature
+    cold_tokens = [access_token(user) for _ in range(iterations)]
+    payload = b"\xff\xd8" + b"\x00" * max(0, upload_bytes - 2)
+    upload_serial = itertools.count()
+
+    async def auth_warm(i):
+        return await get_current_user(
+            HTTPAuthorizationCredentials(scheme="Bearer", credentials=warm_token))
+
+    async def auth_cold(i):
+        return await get_current_user(
+            HTTPAuthorizationCredentials(scheme="Bearer", credentials=cold_tokens[i]))
+
+    async def list_capsules(i):
+        return await CapsuleService.get_user_capsules(user.id, limit=20)
+
+    async def list_etag(i):
+        return await CapsuleService.get_user_capsules_etag(user.id, limit=20)
+
+    async def capsule_detail(i):
+        capsule = unlocked[i % len(unlocked)]
+        return await CapsuleService.get_capsule_by_id(capsule["id"], user.id)
+
+    async def check_access(i):
+        capsule = capsules[i % len(capsules)]
+        return await CapsuleService.check_access(capsule["id"], user.id)
+
+    async def create_capsule(i):
+        data = CapsuleCreate(
+            title=f"Benchmark {i}",
+            unlock_date=datetime.now(timezone.utc) + timedelta(days=30))
+        return await CapsuleService.create_capsule(data, user.id)
+
+    def upload_file(name: str) -> UploadFile:
+        return UploadFile(
+            # Distinct content per upload (warm-up included), so none is deduplicated
+            file=io.BytesIO(payload[:-8] + next(upload_serial).to_bytes(8, "big")),
+            filename=name,
+            headers=Headers({"content-type": "image/jpeg"}))
+
+    async def upload(i):
+        capsule = locked[i % len(locked)]
+        return await upload_media(capsule["id"], upload_file(f"bench-{i}.jpg"), current_user)
+
+    async def bulk_upload(i):
+        capsule = locked[i % len(locked)]
+        files = [upload_file(f"bench-{i}-{n}.jpg") for n in range(BULK_UPLOAD_FILES)]
+        return await bulk_upload_media(capsule["id"], files, current_user)
+
+    async def media_urls(i):
+        capsule = unlocked[i % len(unlocked)]
+        return await get_capsule_media_urls(capsule["id"], current_user)
+
+    async def reminders(i):
+        return await ReminderService.send_due_reminders()
+
+    return {
+        "get_current_user (cached token)": auth_warm,
+        "get_current_user (new token)": auth_cold,
+        "CapsuleService.get_user_capsules": list_capsules,
+        "CapsuleService.get_user_capsules_etag": list_etag,
+        "CapsuleService.get_capsule_by_id": capsule_detail,
+        "CapsuleService.check_access": check_access,
+        "CapsuleService.create_capsule": create_capsule,
+        "upload_media": upload,
+        f"bulk_upload_media ({BULK_UPLOAD_FILES} files)": bulk_upload,
+        "get_capsule_media_urls": media_urls,
+        "ReminderService.send_due_reminders": reminders,
+    }
+
+
+# Heavy operations run fewer iterations than the rest
+ITERATION_DIVISORS = {"ReminderService.send_due_reminders": 20}
+
+
+async def run_dataset(args, capsules: int, media: int) -> List[dict]:
+    fake = FakeSupabase(latency=args.latency_ms / 1000, jitter=args.jitter)
+    install(fake)
+    reset_caches()
+    dataset = seed(fake, users=1, capsules_per_user=capsules, media_per_capsule=media)
+
+    operations = build_operations(dataset, args.iterations, args.upload_kb * 1024)
+    selected = [
+        name for name in operations
+        if not args.only or any(term.lower() in name.lower() for term in args.only)
+    ]
+
+    results = []
+    for name in selected:
+        iterations = max(5, args.iterations // ITERATION_DIVISORS.get(name, 1))
+        operation = operations[name]
+
+        # Warm-up fills caches the way steady traffic would
+        await run_concurrently(operation, min(args.warmup, iterations), args.concurrency)
+
+        calls_before = fake.call_count()
+        run = await run_concurrently(operation, iterations, args.concurrency)
+        calls = fake.call_count() - calls_before
+
+        results.append({
+            "benchmark": name,
+            "capsules_per_user": capsules,
+            "media_per_capsule": media,
+            "iterations": iterations,
+            "concurrency": args.concurrency,
+            "errors": run.errors,
+            "ops_per_sec": round(len(run.samples) / run.wall_seconds, 1) if run.wall_seconds else 0.0,
+            "supabase_calls_per_op": round(calls / iterations, 2),
+            **summarize(run.samples),
+        })
+    return results
+
+
+def print_table(results: List[dict]) -> None:
+    header = f"{'benchmark':<40} {'dataset':>10} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/op':>8} {'errors':>6}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        dataset = f"{row['capsules_per_user']}x{row['media_per_capsule']}"
+        print(
+            f"{row['benchmark']:<40} {dataset:>10} {row['ops_per_sec']:>9} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+            f"{row['supabase_calls_per_op']:>8} {row['errors']:>6}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capsules", type=_int_list, default=[10, 100, 1000],
+                        help="capsules per user, comma separated (default 10,100,1000)")
+    parser.add_argument("--media", type=_int_list, default=[0, 10],
+                        help="media items per capsule, comma separated (default 0,10)")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="injected latency per Supabase call (default 0)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="latency jitter as a fraction, e.g. 0.2 for +/-20%%")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="operations in flight at once (default 1)")
+    parser.add_argument("--upload-kb", type=int, default=256,
+                        help="size of each benchmark upload (default 256)")
+    parser.add_argument("--only", nargs="*", default=None,
+                        help="run benchmarks whose name contains any of these terms")
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> None:
+    args = parse_args(argv)
+    results = []
+    for capsules in args.capsules:
+        for media in args.media:
+            results.extend(await run_dataset(args, capsules, media))
+    print_table(results)
+
+    if args.json_path:
+        report = {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {
+                "latency_ms": args.latency_ms,
+                "jitter": args.jitter,
+                "iterations": args.iterations,
+                "concurrency": args.concurrency,
+                "upload_kb": args.upload_kb,
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,715 @@
+"""
+In-memory stand-in for the parts of the supabase-py client the backend uses:
+PostgREST table queries and rpc calls, storage buckets and auth. Every call
+sleeps for the configured latency (plus jitter) on the calling thread, the
+way a network round trip would, and is counted so benchmarks can report
+calls per operation.
+
+Database functions from supabase_schema.sql are mirrored in FUNCTIONS at the
+bottom of this file; keep them in step when the SQL changes.
+"""
+import copy
+import hashlib
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+# (table, embedded table) -> (child table, child key, parent key, many)
+RELATIONS = {
+    ("capsules", "media"): ("media", "capsule_id", "id", True),
+    ("media", "capsules"): ("capsules", "id", "capsule_id", False),
+    ("media_uploads", "media_upload_parts"): ("media_upload_parts", "upload_id", "id", True),
+}
+
+# Child rows removed with their parent (ON DELETE CASCADE)
+CASCADES = {
+    "capsules": [("media", "capsule_id"), ("capsule_members", "capsule_id"),
+                 ("media_uploads", "capsule_id")],
+    "media_uploads": [("media_upload_parts", "upload_id")],
+}
+
+# Columns whose change bumps capsules.updated_at (the capsules_touch_updated_at
+# trigger's WHEN clause)
+CAPSULE_CONTENT_COLUMNS = ("title", "description", "unlock_date", "is_group", "owner_id")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _cmp_value(value):
+    """Compare ISO timestamps as datetimes and everything else as-is"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    return value
+
+
+def _split_top_level(columns: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+class Latency:
+    """Injected per-call latency: `seconds` +/- `jitter` (a fraction)"""
+
+    def __init__(self, seconds: float = 0.0, jitter: float = 0.0):
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def wait(self) -> None:
+        if self.seconds <= 0:
+            return
+        delay = self.seconds
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(delay)
+
+
+class CallCounter:
+    """Thread-safe call counter (calls arrive from the worker thread pool)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def add(self) -> None:
+        with self._lock:
+            self.value += 1
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """PostgREST request builder: filters, ordering, paging and embeds"""
+
+    def __init__(self, db: "FakeDatabase", table: str):
+        self.db = db
+        self.table_name = table
+        self.op = "select"
+        self.columns = "*"
+        self.filters: List[Callable[[dict], bool]] = []
+        self.orders: List[tuple] = []
+        self.limit_n: Optional[int] = None
+        self.offset_n = 0
+        self.payload: Any = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+
+    def select(self, columns="*", count=None):
+        self.op = "select"
+        self.columns = columns
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op = "insert"
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False, **kwargs):
+        self.op = "upsert"
+        self.payload = payload
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload, **kwargs):
+        self.op = "update"
+        self.payload = payload
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    def _add(self, column, predicate):
+        self.filters.append(lambda row: predicate(row.get(column)))
+        return self
+
+    def eq(self, column, value):
+        return self._add(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._add(column, lambda v: v != value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._add(column, lambda v: v in values)
+
+    def gt(self, column, value):
+        return self._add(column, lambda v: v is not None and _cmp_value(v) > _cmp_value(value))
+
+    def gte(self, column, value):
+        return self._add(column, lambda v: v is not None and _cmp_value(v) >= _cmp_value(value))
+
+    def lt(self, column, value):
+        return self._add(column, lambda v: v is not None and _cmp_value(v) < _cmp_value(value))
+
+    def lte(self, column, value):
+        return self._add(column, lambda v: v is not None and _cmp_value(v) <= _cmp_value(value))
+
+    def is_(self, column, value):
+        if value in ("null", None):
+            return self._add(column, lambda v: v is None)
+        return self._add(column, lambda v: v == value)
+
+    def order(self, column, desc=False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n, **kwargs):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.offset_n = start
+        self.limit_n = end - start + 1
+        return self
+
+    def single(self):
+        return self
+
+    def _matching(self) -> List[dict]:
+        rows = self.db.tables.setdefault(self.table_name, [])
+        return [row for row in rows if all(f(row) for f in self.filters)]
+
+    def _project(self, row: dict) -> dict:
+        out: Dict[str, Any] = {}
+        for part in _split_top_level(self.columns):
+            match = re.match(r"^(\w+)(?:!\w+)?\((.*)\)$", part)
+            if match:
+                embed, sub_columns = match.group(1), match.group(2)
+                child, child_key, parent_key, many = RELATIONS[(self.table_name, embed)]
+                sub = FakeQuery(self.db, child).select(sub_columns)
+                sub.filters.append(lambda r, v=row.get(parent_key): r.get(child_key) == v)
+                rows = [sub._project(r) for r in sub._matching()]
+                out[embed] = rows if many else (rows[0] if rows else None)
+            elif part == "*":
+                out.update(copy.deepcopy(row))
+            else:
+                out[part] = copy.deepcopy(row.get(part))
+        return out
+
+    def execute(self):
+        self.db.latency.wait()
+        self.db.calls.add()
+        with self.db.lock:
+            return self._execute()
+
+    def _execute(self) -> FakeResponse:
+        table = self.db.tables.setdefault(self.table_name, [])
+
+        if self.op == "select":
+            rows = self._matching()
+            for column, desc in reversed(self.orders):
+                rows.sort(key=lambda r: (r.get(column) is None, _cmp_value(r.get(column))),
+                          reverse=desc)
+            rows = rows[self.offset_n:]
+            if self.limit_n is not None:
+                rows = rows[:self.limit_n]
+            return FakeResponse([self._project(r) for r in rows], count=len(rows))
+
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            keys = (self.on_conflict or "id").split(",")
+            written = []
+            for item in payload:
+                row = copy.deepcopy(item)
+                existing = None
+                if self.op == "upsert":
+                    existing = next((
+                        r for r in table
+                        if all(row.get(k) is not None and r.get(k) == row.get(k) for k in keys)
+                    ), None)
+                if existing is not None:
+                    if self.ignore_duplicates:
+                        continue
+                    existing.update(row)
+                    written.append(copy.deepcopy(existing))
+                    continue
+                row.setdefault("id", str(uuid.uuid4()))
+                self.db.apply_defaults(self.table_name, row)
+                table.append(row)
+                written.append(copy.deepcopy(row))
+                if self.table_name == "media":
+                    self.db.touch_capsule(row.get("capsule_id"))
+            return FakeResponse(written)
+
+        if self.op == "update":
+            rows = self._matching()
+            for row in rows:
+                before = {column: row.get(column) for column in CAPSULE_CONTENT_COLUMNS}
+                row.update(copy.deepcopy(self.payload))
+                if self.table_name == "capsules" and any(
+                        row.get(column) != value for column, value in before.items()):
+                    row["updated_at"] = _now()
+                if self.table_name == "media":
+                    self.db.touch_capsule(row.get("capsule_id"))
+            return FakeResponse([copy.deepcopy(r) for r in rows])
+
+        if self.op == "delete":
+            rows = self._matching()
+            doomed = {id(r) for r in rows}
+            self.db.tables[self.table_name] = [r for r in table if id(r) not in doomed]
+            for row in rows:
+                self.db.cascade(self.table_name, row)
+                if self.table_name == "media":
+                    self.db.touch_capsule(row.get("capsule_id"))
+            return FakeResponse([copy.deepcopy(r) for r in rows])
+
+        raise ValueError(f"Unsupported operation {self.op}")
+
+
+class FakeRpc:
+    def __init__(self, db: "FakeDatabase", name: str, params: dict):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.db.latency.wait()
+        self.db.calls.add()
+        with self.db.lock:
+            return FakeResponse(self.db.functions[self.name](self.db, **self.params))
+
+
+class FakeBucket:
+    def __init__(self, storage: "FakeStorage", bucket: str):
+        self.storage = storage
+        self.id = bucket
+        self.objects = storage.buckets.setdefault(bucket, {})
+
+    def _call(self) -> None:
+        self.storage.latency.wait()
+        self.storage.calls.add()
+
+    def upload(self, path, file, file_options=None):
+        self._call()
+        upsert = (file_options or {}).get("upsert") in ("true", True)
+        if path in self.objects and not upsert:
+            raise Exception("The resource already exists")
+        if isinstance(file, (bytes, bytearray)):
+            data = bytes(file)
+        elif isinstance(file, str):
+            with open(file, "rb") as f:
+                data = f.read()
+        else:
+            data = file.read()
+        self.objects[path] = data
+        return SimpleNamespace(path=path, full_path=f"{self.id}/{path}")
+
+    def download(self, path, options=None, query_params=None):
+        self._call()
+        if path not in self.objects:
+            raise Exception("Object not found")
+        return self.objects[path]
+
+    def remove(self, paths):
+        self._call()
+        return [
+            {"name": path} for path in paths
+            if self.objects.pop(path, None) is not None
+        ]
+
+    def _signed_url(self, path: str) -> str:
+        token = hashlib.sha1(f"{path}{time.time()}".encode()).hexdigest()
+        return f"https://fake.storage/{self.id}/{path}?token={token}"
+
+    def create_signed_url(self, path, expires_in, options=None):
+        self._call()
+        url = self._signed_url(path)
+        return {"signedURL": url, "signedUrl": url}
+
+    def create_signed_urls(self, paths, expires_in, options=None):
+        self._call()
+        results = []
+        for path in paths:
+            url = self._signed_url(path)
+            results.append({"path": path, "error": None, "signedURL": url, "signedUrl": url})
+        return results
+
+
+class FakeStorage:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.buckets: Dict[str, Dict[str, bytes]] = {}
+        self.calls = CallCounter()
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self, bucket)
+
+
+class FakeAuthAdmin:
+    def __init__(self, auth: "FakeAuth"):
+        self.auth = auth
+
+    def list_users(self, page=None, per_page=None):
+        self.auth._call()
+        return list(self.auth.users.values())[:per_page or 50]
+
+    def get_user_by_id(self, user_id):
+        self.auth._call()
+        user = self.auth.users.get(user_id)
+        if user is None:
+            raise Exception("User not found")
+        return SimpleNamespace(user=user)
+
+    def update_user_by_id(self, user_id, attributes):
+        self.auth._call()
+        user = self.auth.users[user_id]
+        if "user_metadata" in attributes:
+            user.user_metadata = copy.deepcopy(attributes["user_metadata"])
+        return SimpleNamespace(user=user)
+
+
+class FakeAuth:
+    """
+    GoTrue stand-in. `session_factory` turns a user into the access token
+    returned by sign-in; the harness points it at a locally signed JWT.
+    """
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.users: Dict[str, SimpleNamespace] = {}
+        self.passwords: Dict[str, str] = {}
+        self.admin = FakeAuthAdmin(self)
+        self.calls = CallCounter()
+        self.session_factory: Optional[Callable[[SimpleNamespace], str]] = None
+
+    def _call(self) -> None:
+        self.latency.wait()
+        self.calls.add()
+
+    def add_user(self, email: str, password: str = "password",
+                 username: Optional[str] = None, verified: bool = True) -> SimpleNamespace:
+        user = SimpleNamespace(
+            id=str(uuid.uuid4()),
+            email=email.lower(),
+            user_metadata={
+                "username": username or email.split("@")[0],
+                "email_verified": verified
+            },
+        )
+        self.users[user.id] = user
+        self.passwords[user.email] = password
+        return user
+
+    def find_user_id(self, email: str) -> Optional[str]:
+        for user in self.users.values():
+            if user.email == email.lower():
+                return user.id
+        return None
+
+    def sign_up(self, credentials):
+        self._call()
+        options = credentials.get("options", {})
+        user = self.add_user(credentials["email"], credentials["password"])
+        user.user_metadata = dict(options.get("data", {}))
+        return SimpleNamespace(user=user, session=None)
+
+    def sign_in_with_password(self, credentials):
+        self._call()
+        user_id = self.find_user_id(credentials["email"])
+        user = self.users.get(user_id) if user_id else None
+        if user is None or self.passwords.get(user.email) != credentials["password"]:
+            raise Exception("Invalid login credentials")
+        token = self.session_factory(user) if self.session_factory else "token"
+        return SimpleNamespace(user=user, session=SimpleNamespace(access_token=token))
+
+    def sign_out(self):
+        return None
+
+
+class FakeDatabase:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.tables: Dict[str, List[dict]] = {}
+        self.functions: Dict[str, Callable] = dict(FUNCTIONS)
+        self.calls = CallCounter()
+        # Queries run on worker threads; one at a time, like a single connection
+        self.lock = threading.RLock()
+        self.auth: Optional[FakeAuth] = None
+
+    def apply_defaults(self, table: str, row: dict) -> None:
+        """Column defaults from supabase_schema.sql"""
+        if table == "capsules":
+            row.setdefault("created_at", _now())
+            row.setdefault("updated_at", row["created_at"])
+            row.setdefault("is_group", False)
+            row.setdefault("description", None)
+            row.setdefault("created_email_sent_at", None)
+            row.setdefault("reminder_email_sent_at", None)
+            row.setdefault("unlocked_at", None)
+        elif table == "media":
+            row.setdefault("uploaded_at", _now())
+        elif table == "email_outbox":
+            row.setdefault("status", "pending")
+            row.setdefault("attempts", 0)
+            row.setdefault("next_attempt_at", _now())
+            row.setdefault("created_at", _now())
+        elif table == "storage_cleanup":
+            row.setdefault("status", "pending")
+            row.setdefault("attempts", 0)
+            row.setdefault("next_attempt_at", _now())
+            row.setdefault("created_at", _now())
+
+    def touch_capsule(self, capsule_id: Optional[str]) -> None:
+        """The touch_capsule_from_media trigger"""
+        for capsule in self.tables.get("capsules", []):
+            if capsule["id"] == capsule_id:
+                capsule["updated_at"] = _now()
+
+    def cascade(self, table: str, row: dict) -> None:
+        for child, child_key in CASCADES.get(table, []):
+            rows = self.tables.get(child, [])
+            self.tables[child] = [r for r in rows if r.get(child_key) != row["id"]]
+            for removed in rows:
+                if removed.get(child_key) == row["id"]:
+                    self.cascade(child, removed)
+
+
+class FakeSupabase:
+    """Drop-in for `supabase.Client` covering table, rpc, storage and auth"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = Latency(latency, jitter)
+        self.db = FakeDatabase(self.latency)
+        self.storage = FakeStorage(self.latency)
+        self.auth = FakeAuth(self.latency)
+        self.db.auth = self.auth
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.db, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> FakeRpc:
+        return FakeRpc(self.db, name, params or {})
+
+    def call_count(self) -> int:
+        """Table, rpc, storage and auth calls made so far"""
+        return self.db.calls.value + self.storage.calls.value + self.auth.calls.value
+
+
+# Database functions (mirrors of supabase_schema.sql)
+
+def _user_capsule_page(db, p_user_id, p_limit=20, p_cursor_created_at=None, p_cursor_id=None):
+    member_of = {
+        m["capsule_id"] for m in db.tables.get("capsule_members", [])
+        if m["user_id"] == p_user_id
+    }
+    rows = [
+        c for c in db.tables.get("capsules", [])
+        if c["owner_id"] == p_user_id or c["id"] in member_of
+    ]
+
+    def key(capsule):
+        return _cmp_value(capsule["created_at"]), capsule["id"]
+
+    rows.sort(key=key, reverse=True)
+    if p_cursor_created_at is not None:
+        cursor = (_cmp_value(p_cursor_created_at), p_cursor_id)
+        rows = [c for c in rows if key(c) < cursor]
+    return rows[:p_limit]
+
+
+def _list_user_capsules(db, **params):
+    page = _user_capsule_page(db, **params)
+    media_by_capsule: Dict[str, List[dict]] = {c["id"]: [] for c in page}
+    for media in db.tables.get("media", []):
+        if media["capsule_id"] in media_by_capsule:
+            media_by_capsule[media["capsule_id"]].append(copy.deepcopy(media))
+    items = []
+    for capsule in page:
+        item = copy.deepcopy(capsule)
+        item["media"] = sorted(
+            media_by_capsule[capsule["id"]], key=lambda m: _cmp_value(m["uploaded_at"]))
+        items.append(item)
+    return items
+
+
+def _list_user_capsule_versions(db, **params):
+    return [
+        {"id": c["id"], "updated_at": c["updated_at"], "unlock_date": c["unlock_date"]}
+        for c in _user_capsule_page(db, **params)
+    ]
+
+
+def _get_user_id_by_email(db, p_email):
+    return db.auth.find_user_id(p_email)
+
+
+def _get_user_emails(db, p_user_ids):
+    wanted = set(p_user_ids)
+    return [
+        {"id": user.id, "email": user.email}
+        for user in db.auth.users.values() if user.id in wanted
+    ]
+
+
+def _claim_email_outbox(db, p_limit, p_lease_seconds):
+    now = datetime.now(timezone.utc)
+    due = [
+        row for row in db.tables.get("email_outbox", [])
+        if row["status"] in ("pending", "sending")
+        and _cmp_value(row["next_attempt_at"]) <= now
+    ]
+    due.sort(key=lambda row: _cmp_value(row["next_attempt_at"]))
+    claimed = []
+    for row in due[:p_limit]:
+        row["status"] = "sending"
+        row["attempts"] += 1
+        row["next_attempt_at"] = (now + timedelta(seconds=p_lease_seconds)).isoformat()
+        claimed.append(copy.deepcopy(row))
+    return claimed
+
+
+def _claim_storage_cleanup(db, p_limit, p_lease_seconds):
+    now = datetime.now(timezone.utc)
+    due = [
+        row for row in db.tables.get("storage_cleanup", [])
+        if row["status"] in ("pending", "removing")
+        and _cmp_value(row["next_attempt_at"]) <= now
+    ]
+    due.sort(key=lambda row: _cmp_value(row["next_attempt_at"]))
+    claimed = []
+    for row in due[:p_limit]:
+        row["status"] = "removing"
+        row["attempts"] += 1
+        row["next_attempt_at"] = (now + timedelta(seconds=p_lease_seconds)).isoformat()
+        claimed.append(copy.deepcopy(row))
+    return claimed
+
+
+def _expire_media_uploads(db, p_limit, p_assembly_timeout_seconds):
+    now = datetime.now(timezone.utc)
+    uploads = db.tables.get("media_uploads", [])
+    stuck_before = now - timedelta(seconds=p_assembly_timeout_seconds)
+    for row in uploads:
+        if (row["status"] == "assembling" and row.get("assembling_since")
+                and _cmp_value(row["assembling_since"]) <= stuck_before):
+            row["status"] = "pending"
+            row["assembling_since"] = None
+
+    due = sorted(
+        (row for row in uploads
+         if row["status"] in ("pending", "completed")
+         and _cmp_value(row["expires_at"]) <= now),
+        key=lambda row: _cmp_value(row["expires_at"]))[:p_limit]
+    expired = {row["id"] for row in due}
+
+    queue = db.tables.setdefault("storage_cleanup", [])
+    queued = {row["path"] for row in queue}
+    for part in db.tables.get("media_upload_parts", []):
+        if part["upload_id"] in expired and part["storage_path"] not in queued:
+            row = {"path": part["storage_path"]}
+            db.apply_defaults("storage_cleanup", row)
+            queue.append(row)
+            queued.add(row["path"])
+
+    for row in due:
+        db.cascade("media_uploads", row)
+    db.tables["media_uploads"] = [row for row in uploads if row["id"] not in expired]
+    return len(expired)
+
+
+def _acquire_media_object(db, p_owner_id, p_content_hash, p_file_path, p_size):
+    objects = db.tables.setdefault("media_objects", [])
+    for row in objects:
+        if row["owner_id"] == p_owner_id and row["content_hash"] == p_content_hash:
+            row["ref_count"] += 1
+            break
+    else:
+        row = {
+            "owner_id": p_owner_id,
+            "content_hash": p_content_hash,
+            "file_path": p_file_path,
+            "size": p_size,
+            "ref_count": 1,
+            "stored": False,
+            "created_at": _now(),
+        }
+        objects.append(row)
+    return [{"file_path": row["file_path"], "stored": row["stored"]}]
+
+
+def _release_media_objects(db, p_file_paths):
+    objects = db.tables.setdefault("media_objects", [])
+    for row in objects:
+        row["ref_count"] -= p_file_paths.count(row["file_path"])
+    db.tables["media_objects"] = [row for row in objects if row["ref_count"] > 0]
+    indexed = {row["file_path"] for row in db.tables["media_objects"]}
+    return [path for path in dict.fromkeys(p_file_paths) if path not in indexed]
+
+
+def _delete_capsule(db, p_capsule_id, p_owner_id):
+    capsules = db.tables.get("capsules", [])
+    capsule = next((
+        row for row in capsules
+        if row["id"] == p_capsule_id and row["owner_id"] == p_owner_id
+    ), None)
+    if capsule is None:
+        return []
+
+    media = [row for row in db.tables.get("media", []) if row["capsule_id"] == p_capsule_id]
+    released = _release_media_objects(db, [row["file_path"] for row in media])
+    doomed = list(released)
+    for row in media:
+        if row["file_path"] in released:
+            doomed.extend((row.get("thumbnail_paths") or {}).values())
+    uploads = {
+        row["id"] for row in db.tables.get("media_uploads", [])
+        if row["capsule_id"] == p_capsule_id
+    }
+    doomed.extend(
+        part["storage_path"] for part in db.tables.get("media_upload_parts", [])
+        if part["upload_id"] in uploads)
+    doomed = list(dict.fromkeys(doomed))
+
+    queue = db.tables.setdefault("storage_cleanup", [])
+    queued = {row["path"] for row in queue}
+    for path in doomed:
+        if path not in queued:
+            row = {"path": path}
+            db.apply_defaults("storage_cleanup", row)
+            queue.append(row)
+
+    db.tables["capsules"] = [row for row in capsules if row is not capsule]
+    db.cascade("capsules", capsule)
+    return doomed
+
+
+FUNCTIONS: Dict[str, Callable] = {
+    "acquire_media_object": _acquire_media_object,
+    "claim_email_outbox": _claim_email_outbox,
+    "claim_storage_cleanup": _claim_storage_cleanup,
+    "delete_capsule": _delete_capsule,
+    "expire_media_uploads": _expire_media_uploads,
+    "get_user_emails": _get_user_emails,
+    "get_user_id_by_email": _get_user_id_by_email,
+    "list_user_capsule_versions": _list_user_capsule_versions,
+    "list_user_capsules": _list_user_capsules,
+    "release_media_objects": _release_media_objects,
+}
@@ -0,0 +1,211 @@
+"""
+Shared setup for the benchmarks: point the app at a FakeSupabase, mint
+access tokens, seed datasets and turn timing samples into percentiles.
+Import this module before anything under `app`, since settings are read
+when `app.config` is first imported.
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Settings the app needs, for runs without a .env. Email workers stay off so
+# nothing tries to reach SendGrid, but sends are still queued to the outbox.
+# Thumbnail workers stay off too: benchmark uploads are not decodable images.
+for _name, _value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "benchmark-anon-key",
+    "SUPABASE_SERVICE_KEY": "benchmark-service-key",
+    "SUPABASE_JWT_SECRET": "benchmark-jwt-secret",
+    "SENDGRID_API_KEY": "benchmark",
+    "SENDGRID_FROM": "Time Capsule <bench@example.com>",
+    "EMAIL_WORKERS": "0",
+    "THUMBNAIL_WORKERS": "0",
+    "STORAGE_CLEANUP_WORKERS": "0",
+    "UPLOAD_EXPIRY_SWEEP_SECONDS": "0",
+    "LOG_LEVEL": "WARNING",
+    "LOG_FORMAT": "text",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from jose import jwt  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+
+
+def install(fake: FakeSupabase):
+    """
+    Import the app and swap its Supabase clients for `fake`. Modules bind
+    the clients at import time, so every loaded `app.*` module is patched.
+    Returns the FastAPI app.
+    """
+    import app.main
+
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app") or module is None:
+            continue
+        if hasattr(module, "supabase_admin"):
+            module.supabase_admin = fake
+        if hasattr(module, "supabase") and not isinstance(module.supabase, type(sys)):
+            module.supabase = fake
+
+    fake.auth.session_factory = access_token
+    return app.main.app
+
+
+def access_token(user, lifetime_seconds: int = 3600) -> str:
+    """A Supabase-style access token for a fake user, signed locally"""
+    from app.config import settings
+
+    return jwt.encode({
+        "sub": user.id,
+        "email": user.email,
+        "aud": settings.JWT_AUDIENCE,
+        "exp": int(time.time()) + lifetime_seconds,
+        "jti": uuid.uuid4().hex,
+        "user_metadata": user.user_metadata,
+    }, settings.SUPABASE_JWT_SECRET, algorithm=settings.ALGORITHM)
+
+
+@dataclass
+class Dataset:
+    users: List[object]
+    capsules: Dict[str, List[dict]]  # user id -> capsules owned
+    unlocked: Dict[str, List[dict]]  # user id -> unlocked capsules owned
+    locked: Dict[str, List[dict]]  # user id -> capsules still locked
+    password: str = "password"
+
+
+def seed(
+    fake: FakeSupabase,
+    users: int = 1,
+    capsules_per_user: int = 20,
+    media_per_capsule: int = 5,
+    due_fraction: float = 0.1,
+    rng: Optional[random.Random] = None
+) -> Dataset:
+    """
+    Fill the fake with users, capsules and media. Half the capsules are
+    unlocked; `due_fraction` of them unlock within the reminder window and
+    the rest later. Rows are written directly, without latency.
+    """
+    from app.config import settings
+
+    rng = rng or random.Random(42)
+    now = datetime.now(timezone.utc)
+    capsules_table = fake.db.tables.setdefault("capsules", [])
+    media_table = fake.db.tables.setdefault("media", [])
+    bucket = fake.storage.from_(settings.STORAGE_BUCKET)
+
+    dataset = Dataset(users=[], capsules={}, unlocked={}, locked={})
+    for u in range(users):
+        user = fake.auth.add_user(f"bench-user-{u}@example.com", dataset.password)
+        dataset.users.append(user)
+        dataset.capsules[user.id] = []
+        dataset.unlocked[user.id] = []
+        dataset.locked[user.id] = []
+
+        for c in range(capsules_per_user):
+            created_at = now - timedelta(days=400, minutes=c)
+            roll = rng.random()
+            if c % 2 == 0:
+                unlock_date = now - timedelta(days=rng.randint(1, 300))
+            elif roll < due_fraction:
+                unlock_date = now + timedelta(hours=rng.uniform(1, 23))
+            else:
+                unlock_date = now + timedelta(days=rng.randint(2, 3650))
+
+            capsule = {
+                "id": str(uuid.uuid4()),
+                "title": f"Capsule {c}",
+                "description": "Benchmark capsule",
+                "unlock_date": unlock_date.isoformat(),
+                "owner_id": user.id,
+                "is_group": False,
+                "created_at": created_at.isoformat(),
+            }
+            fake.db.apply_defaults("capsules", capsule)
+            if unlock_date <= now:
+                capsule["unlocked_at"] = unlock_date.isoformat()
+            capsules_table.append(capsule)
+            dataset.capsules[user.id].append(capsule)
+            (dataset.unlocked if unlock_date <= now else dataset.locked)[user.id].append(capsule)
+
+            for m in range(media_per_capsule):
+                path = f"{user.id}/{capsule['id']}/{uuid.uuid4()}.jpg"
+                media_table.append({
+                    "id": str(uuid.uuid4()),
+                    "capsule_id": capsule["id"],
+                    "file_path": path,
+                    "filename": f"photo-{m}.jpg",
+                    "file_type": "image",
+                    "uploaded_at": (created_at + timedelta(seconds=m)).isoformat(),
+                })
+                bucket.objects[path] = b"\xff\xd8benchmark"
+    return dataset
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+@dataclass
+class RunResult:
+    samples: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+
+
+async def run_concurrently(
+    operation: Callable[[int], Awaitable[object]],
+    iterations: int,
+    concurrency: int = 1
+) -> RunResult:
+    """
+    Run `operation(i)` for i in range(iterations) with at most `concurrency`
+    in flight, timing each call. Exceptions count as errors, not samples.
+    """
+    result = RunResult()
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < iterations:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception:
+                result.errors += 1
+                continue
+            result.samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    result.wall_seconds = time.perf_counter() - started
+    return result
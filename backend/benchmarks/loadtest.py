@@ -0,0 +1,295 @@
+"""
+End-to-end load generator for the API, backed by the in-memory Supabase fake.
+
+Virtual users log in and then replay a weighted mix of dashboard actions
+(login, list capsules, open a capsule, fetch signed URLs, upload media)
+for a fixed duration. Reports throughput, p50/p95/p99 latency and error
+rate per endpoint, and can write a JSON report to diff between releases.
+
+In-process (the app runs on the load generator's event loop through an
+ASGI transport, so client overhead is included in the numbers):
+
+    cd backend
+    python -m benchmarks.loadtest run --users 50 --duration 30 --report load.json
+
+Over localhost against one uvicorn worker (start the server first, with the
+same --accounts; the generator discovers capsules through the API):
+
+    python -m benchmarks.loadtest serve --accounts 50 --latency-ms 2 --port 8000
+    python -m benchmarks.loadtest run --url http://127.0.0.1:8000 --accounts 50 --users 50
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.harness import install, seed, summarize
+from benchmarks.fake_supabase import FakeSupabase
+
+import httpx
+
+DEFAULT_MIX = "list=40,detail=30,urls=15,upload=10,login=5"
+
+# Account credentials created by seed()
+ACCOUNT_EMAIL = "bench-user-{}@example.com"
+ACCOUNT_PASSWORD = "password"
+
+
+@dataclass
+class EndpointStats:
+    samples: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def record(self, elapsed: float, status: str, ok: bool) -> None:
+        self.samples.append(elapsed)
+        self.statuses[status] += 1
+        if not ok:
+            self.errors += 1
+
+
+class VirtualUser:
+    """One dashboard session: logs in, then picks actions from the mix"""
+
+    def __init__(self, client: httpx.AsyncClient, account: int, stats: Dict[str, EndpointStats],
+                 upload_bytes: bytes, rng: random.Random):
+        self.client = client
+        self.email = ACCOUNT_EMAIL.format(account)
+        self.stats = stats
+        self.upload_bytes = upload_bytes
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+        self.unlocked: List[str] = []
+        self.locked: List[str] = []
+
+    async def _request(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError as exc:
+            self.stats[endpoint].record(
+                time.perf_counter() - started, type(exc).__name__, ok=False)
+            return None
+        self.stats[endpoint].record(
+            time.perf_counter() - started, str(response.status_code),
+            ok=response.status_code < 400)
+        return response
+
+    async def login(self) -> None:
+        self.headers = {}
+        response = await self._request("login", "POST", "/api/auth/login", json={
+            "email": self.email, "password": ACCOUNT_PASSWORD
+        })
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list(self) -> None:
+        response = await self._request("list", "GET", "/api/capsules/", params={"limit": 20})
+        if response is not None and response.status_code == 200:
+            items = response.json()["items"]
+            self.unlocked = [c["id"] for c in items if c["is_unlocked"]]
+            self.locked = [c["id"] for c in items if not c["is_unlocked"]]
+
+    async def detail(self) -> None:
+        capsules = self.unlocked + self.locked
+        if not capsules:
+            return await self.list()
+        await self._request("detail", "GET", f"/api/capsules/{self.rng.choice(capsules)}")
+
+    async def urls(self) -> None:
+        if not self.unlocked:
+            return await self.list()
+        await self._request(
+            "urls", "GET", f"/api/media/capsule/{self.rng.choice(self.unlocked)}/urls")
+
+    async def upload(self) -> None:
+        if not self.locked:
+            return await self.list()
+        # Unique trailing bytes, so uploads are stored rather than deduplicated
+        content = self.upload_bytes[:-8] + self.rng.randbytes(8)
+        await self._request(
+            "upload", "POST", f"/api/media/upload/{self.rng.choice(self.locked)}",
+            files={"file": ("load.jpg", content, "image/jpeg")})
+
+    async def run(self, actions: List[str], weights: List[int], deadline: float) -> None:
+        await self.login()
+        await self.list()
+        while time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(actions, weights)[0])()
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("login", "list", "detail", "urls", "upload"):
+            raise argparse.ArgumentTypeError(f"Unknown action in mix: {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+def build_report(args, stats: Dict[str, EndpointStats], elapsed: float, target: str) -> dict:
+    endpoints = {}
+    total_requests = total_errors = 0
+    for name in sorted(stats):
+        endpoint = stats[name]
+        requests = len(endpoint.samples)
+        total_requests += requests
+        total_errors += endpoint.errors
+        endpoints[name] = {
+            "requests": requests,
+            "errors": endpoint.errors,
+            "error_rate": round(endpoint.errors / requests, 4) if requests else 0.0,
+            "requests_per_sec": round(requests / elapsed, 1),
+            **summarize(endpoint.samples),
+            "status_codes": dict(sorted(endpoint.statuses.items())),
+        }
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "target": target,
+        "config": {
+            "users": args.users,
+            "accounts": args.accounts,
+            "duration_seconds": args.duration,
+            "mix": args.mix,
+            "upload_kb": args.upload_kb,
+            "latency_ms": args.latency_ms if target == "in-process" else None,
+            "capsules_per_account": args.capsules if target == "in-process" else None,
+            "media_per_capsule": args.media if target == "in-process" else None,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "total": {
+            "requests": total_requests,
+            "errors": total_errors,
+            "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+            "requests_per_sec": round(total_requests / elapsed, 1),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict) -> None:
+    header = f"{'endpoint':<10} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'err %':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report["endpoints"].items():
+        print(
+            f"{name:<10} {row['requests']:>9} {row['requests_per_sec']:>8} {row['p50_ms']:>8} "
+            f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>7} {row['error_rate'] * 100:>6.2f}")
+    total = report["total"]
+    print(f"\n{total['requests']} requests in {report['elapsed_seconds']}s "
+          f"({total['requests_per_sec']} req/s), error rate {total['error_rate'] * 100:.2f}%")
+
+
+def build_fake_app(args):
+    fake = FakeSupabase(latency=args.latency_ms / 1000, jitter=args.jitter)
+    app = install(fake)
+    seed(fake, users=args.accounts, capsules_per_user=args.capsules,
+         media_per_capsule=args.media)
+    return app
+
+
+async def run(args) -> dict:
+    if args.url:
+        target = args.url
+        transport = None
+    else:
+        target = "in-process"
+        transport = httpx.ASGITransport(app=build_fake_app(args))
+
+    mix = parse_mix(args.mix)
+    actions, weights = list(mix), list(mix.values())
+    stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+    upload_bytes = b"\xff\xd8" + b"\x00" * max(0, args.upload_kb * 1024 - 2)
+    rng = random.Random(args.seed)
+
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url or "http://loadtest", transport=transport,
+                                 limits=limits, timeout=args.timeout) as client:
+        users = [
+            VirtualUser(client, i % args.accounts, stats, upload_bytes,
+                        random.Random(rng.random()))
+            for i in range(args.users)
+        ]
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[user.run(actions, weights, deadline) for user in users])
+        elapsed = time.perf_counter() - started
+
+    report = build_report(args, stats, elapsed, target)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.report}")
+    return report
+
+
+def serve(args) -> None:
+    import uvicorn
+
+    app = build_fake_app(args)
+    print(f"Serving the API on {args.host}:{args.port} with {args.accounts} seeded accounts "
+          f"({ACCOUNT_EMAIL.format('N')} / {ACCOUNT_PASSWORD})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_dataset_args(command):
+        command.add_argument("--accounts", type=int, default=20,
+                             help="seeded accounts; virtual users share them round-robin")
+        command.add_argument("--capsules", type=int, default=20, help="capsules per account")
+        command.add_argument("--media", type=int, default=5, help="media items per capsule")
+        command.add_argument("--latency-ms", type=float, default=2.0,
+                             help="injected latency per Supabase call (default 2)")
+        command.add_argument("--jitter", type=float, default=0.2,
+                             help="latency jitter as a fraction (default 0.2)")
+
+    run_command = commands.add_parser("run", help="generate load and report")
+    add_dataset_args(run_command)
+    run_command.add_argument("--url", default=None,
+                             help="target server; omit to run the app in-process")
+    run_command.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    run_command.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    run_command.add_argument("--mix", default=DEFAULT_MIX,
+                             help=f"action weights (default {DEFAULT_MIX})")
+    run_command.add_argument("--upload-kb", type=int, default=256)
+    run_command.add_argument("--timeout", type=float, default=30.0)
+    run_command.add_argument("--seed", type=int, default=1)
+    run_command.add_argument("--report", default=None, help="write the JSON report here")
+
+    serve_command = commands.add_parser("serve", help="run the API on the fake over HTTP")
+    add_dataset_args(serve_command)
+    serve_command.add_argument("--host", default="127.0.0.1")
+    serve_command.add_argument("--port", type=int, default=8000)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        try:
+            parse_mix(args.mix)
+        except (argparse.ArgumentTypeError, ValueError) as exc:
+            parser.error(str(exc))
+    return args
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.command == "serve":
+        serve(args)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import access_token, install
+from benchmarks.fake_supabase import FakeSupabase
+from app.config import settings
+from app.services import upload_service
+from app.services.upload_service import ResumableUploadService
+
+
+def _start_upload(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_PART_SIZE", 10)
+    fake = FakeSupabase()
+    client = TestClient(install(fake), raise_server_exceptions=False)
+    user = fake.auth.add_user("uploader@example.com")
+    headers = {"Authorization": f"Bearer {access_token(user)}"}
+
+    unlock_date = (datetime.now(timezone.utc) + timedelta(days=3)).isoformat()
+    capsule_id = client.post("/api/capsules/", json={
+        "title": "Capsule", "unlock_date": unlock_date}, headers=headers).json()["id"]
+    upload_id = client.post(f"/api/media/upload/{capsule_id}/resumable", json={
+        "filename": "clip.mp4", "content_type": "video/mp4", "size": 15
+    }, headers=headers).json()["upload_id"]
+    for part, data in ((1, b"a" * 10), (2, b"b" * 5)):
+        response = client.put(
+            f"/api/media/uploads/{upload_id}/parts/{part}", content=data, headers=headers)
+        assert response.status_code == 200
+    return fake, client, headers, upload_id
+
+
+def _session(fake, upload_id):
+    return next(row for row in fake.db.tables["media_uploads"] if row["id"] == upload_id)
+
+
+def test_failed_completion_discards_media_and_reopens_session(monkeypatch):
+    fake, client, headers, upload_id = _start_upload(monkeypatch)
+    execute = upload_service.execute
+
+    async def failing_execute(query):
+        if getattr(query, "payload", None) and query.payload.get("status") == "completed":
+            raise RuntimeError("database unavailable")
+        return await execute(query)
+
+    monkeypatch.setattr(upload_service, "execute", failing_execute)
+    response = client.post(f"/api/media/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 500
+    assert fake.db.tables["media"] == []
+    assert fake.db.tables["media_objects"] == []
+    assert _session(fake, upload_id)["status"] == "pending"
+
+    monkeypatch.setattr(upload_service, "execute", execute)
+    response = client.post(f"/api/media/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 201
+    assert _session(fake, upload_id)["status"] == "completed"
+    assert len(fake.db.tables["media"]) == 1
+
+
+def test_sweep_reopens_session_stuck_assembling(monkeypatch):
+    fake, client, headers, upload_id = _start_upload(monkeypatch)
+    session = _session(fake, upload_id)
+    session["status"] = "assembling"
+    session["assembling_since"] = (
+        datetime.now(timezone.utc)
+        - timedelta(seconds=settings.UPLOAD_ASSEMBLY_TIMEOUT_SECONDS + 60)).isoformat()
+
+    assert asyncio.run(ResumableUploadService.expire_uploads()) == 0
+    assert session["status"] == "pending"
+
+    response = client.post(f"/api/media/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 201
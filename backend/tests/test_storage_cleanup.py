@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+
+import benchmarks.harness  # noqa: F401  (settings defaults for the in-memory setup)
+from app.config import settings
+from app.services import storage_cleanup
+from app.services.storage_cleanup import SETTLE_CHUNK_SIZE, StorageCleanup
+from benchmarks.fake_supabase import FakeQuery, FakeSupabase
+
+
+class _Storage:
+    def __init__(self, error=None):
+        self.error = error
+        self.removed = []
+
+    async def remove(self, paths):
+        if self.error:
+            raise self.error
+        self.removed.extend(paths)
+
+
+def _setup(monkeypatch, storage, attempts=1):
+    fake = FakeSupabase()
+    monkeypatch.setattr(storage_cleanup, "supabase_admin", fake)
+    monkeypatch.setattr(storage_cleanup, "get_storage", lambda: storage)
+
+    in_sizes = []
+    original_in = FakeQuery.in_
+
+    def in_(self, column, values):
+        in_sizes.append(len(values))
+        return original_in(self, column, values)
+
+    monkeypatch.setattr(FakeQuery, "in_", in_)
+
+    queue = fake.db.tables.setdefault("storage_cleanup", [])
+    for _ in range(settings.STORAGE_CLEANUP_BATCH_SIZE):
+        row = {"path": f"{uuid.uuid4()}/{uuid.uuid4()}/{uuid.uuid4()}.jpg"}
+        fake.db.apply_defaults("storage_cleanup", row)
+        queue.append(row)
+
+    entries = asyncio.run(StorageCleanup._claim())
+    assert len(entries) == settings.STORAGE_CLEANUP_BATCH_SIZE
+    for entry in entries:
+        entry["attempts"] = attempts
+    return fake, entries, in_sizes
+
+
+def test_full_batch_is_removed_in_short_deletes(monkeypatch):
+    storage = _Storage()
+    fake, entries, in_sizes = _setup(monkeypatch, storage)
+
+    asyncio.run(StorageCleanup._remove(entries))
+
+    assert len(storage.removed) == len(entries)
+    assert fake.db.tables["storage_cleanup"] == []
+    assert in_sizes and max(in_sizes) <= SETTLE_CHUNK_SIZE
+    assert sum(in_sizes) == len(entries)
+
+
+def test_full_batch_failure_is_recorded_in_short_updates(monkeypatch):
+    fake, entries, in_sizes = _setup(monkeypatch, _Storage(RuntimeError("storage down")))
+    # Half the batch is on its last attempt, half can be retried
+    for entry in entries[::2]:
+        entry["attempts"] = settings.STORAGE_CLEANUP_MAX_ATTEMPTS
+
+    asyncio.run(StorageCleanup._remove(entries))
+
+    rows = fake.db.tables["storage_cleanup"]
+    assert len(rows) == len(entries)
+    assert sum(row["status"] == "failed" for row in rows) == len(entries) // 2
+    assert sum(row["status"] == "pending" for row in rows) == len(entries) // 2
+    assert all(row["last_error"] == "RuntimeError: storage down" for row in rows)
+    assert in_sizes and max(in_sizes) <= SETTLE_CHUNK_SIZE
+    assert sum(in_sizes) == len(entries)
@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import benchmarks.harness  # noqa: F401  (settings defaults for the in-memory setup)
+from app.config import settings
+from app.services import unlock_service
+from app.services.unlock_service import UnlockScheduler, UnlockService
+
+
+def _rows(start: datetime, count: int, offset: int = 0) -> list:
+    return [
+        {"id": f"capsule-{offset + i}",
+         "unlock_date": (start + timedelta(minutes=offset + i)).isoformat()}
+        for i in range(count)
+    ]
+
+
+def test_full_page_after_short_page_resumes_refilling(monkeypatch):
+    monkeypatch.setattr(settings, "UNLOCK_SCHEDULER_BATCH", 4)
+    monkeypatch.setattr(unlock_service, "_heap", [])
+    monkeypatch.setattr(unlock_service, "_scheduled", {})
+    monkeypatch.setattr(unlock_service, "_watermark", None)
+    monkeypatch.setattr(unlock_service, "_exhausted", False)
+
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    pages = [_rows(start, 2), _rows(start, 4, offset=2)]
+
+    async def fetch_pending(after, limit):
+        return pages.pop(0)
+
+    monkeypatch.setattr(UnlockService, "fetch_pending", staticmethod(fetch_pending))
+
+    asyncio.run(UnlockScheduler._refill())
+    assert unlock_service._exhausted is True
+
+    asyncio.run(UnlockScheduler._refill())
+    assert unlock_service._exhausted is False
+    # The last unlock time of a full page is left for the next refill
+    assert unlock_service._watermark == start + timedelta(minutes=4)
+    assert sorted(unlock_service._scheduled) == [f"capsule-{i}" for i in range(5)]
+
+
+def test_is_capsule_unlocked_respects_the_offset():
+    now = datetime.now(timezone.utc)
+    # Two hours ago in UTC, written in a +05:00 offset whose wall clock is ahead
+    past = (now - timedelta(hours=2)).astimezone(timezone(timedelta(hours=5)))
+    future = now + timedelta(hours=2)
+
+    assert UnlockService.is_capsule_unlocked(past.isoformat()) is True
+    assert UnlockService.is_capsule_unlocked(future.isoformat().replace("+00:00", "Z")) is False
+    assert UnlockService.is_capsule_unlocked(
+        (now - timedelta(minutes=1)).replace(tzinfo=None).isoformat()) is True
@@ -0,0 +1,28 @@
+import { useEffect, useRef } from 'react'
+import { decodeBlurhash } from '../utils/blurhash'
+
+// The hash only holds a few colour components, so a tiny canvas scaled up
+// by CSS looks the same as a full-size one
+const SIZE = 32
+
+function BlurhashPlaceholder({ hash, className = '' }) {
+    const canvasRef = useRef(null)
+
+    useEffect(() => {
+        const canvas = canvasRef.current
+        if (!canvas || !hash) return
+
+        try {
+            const context = canvas.getContext('2d')
+            const imageData = context.createImageData(SIZE, SIZE)
+            imageData.data.set(decodeBlurhash(hash, SIZE, SIZE))
+            context.putImageData(imageData, 0, 0)
+        } catch (error) {
+            console.error('Invalid blurhash:', error)
+        }
+    }, [hash])
+
+    return <canvas ref={canvasRef} width={SIZE} height={SIZE} className={className} aria-hidden="true" />
+}
+
+export default BlurhashPlaceholder
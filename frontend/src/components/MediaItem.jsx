@@ -1,15 +1,24 @@
 import { motion, AnimatePresence } from 'framer-motion'
-import { useState } from 'react'
+import { useState, useEffect } from 'react'
 import { mediaService } from '../services/mediaService'
 import { getFileIcon } from '../utils/fileUtils'
+import BlurhashPlaceholder from './BlurhashPlaceholder'
 import toast from 'react-hot-toast'
 
-function MediaItem({ media, isUnlocked, onDelete }) {
-    const [mediaUrl, setMediaUrl] = useState(null)
+// Rendered width of a grid card: full width on mobile, a third on large screens
+const CARD_SIZES = '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw'
+
+function MediaItem({ media, isUnlocked, onDelete, signedUrl, thumbnails }) {
+    const [mediaUrl, setMediaUrl] = useState(signedUrl || null)
     const [loading, setLoading] = useState(false)
+    const [imageLoaded, setImageLoaded] = useState(false)
     const [isModalOpen, setIsModalOpen] = useState(false)
     const [isDownloading, setIsDownloading] = useState(false)
 
+    useEffect(() => {
+        if (signedUrl) setMediaUrl(signedUrl)
+    }, [signedUrl])
+
     const loadMedia = async () => {
         if (!isUnlocked || mediaUrl) return
 
@@ -27,6 +36,14 @@ function MediaItem({ media, isUnlocked, onDelete }) {
         }
     }
 
+    // Thumbnails (longest edge in px -> signed URL) let the browser pick the
+    // smallest image that fills the card; the original is kept for the modal
+    const thumbnailSizes = Object.keys(thumbnails || {}).sort((a, b) => a - b)
+    const previewUrl = thumbnailSizes.length > 0 ? thumbnails[thumbnailSizes[0]] : mediaUrl
+    const previewSrcSet = thumbnailSizes.length > 0
+        ? thumbnailSizes.map((size) => `${thumbnails[size]} ${size}w`).join(', ')
+        : undefined
+
     const handleDownload = async () => {
         if (!mediaUrl) return
 
@@ -118,12 +135,26 @@ function MediaItem({ media, isUnlocked, onDelete }) {
                                 <div className="mt-3 space-y-2">
                                     {media.file_type === 'image' && (
                                         <>
-                                            <img
-                                                src={mediaUrl}
-                                                alt={media.filename}
+                                            <div
                                                 onClick={() => setIsModalOpen(true)}
-                                                className="w-full h-48 object-cover rounded-lg cursor-pointer hover:opacity-80 transition-opacity"
-                                            />
+                                                className="relative w-full h-48 rounded-lg overflow-hidden cursor-pointer"
+                                            >
+                                                {media.blurhash && !imageLoaded && (
+                                                    <BlurhashPlaceholder
+                                                        hash={media.blurhash}
+                                                        className="absolute inset-0 w-full h-full"
+                                                    />
+                                                )}
+                                                <img
+                                                    src={previewUrl}
+                                                    srcSet={previewSrcSet}
+                                                    sizes={previewSrcSet ? CARD_SIZES : undefined}
+                                                    alt={media.filename}
+                                                    loading="lazy"
+                                                    onLoad={() => setImageLoaded(true)}
+                                                    className={`relative w-full h-full object-cover hover:opacity-80 transition-opacity ${imageLoaded ? 'opacity-100' : 'opacity-0'}`}
+                                                />
+                                            </div>
                                             <button
                                                 onClick={handleDownload}
                                                 disabled={isDownloading}
@@ -3,6 +3,7 @@ import { motion, AnimatePresence } from 'framer-motion'
 import { useParams, useNavigate, Link } from 'react-router-dom'
 import { capsuleService } from '../services/capsuleService'
 import { mediaService } from '../services/mediaService'
+import { realtimeService } from '../services/realtimeService'
 import { formatUnlockDate, getTimeRemaining } from '../utils/dateUtils'
 import { validateFile, formatFileSize } from '../utils/fileUtils'
 import { useAuthStore } from '../store/authStore'
@@ -17,8 +18,11 @@ function CapsuleDetail() {
     const navigate = useNavigate()
     const { user } = useAuthStore()
     const fileInputRef = useRef(null)
+    const unlockRefetchRef = useRef(null)
 
     const [capsule, setCapsule] = useState(null)
+    const [mediaUrls, setMediaUrls] = useState({})
+    const [thumbnailUrls, setThumbnailUrls] = useState({})
     const [loading, setLoading] = useState(true)
     const [uploading, setUploading] = useState(false)
     const [deleting, setDeleting] = useState(false)
@@ -27,6 +31,39 @@ function CapsuleDetail() {
         loadCapsule()
     }, [id])
 
+    useEffect(() => {
+        // Server pushes replace polling when the countdown ends
+        const unsubscribe = realtimeService.subscribe((event) => {
+            if (event.type === 'capsule_unlocked' && event.capsule.id === id) {
+                cancelUnlockRefetch()
+                handleCapsuleUnlock()
+            } else if (event.type === 'media_added' && event.capsule_id === id) {
+                loadCapsule()
+            }
+        })
+        return () => {
+            unsubscribe()
+            cancelUnlockRefetch()
+        }
+    }, [id])
+
+    useEffect(() => {
+        if (capsule?.is_unlocked && capsule.media?.length > 0) {
+            loadMediaUrls()
+        }
+    }, [capsule?.id, capsule?.is_unlocked])
+
+    const loadMediaUrls = async () => {
+        try {
+            // One request signs every media item (and image thumbnail) in the capsule
+            const data = await mediaService.getCapsuleMediaUrls(id)
+            setMediaUrls(data.urls || {})
+            setThumbnailUrls(data.thumbnails || {})
+        } catch (error) {
+            console.error('Failed to load media URLs:', error)
+        }
+    }
+
     const loadCapsule = async () => {
         try {
             const data = await capsuleService.getCapsule(id)
@@ -95,6 +132,21 @@ function CapsuleDetail() {
         }))
     }
 
+    const cancelUnlockRefetch = () => {
+        clearTimeout(unlockRefetchRef.current)
+        unlockRefetchRef.current = null
+    }
+
+    const handleCountdownEnd = () => {
+        // The capsule_unlocked push normally reloads the capsule and cancels
+        // this; the jittered refetch covers a push that never arrives
+        cancelUnlockRefetch()
+        unlockRefetchRef.current = setTimeout(() => {
+            unlockRefetchRef.current = null
+            handleCapsuleUnlock()
+        }, 2000 + Math.random() * 5000)
+    }
+
     const handleCapsuleUnlock = async () => {
         // Reload capsule data when unlock time is reached
         try {
@@ -191,7 +243,7 @@ function CapsuleDetail() {
                 {!isUnlocked && (
                     <CountdownTimer
                         unlockDate={capsule.unlock_date}
-                        onUnlock={handleCapsuleUnlock}
+                        onUnlock={handleCountdownEnd}
                     />
                 )}
 
@@ -278,6 +330,8 @@ function CapsuleDetail() {
                                         key={media.id}
                                         media={media}
                                         isUnlocked={isUnlocked}
+                                        signedUrl={mediaUrls[media.id]}
+                                        thumbnails={thumbnailUrls[media.id]}
                                         onDelete={isOwner && !isUnlocked ? handleMediaDelete : null}
                                     />
                                 ))}
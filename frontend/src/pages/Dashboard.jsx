@@ -10,7 +10,9 @@ import toast from 'react-hot-toast'
 
 function Dashboard() {
     const [capsules, setCapsules] = useState([])
+    const [nextCursor, setNextCursor] = useState(null)
     const [loading, setLoading] = useState(true)
+    const [loadingMore, setLoadingMore] = useState(false)
     const [filter, setFilter] = useState('all') // all, unlocked, locked
     const { user } = useAuthStore()
 
@@ -21,7 +23,8 @@ function Dashboard() {
     const loadCapsules = async () => {
         try {
             const data = await capsuleService.getCapsules()
-            setCapsules(data)
+            setCapsules(data.items)
+            setNextCursor(data.next_cursor)
         } catch (error) {
             toast.error('Failed to load capsules')
         } finally {
@@ -29,6 +32,21 @@ function Dashboard() {
         }
     }
 
+    const loadMoreCapsules = async () => {
+        if (!nextCursor) return
+
+        setLoadingMore(true)
+        try {
+            const data = await capsuleService.getCapsules(nextCursor)
+            setCapsules((prev) => [...prev, ...data.items])
+            setNextCursor(data.next_cursor)
+        } catch (error) {
+            toast.error('Failed to load more capsules')
+        } finally {
+            setLoadingMore(false)
+        }
+    }
+
     const filteredCapsules = capsules.filter((capsule) => {
         if (filter === 'all') return true
         if (filter === 'unlocked') return capsule.is_unlocked
@@ -55,7 +73,7 @@ function Dashboard() {
                         Welcome back, {user?.username || 'User'}! 👋
                     </h1>
                     <p className="text-gray-300 text-lg">
-                        You have {capsules.length} time capsule{capsules.length !== 1 ? 's' : ''}
+                        You have {capsules.length}{nextCursor ? '+' : ''} time capsule{capsules.length !== 1 ? 's' : ''}
                     </p>
                 </motion.div>
 
@@ -142,6 +160,18 @@ function Dashboard() {
                         ))}
                     </motion.div>
                 )}
+
+                {nextCursor && (
+                    <div className="text-center mt-10">
+                        <button
+                            onClick={loadMoreCapsules}
+                            disabled={loadingMore}
+                            className="btn-secondary"
+                        >
+                            {loadingMore ? 'Loading...' : 'Load more capsules'}
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     )
@@ -6,8 +6,10 @@ export const capsuleService = {
         return response.data
     },
 
-    async getCapsules() {
-        const response = await api.get('/api/capsules/')
+    async getCapsules(cursor = null, limit = 20) {
+        const params = { limit }
+        if (cursor) params.cursor = cursor
+        const response = await api.get('/api/capsules/', { params })
         return response.data
     },
 
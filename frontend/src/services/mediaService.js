@@ -18,6 +18,11 @@ export const mediaService = {
         return response.data
     },
 
+    async getCapsuleMediaUrls(capsuleId) {
+        const response = await api.get(`/api/media/capsule/${capsuleId}/urls`)
+        return response.data
+    },
+
     async deleteMedia(mediaId) {
         const response = await api.delete(`/api/media/${mediaId}`)
         return response.data
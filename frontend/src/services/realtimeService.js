@@ -0,0 +1,57 @@
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000'
+const WS_URL = API_URL.replace(/^http/, 'ws') + '/api/realtime/ws'
+
+const listeners = new Set()
+let socket = null
+let reconnectTimer = null
+let reconnectDelay = 1000
+
+function connect() {
+    const token = localStorage.getItem('access_token')
+    if (!token || socket) return
+
+    socket = new WebSocket(`${WS_URL}?token=${encodeURIComponent(token)}`)
+
+    socket.onopen = () => {
+        reconnectDelay = 1000
+    }
+
+    socket.onmessage = (message) => {
+        let event
+        try {
+            event = JSON.parse(message.data)
+        } catch {
+            return
+        }
+        if (event.type === 'ping') {
+            socket.send(JSON.stringify({ type: 'pong' }))
+            return
+        }
+        listeners.forEach((listener) => listener(event))
+    }
+
+    socket.onclose = () => {
+        socket = null
+        if (listeners.size > 0) {
+            // Back off (with jitter) so clients do not reconnect in lockstep
+            reconnectTimer = setTimeout(connect, reconnectDelay * (0.5 + Math.random()))
+            reconnectDelay = Math.min(reconnectDelay * 2, 30000)
+        }
+    }
+}
+
+export const realtimeService = {
+    // Receive capsule_unlocked / media_added events; returns an unsubscribe function
+    subscribe(listener) {
+        listeners.add(listener)
+        connect()
+        return () => {
+            listeners.delete(listener)
+            if (listeners.size === 0) {
+                clearTimeout(reconnectTimer)
+                socket?.close()
+                socket = null
+            }
+        }
+    },
+}
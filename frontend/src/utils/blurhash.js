@@ -0,0 +1,83 @@
+// BlurHash decoder (https://blurha.sh), enough to paint the small
+// placeholder the backend stores for each image
+
+const DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+const decode83 = (value) => {
+    let result = 0
+    for (const char of value) {
+        result = result * 83 + DIGITS.indexOf(char)
+    }
+    return result
+}
+
+const sRGBToLinear = (value) => {
+    const v = value / 255
+    return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4)
+}
+
+const linearTosRGB = (value) => {
+    const v = Math.max(0, Math.min(1, value))
+    return v <= 0.0031308
+        ? Math.round(v * 12.92 * 255 + 0.5)
+        : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255 + 0.5)
+}
+
+const signPow = (value, exp) => Math.sign(value) * Math.pow(Math.abs(value), exp)
+
+const decodeDC = (value) => [
+    sRGBToLinear(value >> 16),
+    sRGBToLinear((value >> 8) & 255),
+    sRGBToLinear(value & 255),
+]
+
+const decodeAC = (value, maximumValue) => [
+    signPow((Math.floor(value / (19 * 19)) - 9) / 9, 2) * maximumValue,
+    signPow(((Math.floor(value / 19) % 19) - 9) / 9, 2) * maximumValue,
+    signPow(((value % 19) - 9) / 9, 2) * maximumValue,
+]
+
+// RGBA pixels (width * height * 4) for a BlurHash string; throws on a
+// malformed hash
+export const decodeBlurhash = (hash, width, height) => {
+    if (!hash || hash.length < 6) {
+        throw new Error('Invalid blurhash')
+    }
+
+    const sizeFlag = decode83(hash[0])
+    const numY = Math.floor(sizeFlag / 9) + 1
+    const numX = (sizeFlag % 9) + 1
+    if (hash.length !== 4 + 2 * numX * numY) {
+        throw new Error('Invalid blurhash length')
+    }
+
+    const maximumValue = (decode83(hash[1]) + 1) / 166
+    const colors = [decodeDC(decode83(hash.substring(2, 6)))]
+    for (let i = 1; i < numX * numY; i++) {
+        colors.push(decodeAC(decode83(hash.substring(4 + i * 2, 6 + i * 2)), maximumValue))
+    }
+
+    const pixels = new Uint8ClampedArray(width * height * 4)
+    for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) {
+            let r = 0
+            let g = 0
+            let b = 0
+            for (let j = 0; j < numY; j++) {
+                for (let i = 0; i < numX; i++) {
+                    const basis = Math.cos((Math.PI * x * i) / width) * Math.cos((Math.PI * y * j) / height)
+                    const color = colors[i + j * numX]
+                    r += color[0] * basis
+                    g += color[1] * basis
+                    b += color[2] * basis
+                }
+            }
+            const offset = 4 * (x + y * width)
+            pixels[offset] = linearTosRGB(r)
+            pixels[offset + 1] = linearTosRGB(g)
+            pixels[offset + 2] = linearTosRGB(b)
+            pixels[offset + 3] = 255
+        }
+    }
+    return pixels
+}
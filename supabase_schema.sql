@@ -17,10 +17,12 @@ CREATE TABLE capsules (
     description TEXT,
     unlock_date TIMESTAMPTZ NOT NULL,
     created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),  -- bumped on any change to the capsule or its media
     is_group BOOLEAN DEFAULT FALSE,
     owner_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
     created_email_sent_at TIMESTAMPTZ,
     reminder_email_sent_at TIMESTAMPTZ,
+    unlocked_at TIMESTAMPTZ,  -- set once by the unlock scheduler when the unlock fires
     
     -- Constraints
     CONSTRAINT unlock_date_future CHECK (unlock_date > created_at)
@@ -34,6 +36,8 @@ CREATE TABLE media (
     file_path TEXT NOT NULL,
     file_type VARCHAR(50) NOT NULL,
     uploaded_at TIMESTAMPTZ DEFAULT NOW(),
+    thumbnail_paths JSONB,  -- longest edge in px -> storage path, set once thumbnails exist
+    blurhash TEXT,  -- placeholder shown while an image loads
     
     -- Index for faster queries
     CONSTRAINT media_capsule_fk FOREIGN KEY (capsule_id) REFERENCES capsules(id) ON DELETE CASCADE
@@ -50,16 +54,103 @@ CREATE TABLE capsule_members (
     UNIQUE(capsule_id, user_id)
 );
 
+-- Resumable upload sessions (large media sent in parts)
+CREATE TABLE media_uploads (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    capsule_id UUID NOT NULL REFERENCES capsules(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    filename VARCHAR(255) NOT NULL,
+    content_type VARCHAR(100) NOT NULL,
+    file_type VARCHAR(50) NOT NULL,
+    total_size BIGINT NOT NULL,
+    part_size INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending | assembling | completed
+    assembling_since TIMESTAMPTZ,  -- when a complete call claimed the session
+    media_id UUID REFERENCES media(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Parts received for a resumable upload (each stored as its own object)
+CREATE TABLE media_upload_parts (
+    upload_id UUID NOT NULL REFERENCES media_uploads(id) ON DELETE CASCADE,
+    part_number INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    storage_path TEXT NOT NULL,
+    uploaded_at TIMESTAMPTZ DEFAULT NOW(),
+
+    PRIMARY KEY (upload_id, part_number)
+);
+
+-- Outgoing email queue, drained by the backend's email workers. A message is
+-- claimed by one worker at a time (status 'sending' holds a lease until
+-- next_attempt_at) and retried with backoff until it is sent or gives up.
+-- Settled rows keep no message body and are deleted after a retention period.
+CREATE TABLE email_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    kind VARCHAR(50) NOT NULL,  -- verification | otp | capsule_created | capsule_reminder
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT,  -- cleared with text once the message is sent or given up on
+    text TEXT,
+    capsule_id UUID REFERENCES capsules(id) ON DELETE CASCADE,
+    dedupe_key TEXT UNIQUE,  -- e.g. capsule_reminder:<capsule id>; NULL never conflicts
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending | sending | sent | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+-- Content-hash index of stored media objects. Identical files uploaded by
+-- the same user share one storage object; ref_count is the number of media
+-- rows pointing at it, and the object is deleted when it drops to zero.
+CREATE TABLE media_objects (
+    owner_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    content_hash TEXT NOT NULL,  -- hex SHA-256 of the file
+    file_path TEXT NOT NULL UNIQUE,
+    size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 1,
+    stored BOOLEAN NOT NULL DEFAULT FALSE,  -- set once the object is in storage
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+
+    PRIMARY KEY (owner_id, content_hash)
+);
+
+-- Storage objects waiting to be deleted (media nothing references any more),
+-- drained in batches by the backend's cleanup workers. Removed paths are
+-- deleted from the table; paths that keep failing stay with status 'failed'
+-- and their last_error for reconciliation.
+CREATE TABLE storage_cleanup (
+    path TEXT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending | removing | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
 -- ============================================
 -- INDEXES for Performance
 -- ============================================
 
 CREATE INDEX idx_capsules_owner ON capsules(owner_id);
+CREATE INDEX idx_capsules_owner_created ON capsules(owner_id, created_at DESC, id DESC);
 CREATE INDEX idx_capsules_unlock_date ON capsules(unlock_date);
+CREATE INDEX idx_capsules_pending_unlock ON capsules(unlock_date, id) WHERE unlocked_at IS NULL;
 CREATE INDEX idx_capsules_reminder_sent ON capsules(reminder_email_sent_at);
+CREATE INDEX idx_capsules_reminder_due ON capsules(unlock_date) WHERE reminder_email_sent_at IS NULL;
 CREATE INDEX idx_media_capsule ON media(capsule_id);
+CREATE INDEX idx_media_file_path ON media(file_path);
 CREATE INDEX idx_capsule_members_user ON capsule_members(user_id);
 CREATE INDEX idx_capsule_members_capsule ON capsule_members(capsule_id);
+CREATE INDEX idx_media_uploads_user ON media_uploads(user_id);
+CREATE INDEX idx_media_uploads_expires ON media_uploads(expires_at) WHERE status IN ('pending', 'completed');
+CREATE INDEX idx_media_uploads_assembling ON media_uploads(assembling_since) WHERE status = 'assembling';
+CREATE INDEX idx_email_outbox_due ON email_outbox(next_attempt_at) WHERE status IN ('pending', 'sending');
+CREATE INDEX idx_email_outbox_settled ON email_outbox(created_at) WHERE status IN ('sent', 'failed');
+CREATE INDEX idx_storage_cleanup_due ON storage_cleanup(next_attempt_at) WHERE status IN ('pending', 'removing');
 
 -- ============================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
@@ -69,6 +160,11 @@ CREATE INDEX idx_capsule_members_capsule ON capsule_members(capsule_id);
 ALTER TABLE capsules ENABLE ROW LEVEL SECURITY;
 ALTER TABLE media ENABLE ROW LEVEL SECURITY;
 ALTER TABLE capsule_members ENABLE ROW LEVEL SECURITY;
+ALTER TABLE media_uploads ENABLE ROW LEVEL SECURITY;
+ALTER TABLE media_upload_parts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE email_outbox ENABLE ROW LEVEL SECURITY;
+ALTER TABLE media_objects ENABLE ROW LEVEL SECURITY;
+ALTER TABLE storage_cleanup ENABLE ROW LEVEL SECURITY;
 
 -- ============================================
 -- CAPSULES POLICIES
@@ -204,6 +300,318 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql IMMUTABLE;
 
+-- Resolve an auth user id from an email (used by the backend's OTP and
+-- email verification flows instead of paging through admin.list_users()).
+-- GoTrue stores emails lowercased, and its unique index on auth.users(email)
+-- is partial (users_email_partial_key, WHERE is_sso_user = false). The
+-- lookup repeats that predicate so the planner can answer it with an
+-- index scan on users_email_partial_key instead of a sequential scan.
+-- SSO users sign in through their identity provider and are never looked up
+-- here. Callable only with the service role key.
+CREATE OR REPLACE FUNCTION get_user_id_by_email(p_email TEXT)
+RETURNS UUID AS $$
+    SELECT id FROM auth.users
+    WHERE email = lower(p_email) AND is_sso_user = false
+    LIMIT 1;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = auth, public;
+
+REVOKE EXECUTE ON FUNCTION get_user_id_by_email(TEXT) FROM PUBLIC, anon, authenticated;
+
+-- Resolve the emails of many auth users in one round trip (used by the
+-- reminder job to look up capsule owners in bulk).
+CREATE OR REPLACE FUNCTION get_user_emails(p_user_ids UUID[])
+RETURNS TABLE (id UUID, email TEXT) AS $$
+    SELECT u.id, u.email::TEXT FROM auth.users u WHERE u.id = ANY(p_user_ids);
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = auth, public;
+
+REVOKE EXECUTE ON FUNCTION get_user_emails(UUID[]) FROM PUBLIC, anon, authenticated;
+
+-- Claim up to p_limit due outbox messages for one worker. Rows are locked
+-- with SKIP LOCKED so concurrent workers (and API processes) never claim the
+-- same message; a claimed row is leased for p_lease_seconds, after which it
+-- becomes due again if the worker died mid-send.
+CREATE OR REPLACE FUNCTION claim_email_outbox(p_limit INTEGER, p_lease_seconds INTEGER)
+RETURNS SETOF email_outbox AS $$
+    UPDATE email_outbox o
+    SET status = 'sending',
+        attempts = o.attempts + 1,
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM email_outbox
+        WHERE status IN ('pending', 'sending') AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+$$ LANGUAGE sql VOLATILE;
+
+REVOKE EXECUTE ON FUNCTION claim_email_outbox(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- Take a reference on the user's stored object for a content hash. New
+-- content is indexed under p_file_path; known content keeps its path.
+-- Returns the object's path and whether it has reached storage yet.
+CREATE OR REPLACE FUNCTION acquire_media_object(
+    p_owner_id UUID,
+    p_content_hash TEXT,
+    p_file_path TEXT,
+    p_size BIGINT
+)
+RETURNS TABLE (file_path TEXT, stored BOOLEAN) AS $$
+    INSERT INTO media_objects AS o (owner_id, content_hash, file_path, size)
+    VALUES (p_owner_id, p_content_hash, p_file_path, p_size)
+    ON CONFLICT (owner_id, content_hash)
+    DO UPDATE SET ref_count = o.ref_count + 1
+    RETURNING o.file_path, o.stored;
+$$ LANGUAGE sql VOLATILE;
+
+REVOKE EXECUTE ON FUNCTION acquire_media_object(UUID, TEXT, TEXT, BIGINT) FROM PUBLIC, anon, authenticated;
+
+-- Drop one reference per entry of p_file_paths (a path may repeat). Returns
+-- the paths whose objects should now be deleted from storage: those whose
+-- last reference went, plus paths that were never indexed (media stored
+-- before deduplication).
+CREATE OR REPLACE FUNCTION release_media_objects(p_file_paths TEXT[])
+RETURNS SETOF TEXT AS $$
+BEGIN
+    UPDATE media_objects o
+    SET ref_count = o.ref_count - released.n
+    FROM (
+        SELECT path, COUNT(*) AS n
+        FROM unnest(p_file_paths) AS path
+        GROUP BY path
+    ) released
+    WHERE o.file_path = released.path;
+
+    DELETE FROM media_objects
+    WHERE file_path = ANY(p_file_paths) AND ref_count <= 0;
+
+    RETURN QUERY
+    SELECT DISTINCT path
+    FROM unnest(p_file_paths) AS path
+    WHERE NOT EXISTS (SELECT 1 FROM media_objects o WHERE o.file_path = path);
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+REVOKE EXECUTE ON FUNCTION release_media_objects(TEXT[]) FROM PUBLIC, anon, authenticated;
+
+-- Delete an owner's capsule with its media, members and upload sessions in
+-- one transaction. The media's object references are released first, and
+-- every object nothing references any more (the original with its
+-- thumbnails, and the parts of unfinished resumable uploads) is queued in
+-- storage_cleanup, so a failure cannot drop the rows and leak the objects.
+-- Returns the queued paths; nothing if the capsule is gone or not p_owner_id's.
+CREATE OR REPLACE FUNCTION delete_capsule(p_capsule_id UUID, p_owner_id UUID)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    released TEXT[];
+BEGIN
+    PERFORM 1 FROM capsules
+    WHERE id = p_capsule_id AND owner_id = p_owner_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT array_agg(path) INTO released
+    FROM release_media_objects(ARRAY(
+        SELECT file_path FROM media WHERE capsule_id = p_capsule_id
+    )) AS path;
+
+    RETURN QUERY
+    WITH doomed AS (
+        SELECT unnest(released) AS path
+        UNION
+        SELECT thumbnail.value
+        FROM media m, jsonb_each_text(m.thumbnail_paths) AS thumbnail
+        WHERE m.capsule_id = p_capsule_id AND m.file_path = ANY(released)
+        UNION
+        SELECT p.storage_path
+        FROM media_uploads u JOIN media_upload_parts p ON p.upload_id = u.id
+        WHERE u.capsule_id = p_capsule_id
+    ), queued AS (
+        INSERT INTO storage_cleanup (path)
+        SELECT path FROM doomed
+        ON CONFLICT (path) DO NOTHING
+    )
+    SELECT path FROM doomed;
+
+    DELETE FROM capsules WHERE id = p_capsule_id;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+REVOKE EXECUTE ON FUNCTION delete_capsule(UUID, UUID) FROM PUBLIC, anon, authenticated;
+
+-- Claim up to p_limit due cleanup paths for one worker, the same way as
+-- claim_email_outbox: SKIP LOCKED keeps workers apart, and a claimed path
+-- becomes due again after p_lease_seconds if its worker died.
+CREATE OR REPLACE FUNCTION claim_storage_cleanup(p_limit INTEGER, p_lease_seconds INTEGER)
+RETURNS SETOF storage_cleanup AS $$
+    UPDATE storage_cleanup c
+    SET status = 'removing',
+        attempts = c.attempts + 1,
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE c.path IN (
+        SELECT path FROM storage_cleanup
+        WHERE status IN ('pending', 'removing') AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING c.*;
+$$ LANGUAGE sql VOLATILE;
+
+REVOKE EXECUTE ON FUNCTION claim_storage_cleanup(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- Sweep resumable upload sessions. Sessions left 'assembling' for longer
+-- than p_assembly_timeout_seconds (their complete call died) go back to
+-- 'pending', so they can be completed again, aborted or expire. Then up to
+-- p_limit sessions past expires_at, unfinished or completed, are deleted,
+-- queueing their part objects in storage_cleanup in the same transaction.
+-- Returns the number of sessions deleted.
+CREATE OR REPLACE FUNCTION expire_media_uploads(p_limit INTEGER, p_assembly_timeout_seconds INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    expired UUID[];
+BEGIN
+    UPDATE media_uploads
+    SET status = 'pending', assembling_since = NULL
+    WHERE status = 'assembling'
+      AND assembling_since <= NOW() - make_interval(secs => p_assembly_timeout_seconds);
+
+    SELECT array_agg(id) INTO expired
+    FROM (
+        SELECT id FROM media_uploads
+        WHERE status IN ('pending', 'completed') AND expires_at <= NOW()
+        ORDER BY expires_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ) due;
+
+    IF expired IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO storage_cleanup (path)
+    SELECT storage_path FROM media_upload_parts WHERE upload_id = ANY(expired)
+    ON CONFLICT (path) DO NOTHING;
+
+    DELETE FROM media_uploads WHERE id = ANY(expired);
+    RETURN cardinality(expired);
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+REVOKE EXECUTE ON FUNCTION expire_media_uploads(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- One page of capsules owned by or shared with a user, newest first.
+-- Keyset pagination on (created_at, id): pass the last row of the previous
+-- page as the cursor. Each branch of the union walks an index and stops
+-- after p_limit rows.
+CREATE OR REPLACE FUNCTION user_capsule_page(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_cursor_created_at TIMESTAMPTZ DEFAULT NULL,
+    p_cursor_id UUID DEFAULT NULL
+)
+RETURNS SETOF capsules AS $$
+    SELECT * FROM (
+        (SELECT c.*
+         FROM capsules c
+         WHERE c.owner_id = p_user_id
+           AND (p_cursor_created_at IS NULL
+                OR (c.created_at, c.id) < (p_cursor_created_at, p_cursor_id))
+         ORDER BY c.created_at DESC, c.id DESC
+         LIMIT p_limit)
+        UNION
+        (SELECT c.*
+         FROM capsule_members m
+         JOIN capsules c ON c.id = m.capsule_id
+         WHERE m.user_id = p_user_id
+           AND (p_cursor_created_at IS NULL
+                OR (c.created_at, c.id) < (p_cursor_created_at, p_cursor_id))
+         ORDER BY c.created_at DESC, c.id DESC
+         LIMIT p_limit)
+    ) visible
+    ORDER BY created_at DESC, id DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION user_capsule_page(UUID, INTEGER, TIMESTAMPTZ, UUID) FROM PUBLIC, anon, authenticated;
+
+-- A page of capsules with their media embedded, in a single query.
+CREATE OR REPLACE FUNCTION list_user_capsules(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_cursor_created_at TIMESTAMPTZ DEFAULT NULL,
+    p_cursor_id UUID DEFAULT NULL
+)
+RETURNS SETOF JSONB AS $$
+    SELECT to_jsonb(page) || jsonb_build_object(
+        'media', COALESCE(
+            (SELECT jsonb_agg(to_jsonb(m) ORDER BY m.uploaded_at)
+             FROM media m
+             WHERE m.capsule_id = page.id),
+            '[]'::jsonb
+        )
+    )
+    FROM user_capsule_page(p_user_id, p_limit, p_cursor_created_at, p_cursor_id) page
+    ORDER BY page.created_at DESC, page.id DESC;
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION list_user_capsules(UUID, INTEGER, TIMESTAMPTZ, UUID) FROM PUBLIC, anon, authenticated;
+
+-- Version of the same page without touching media: just enough to build the
+-- ETag a conditional GET is compared against.
+CREATE OR REPLACE FUNCTION list_user_capsule_versions(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_cursor_created_at TIMESTAMPTZ DEFAULT NULL,
+    p_cursor_id UUID DEFAULT NULL
+)
+RETURNS TABLE (id UUID, updated_at TIMESTAMPTZ, unlock_date TIMESTAMPTZ) AS $$
+    SELECT page.id, page.updated_at, page.unlock_date
+    FROM user_capsule_page(p_user_id, p_limit, p_cursor_created_at, p_cursor_id) page
+    ORDER BY page.created_at DESC, page.id DESC;
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION list_user_capsule_versions(UUID, INTEGER, TIMESTAMPTZ, UUID) FROM PUBLIC, anon, authenticated;
+
+-- ============================================
+-- TRIGGERS
+-- ============================================
+
+-- Keep capsules.updated_at current. Media changes bump their capsule too, so
+-- updated_at versions the whole capsule payload (the API derives ETags from it).
+-- Bookkeeping writes (unlocked_at, the *_email_sent_at stamps) are not part
+-- of that payload and leave updated_at alone, so clients keep getting 304s.
+CREATE OR REPLACE FUNCTION touch_capsule_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER capsules_touch_updated_at
+    BEFORE UPDATE ON capsules
+    FOR EACH ROW
+    WHEN ((OLD.title, OLD.description, OLD.unlock_date, OLD.is_group, OLD.owner_id)
+          IS DISTINCT FROM (NEW.title, NEW.description, NEW.unlock_date, NEW.is_group, NEW.owner_id))
+    EXECUTE FUNCTION touch_capsule_updated_at();
+
+CREATE OR REPLACE FUNCTION touch_capsule_from_media()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE capsules SET updated_at = NOW()
+    WHERE id = COALESCE(NEW.capsule_id, OLD.capsule_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER media_touch_capsule
+    AFTER INSERT OR UPDATE OR DELETE ON media
+    FOR EACH ROW EXECUTE FUNCTION touch_capsule_from_media();
+
 -- ============================================
 -- STORAGE BUCKET SETUP (Run in Supabase Dashboard)
 -- ============================================
@@ -227,3 +635,61 @@ $$ LANGUAGE plpgsql IMMUTABLE;
 -- ALTER TABLE capsules ADD COLUMN IF NOT EXISTS created_email_sent_at TIMESTAMPTZ;
 -- ALTER TABLE capsules ADD COLUMN IF NOT EXISTS reminder_email_sent_at TIMESTAMPTZ;
 -- CREATE INDEX IF NOT EXISTS idx_capsules_reminder_sent ON capsules(reminder_email_sent_at);
+
+-- Email -> user id lookup (re-run the get_user_id_by_email function above)
+
+-- Resumable uploads (re-run the media_uploads / media_upload_parts tables above)
+-- CREATE INDEX IF NOT EXISTS idx_media_uploads_user ON media_uploads(user_id);
+
+-- Paginated capsule listing (re-run the user_capsule_page and list_user_capsules functions above)
+-- CREATE INDEX IF NOT EXISTS idx_capsules_owner_created ON capsules(owner_id, created_at DESC, id DESC);
+
+-- Batched unlock reminders (re-run the get_user_emails function above)
+-- CREATE INDEX IF NOT EXISTS idx_capsules_reminder_due ON capsules(unlock_date) WHERE reminder_email_sent_at IS NULL;
+
+-- Email outbox (re-run the email_outbox table, its index, RLS line and the
+-- claim_email_outbox function above)
+
+-- Unlock scheduler (mark capsules that already unlocked so they do not fire again)
+-- ALTER TABLE capsules ADD COLUMN IF NOT EXISTS unlocked_at TIMESTAMPTZ;
+-- UPDATE capsules SET unlocked_at = unlock_date WHERE unlocked_at IS NULL AND unlock_date <= NOW();
+-- CREATE INDEX IF NOT EXISTS idx_capsules_pending_unlock ON capsules(unlock_date, id) WHERE unlocked_at IS NULL;
+
+-- Capsule versions for ETags (then re-run user_capsule_page, list_user_capsules,
+-- list_user_capsule_versions and the TRIGGERS section above)
+-- ALTER TABLE capsules ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+-- Image thumbnails and placeholders
+-- ALTER TABLE media ADD COLUMN IF NOT EXISTS thumbnail_paths JSONB;
+-- ALTER TABLE media ADD COLUMN IF NOT EXISTS blurhash TEXT;
+
+-- Content-addressed media objects (re-run the media_objects table, its RLS
+-- line and the acquire_media_object / release_media_objects functions above).
+-- Existing media stay unindexed and are deleted outright, as before.
+-- CREATE INDEX IF NOT EXISTS idx_media_file_path ON media(file_path);
+
+-- Background storage cleanup (re-run the storage_cleanup table, its index,
+-- RLS line and the claim_storage_cleanup function above)
+
+-- Capsule deletes release and queue their media atomically (re-run the
+-- delete_capsule function above)
+
+-- Expired resumable upload sweep (re-run the expire_media_uploads function above)
+-- CREATE INDEX IF NOT EXISTS idx_media_uploads_expires ON media_uploads(expires_at) WHERE status = 'pending';
+
+-- Email outbox retention (settled messages drop their body, then the row)
+-- ALTER TABLE email_outbox ALTER COLUMN html DROP NOT NULL;
+-- UPDATE email_outbox SET html = NULL, text = NULL WHERE status IN ('sent', 'failed');
+-- CREATE INDEX IF NOT EXISTS idx_email_outbox_settled ON email_outbox(created_at) WHERE status IN ('sent', 'failed');
+
+-- Bookkeeping updates no longer change capsule ETags
+-- DROP TRIGGER IF EXISTS capsules_touch_updated_at ON capsules;
+-- (then re-create capsules_touch_updated_at from the TRIGGERS section above)
+
+-- Stuck and completed upload sessions are swept too (then re-run the
+-- expire_media_uploads function above)
+-- ALTER TABLE media_uploads ADD COLUMN IF NOT EXISTS assembling_since TIMESTAMPTZ;
+-- DROP FUNCTION IF EXISTS expire_media_uploads(INTEGER);
+-- DROP INDEX IF EXISTS idx_media_uploads_expires;
+-- CREATE INDEX idx_media_uploads_expires ON media_uploads(expires_at) WHERE status IN ('pending', 'completed');
+-- CREATE INDEX IF NOT EXISTS idx_media_uploads_assembling ON media_uploads(assembling_since) WHERE status = 'assembling';